@@ -1,8 +1,14 @@
 from tkinter import IntVar
 import time
-from typing import Any, Dict, List
-from modules.eip import PLC
+from typing import Any, Callable, Dict, List
+from modules.session import PLCSession, find_controller
+from modules.handshake import (HOMED, OPERATION_ENABLED, Handshake, HomingMonitor, MotionFinished,
+                               drives_enabled, drives_error_free)
+from concurrent.futures import Future
 from threading import Lock, Thread
+from modules.command_actor import CommandActor
+from modules.position_recorder import PositionRecorder, Recording
+from modules.view_queue import ViewQueue
 from logging import getLogger, Logger
 from modules.logging.log_utils import LOGGER_NAME
 from Motor import Motor
@@ -16,6 +22,15 @@ class Model:
     """Model class for organization of all motor and state variables."""
     IP_ADDRESS: str = '192.168.1.1'
     PROCESSOR_SLOT: int = 1
+    # EtherNet/IP port, only changed to point the GUI at testing/plc_simulator.py
+    PLC_PORT: int = 44818
+    # when nothing answers at IP_ADDRESS, look on the network for the controller with PLC_SERIAL_NUMBER
+    # (as ListIdentity reports it, e.g. '0xc0ffee') and use it instead. Off unless turned on for the rig
+    DISCOVER_PLC: bool = False
+    PLC_SERIAL_NUMBER: str = None
+    # on startup pick up the motors the PLC already has live instead of resetting them. Off unless
+    # turned on, startup resets the live motors as it always has
+    WARM_START: bool = False
     LOGGER: Logger = getLogger(LOGGER_NAME)
     ALL_PARAM_TIPS: List[str] = ['Position limits after homing are 370mm and - 20 mm',
                                  'Position limits after homing are 370mm and - 20 mm',
@@ -48,10 +63,33 @@ class Model:
     # MODEL STATE VARIABLES
     # on GUI startup the model determines if it is connected to motors
     CONNECTED: bool = False
+    # live motors, their params and the homed state were rebuilt from the PLC on startup
+    warm_started: bool = False
     # which motors to interact with. This can also house non active motors
     RECORD_ANALYTICS: bool = False
     ANALYTICS_INTERVAL: float = 0.25
     ANALYTICS_DURATION: float = 10.0
+    # where the analytics files go, one per day
+    ANALYTICS_DIR: str = f"{getcwd()}/analytics"
+    # record the count, bytes and latency of every PLC request, reported on shutdown
+    RECORD_IO_STATS: bool = False
+    # control steps poll the drives this often until the PLC confirms them, giving up after the timeout
+    HANDSHAKE_POLL_INTERVAL: float = 0.05
+    HANDSHAKE_TIMEOUT: float = 5.0
+    # a step whose condition already held before its trigger was set keeps the trigger this long, the old fixed wait
+    HANDSHAKE_HOLD: float = 5.0
+    # homing is watched this often, each of the two passes giving up after its timeout
+    HOMING_POLL_INTERVAL: float = 0.2
+    HOMING_TIMEOUTS: List[float] = [10.0, 35.0]
+    # an axis that reports homed without being seen homing for this many seconds was already home
+    HOMING_SETTLE: float = 0.5
+    # where a homed piston should be, in mm, and how far off it may be before it is homed again
+    HOME_POSITION: float = 0.0
+    HOME_TOLERANCE: float = 1.0
+    # Axis[] positions are in 0.1 um
+    COUNTS_PER_MM: int = 10000
+    # on shutdown, how long a command still running on the actor is waited for
+    SHUTDOWN_TIMEOUT: float = 5.0
 
     motdict: Dict[int, int]
     # The list of motors which are active
@@ -74,6 +112,19 @@ class Model:
     # Curve Lock
     curve_lock: Lock
 
+    # Shared connection to the PLC, reused by every motor
+    session: PLCSession
+    # pulses the trigger bits and waits for the drives to confirm
+    handshake: Handshake
+    # runs the GUI's PLC commands one at a time, off the Tk thread
+    actor: CommandActor
+    # view updates from the actor's commands, run on the Tk thread
+    ui: ViewQueue
+    # the analytics recording in progress or last taken, None before the first
+    recorder: PositionRecorder
+    # axis number -> seconds it took to home, in the pass that homed it
+    homing_times: Dict[int, float]
+
     def __init__(self):
         """Initializes all state variables, connects to database, and runs live_motor_reset."""
         self.motdict = {}
@@ -83,22 +134,45 @@ class Model:
         self.csvattrcat = {}
         self.csvlist = []
         self.MOT_CIRCLES = {}
+        self.homing_times = {}
+        self.recorder = None
 
         self.on_lock = Lock()
         self.off_lock = Lock()
         self.home_lock = Lock()
         self.curve_lock = Lock()
 
+        if self.DISCOVER_PLC:
+            self.IP_ADDRESS = find_controller(self.IP_ADDRESS, self.PLC_PORT, serial_number=self.PLC_SERIAL_NUMBER)
+        self.session = PLCSession(self.IP_ADDRESS, self.PROCESSOR_SLOT, self.PLC_PORT)
+        self.session.add_listener(self.on_connection_state)
+        self.handshake = Handshake(self.session, self.live_axes, self.HANDSHAKE_POLL_INTERVAL,
+                                   self.HANDSHAKE_TIMEOUT, hold=self.HANDSHAKE_HOLD)
+        self.actor = CommandActor()
+        self.ui = ViewQueue()
+        if self.RECORD_IO_STATS:
+            self.session.enable_stats()
+
         # UNPREPARED_STATE:0, HOMED_STATE:1, RUNNING_STATE:2
         self.state = -1
         # Flag to track when homing is in progress (prevents button re-enabling during tab switch)
         self.is_homing = False
 
-        # Reset Live motor array on the PLC to all 0s to ensure only operating on intended motors
-        # If the live_motor_reset fails then the motors are not actually connected
+        # Reset Live motor array on the PLC to all 0s to ensure only operating on intended motors,
+        # unless WARM_START finds motors the PLC already has live and takes them over.
+        # If that fails then the motors are not actually connected
         # we then set CONNECTED to false and run the program in a mock state
         try:
-            self.live_motor_reset()
+            warm = False
+            if self.WARM_START:
+                try:
+                    warm = self.warm_start()
+                except Exception as e:
+                    # what the PLC holds couldn't be taken over, start from scratch instead
+                    self.LOGGER.warning(f'Warm start failed ({e}), resetting the live motors.')
+                    self.motdict = {}
+            if not warm:
+                self.live_motor_reset()
             self.CONNECTED = True
         except:
             self.CONNECTED = False
@@ -130,12 +204,9 @@ class Model:
         """Check if write_params match current_params for ALL motors in all sets."""
         for motor_set in self.live_motors_sets:
             for motor in motor_set.values():
-                for attr in motor.write_params:
-                    # If current_params doesn't have this attr, it was never written
-                    if attr not in motor.current_params:
-                        return False
-                    if motor.write_params[attr] != motor.current_params[attr]:
-                        return False
+                # a param missing from current_params was never written
+                if motor.dirty_params():
+                    return False
         return True  # Only return True after checking ALL motors in ALL sets
 
 
@@ -146,26 +217,24 @@ class Model:
         self.define_motors_view = define_motors_view
 
     def notify_view(self):
-        self.view.update_button_status()
+        """Updates the views' buttons to the current state, on the Tk thread."""
+        self.ui.post(self.view.update_button_status)
         # Also notify DefineMotors view if registered
         if hasattr(self, 'define_motors_view') and self.define_motors_view is not None:
-            self.define_motors_view.update_stop_button_status()
+            self.ui.post(self.define_motors_view.update_stop_button_status)
+
+    def show_msg(self, msg: str):
+        """Shows msg in Control Home's message box, on the Tk thread."""
+        self.ui.post(self.view.update_msg, msg)
 
     def motor_on(self):
         """Flip the boolean motor on switch in the PLC code."""
         #self.on_lock.acquire()
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = self.IP_ADDRESS
-                comm.ProcessorSlot = self.PROCESSOR_SLOT
-                motor_on_bool = comm.Read('Program:Wave_Control.Motor_Boot')
-                # Writes a 1 to the boolean switch Motor_Boot. The PLC code then executes this command
-                comm.Write('Program:Wave_Control.Motor_Boot', 1)
-                # wait 5 seconds for the command to happen
-                time.sleep(5)
-                # Write a 0 to the boolean switch Motor_Boot to stop execution
-                comm.Write('Program:Wave_Control.Motor_Boot', 0)
-                self.LOGGER.log(15, 'Motor(s) turned ON')
+            # Holds the boolean switch Motor_Boot at 1 until every drive reports operation enabled.
+            # The PLC code then executes this command
+            self.handshake.pulse('Program:Wave_Control.Motor_Boot', drives_enabled)
+            self.LOGGER.log(15, 'Motor(s) turned ON')
         else:
             self.LOGGER.log(15, 'Motor(s) mock turned ON')
         self.RUN_ENABLE = True
@@ -177,25 +246,19 @@ class Model:
         It should be called before turning on the motors to clear errors."""
         self.off_lock.acquire()
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = self.IP_ADDRESS
-                comm.ProcessorSlot = self.PROCESSOR_SLOT
-                # Writes a 1 to the boolean switch Clear_Motor_Error. The PLC executes the correspinding code
-                comm.Write('Program:Wave_Control.Clear_Motor_Error', 1)
-                # Wait 5 seconds
-                time.sleep(5)
-                # Turn the Clear_Motor_Error switch off.
-                comm.Write('Program:Wave_Control.Clear_Motor_Error', 0)
-                self.LOGGER.info(
-                    "Motor(s) Turned Off and Motion Faults Cleared")
-                # Call motion method to stop motors and reset the run Rung in Studio 5000
-                # The 2 for Run_2 and the 1 for tracker
-                self.motion(2, 1)
-                comm.Write('Program:Wave_Control.Run_1', 0)
-                comm.Write('Program:Wave_Control.Run_2', 0)
-                comm.Write('Program:Wave_Control.Clear_Motor_Error', 0)
-                comm.Write('Program:Wave_Control.Home_Button', 0)
-                comm.Write('Program:Wave_Control.Run_Curve', 0)
+            # Holds the boolean switch Clear_Motor_Error at 1 until no drive reports an error.
+            # The PLC executes the correspinding code
+            self.handshake.pulse('Program:Wave_Control.Clear_Motor_Error', drives_error_free)
+            self.LOGGER.info(
+                "Motor(s) Turned Off and Motion Faults Cleared")
+            # Call motion method to stop motors and reset the run Rung in Studio 5000
+            # The 2 for Run_2 and the 1 for tracker
+            self.motion(2, 1)
+            self.session.Write('Program:Wave_Control.Run_1', 0)
+            self.session.Write('Program:Wave_Control.Run_2', 0)
+            self.session.Write('Program:Wave_Control.Clear_Motor_Error', 0)
+            self.session.Write('Program:Wave_Control.Home_Button', 0)
+            self.session.Write('Program:Wave_Control.Run_Curve', 0)
             self.live_motor_reset()
         else:
             self.live_motor_reset_mock()
@@ -206,210 +269,192 @@ class Model:
         self.off_lock.release()
 
 
-    def thread_motor_home(self):
-        self.is_homing = True  # Set flag before starting homing thread
-        Thread(target=self.motor_home).start()
+    def thread_motor_home(self) -> Future:
+        """Queues motor_home on the command actor."""
+        self.is_homing = True  # Set flag before queueing homing
+        return self.actor.submit(self.motor_home)
 
     def motor_home(self):
-        """Needs to check if the motors have reached home.
-        This check will come from calling on each of the motors as they have been defined in the motor class.
-        Live_Motors is a dictionary where each key corresponds to an instance of the motorclass."""
+        """Homes every live motor, then reads every axis' ComActualPosition in one request and checks it
+        is within HOME_TOLERANCE of HOME_POSITION. Pistons sometimes home at a high position, so those,
+        and any axis that didn't home in time, get a second pass on their own with the other axes
+        masked out of Live_Motors. How long each axis took is kept in homing_times."""
         #self.home_lock.acquire()
-        # exexcuted twice to prevent homing at a wrong position
-        # need further investigation on why will the piston home on a certain high position
-        for count in range(2):
-            # Keeping track of how many motors have successfuly homed
-            motCount: int = 0
-            # Keeping track of how many times the While loop has executed
-            looptrack: int = 0
-            # How many times the While loop will complete before breaking out of the loop
-            loopend: int = 5  *count + 1
-            # Tracking variable to help decide which branch to go down
-            tracker: int = 0
+        try:
             if self.CONNECTED:
-                with PLC() as comm:
-                    comm.IPAddress = self.IP_ADDRESS
-                    comm.ProcessorSlot = self.PROCESSOR_SLOT
-                    comm.Write('Program:Wave_Control.Home_Button', 0)
-                    time.sleep(5)
-                    # Reads the value of the home motor button in the PLC code, 0 is off 1 is on
-                    home_bool = comm.Read('Program:Wave_Control.Home_Button')
-                    #print(home_bool)
-                    if home_bool == 0 and tracker == 0:
-                        comm.Write('Program:Wave_Control.Home_Button', 1)
-                        tracker = 1
-
-                    while tracker == 1:
-                        # Wait 5 sec before begining loop and in between loops
-                        looptrack = looptrack+1
-                        self.view.update_msg(f'Homing Motor(s) {count+1} trial ({looptrack*5}/20)')
-                        # A command to keep contacting the PLC so do not lose connection
-                        comm.GetProgramTagList('Program:Wave_Control')
-                        time.sleep(5)
-                        motCount = 0
-                        for set in self.live_motors_sets:
-                            for motor in set.values():
-                                # homed is a method of the motor class which checks the Status Word bit for if the motor is in a home position
-                                if motor.homed(self.IP_ADDRESS, self.PROCESSOR_SLOT) == True:
-                                    motCount += 1
-
-                        total_keys = sum(len(d) for d in self.live_motors_sets)
-                        if motCount == total_keys:
-                            comm.Write('Program:Wave_Control.Home_Button', 0)
-                            tracker = 0
-                            if count == 1:
-                                self.LOGGER.info('Motor(s) Homed')
-                                self.state = 1
-                                self.is_homing = False  # Clear before notify
-                                self.notify_view()
-                                self.view.update_msg('Motor(s) Homed')
-                            break
-
-                        if looptrack > loopend:
-                            comm.Write('Program:Wave_Control.Home_Button', 0)
-                            if count == 1:
-                                self.is_homing = False  # Clear before notify
-                                self.notify_view()
-                                self.view.update_msg('Unable to Home Motors: Execution timed out after 40 sec')
-                                self.LOGGER.error('Unable to Home Motors: Execution timed out after 40 sec')
-                            break
+                axes = self.live_axes()
+                self.homing_times = {}
+                monitor = self.home_pass(axes, 1, self.HOMING_TIMEOUTS[0])
+                failed = monitor.pending() + self.misplaced_axes(list(monitor.homed_after))
+
+                if failed:
+                    # home again only the axes that need it
+                    self.LOGGER.warning(f'Axes {failed} not home after the first pass, homing them again')
+                    others = [n for n in axes if n not in failed]
+                    self.session.WriteBits('Program:Wave_Control.Live_Motors', {n: 0 for n in others})
+                    try:
+                        monitor = self.home_pass(failed, 2, self.HOMING_TIMEOUTS[1])
+                    finally:
+                        self.session.WriteBits('Program:Wave_Control.Live_Motors', {n: 1 for n in others})
+                    failed = monitor.pending() + self.misplaced_axes(list(monitor.homed_after))
+
+                if not failed:
+                    self.LOGGER.info('Motor(s) Homed')
+                    self.state = 1
+                    self.is_homing = False  # Clear before notify
+                    self.notify_view()
+                    self.show_msg('Motor(s) Homed')
+                else:
+                    self.is_homing = False  # Clear before notify
+                    self.notify_view()
+                    self.show_msg(f'Unable to Home Motors: {len(failed)} motor(s) not home after two passes')
+                    self.LOGGER.error(f'Unable to Home Motors: axes {sorted(failed)} not home after two passes')
             else:
                 time.sleep(5)
                 self.LOGGER.info('Motor(s) mock Homed')
                 self.state = 1
                 self.is_homing = False  # Clear before notify
                 self.notify_view()
-        
-        # Ensure homing flag is cleared (safety fallback)
-        self.is_homing = False
+        finally:
+            # cleared however homing ended, an error part way mustn't leave the buttons locked
+            self.is_homing = False
         #self.home_lock.release()
 
+    def home_pass(self, axes: List[int], trial: int, timeout: float) -> HomingMonitor:
+        """Presses Home_Button and watches axes with a HomingMonitor, one batched read of all the
+        Axis[] structures per HOMING_POLL_INTERVAL, until they all report homed or timeout runs out."""
+        self.session.Write('Program:Wave_Control.Home_Button', 0)
+        # give the PLC a scan to see the button released before it is pressed again
+        time.sleep(self.handshake.min_pulse)
+        self.session.Write('Program:Wave_Control.Home_Button', 1, replay=False)
+
+        shown = [None]
+        def progress(monitor: HomingMonitor):
+            elapsed = time.monotonic() - monitor.started
+            msg = (f'Homing Motor(s) pass {trial} '
+                   f'({len(monitor.homed_after)}/{len(monitor.axes)} homed, {elapsed:.0f}/{timeout:.0f}s)')
+            # only when it changes, at most once a second
+            if msg != shown[0]:
+                shown[0] = msg
+                self.show_msg(msg)
+
+        monitor = HomingMonitor(self.handshake, self.HOMING_SETTLE, axes)
+        try:
+            monitor.run(timeout, self.HOMING_POLL_INTERVAL, progress)
+        finally:
+            self.session.Write('Program:Wave_Control.Home_Button', 0)
+        self.homing_times.update(monitor.homed_after)
+        for motor in self.all_motors():
+            if motor.axis_ID in monitor.axes:
+                motor.update_from_axis(monitor.axes[motor.axis_ID])
+        return monitor
+
+    def misplaced_axes(self, axes: List[int]) -> List[int]:
+        """Of axes, the ones whose actual position isn't within HOME_TOLERANCE of HOME_POSITION."""
+        if not axes:
+            return []
+        positions = self.handshake.read_axes(axes)
+        home = self.HOME_POSITION * self.COUNTS_PER_MM
+        return [n for n, axis in positions.items()
+                if abs(axis['ComActualPosition'] - home) > self.HOME_TOLERANCE * self.COUNTS_PER_MM]
+
+    def stroke_ends(self) -> Dict[int, int]:
+        """Axis number -> demand position a single stroke ends at, Pos_2 of every live motor.
+        A motor whose Pos_2 can't be read is left out."""
+        motors = self.all_motors()
+        if not motors:
+            return {}
+        values = self.session.MultiRead(*[motor.param_tag('Position 2') for motor in motors])
+        return {motor.axis_ID: int(value * self.COUNTS_PER_MM)
+                for motor, value in zip(motors, values) if isinstance(value, (int, float))}
+
     def motor_define(self):
         """Uses the dictionary of motor number and whether it is on or off. Dependant on motor class"""
         # initializes the motor class for the motors specified by the dictionary motdict
         if (len(self.motdict) == 0):
             self.RUN_ENABLE = False
+        # Live_Motors bits to change, written together in one request after the loop
+        live_bits: Dict[int, int] = {}
         for key, value in self.motdict.items():
             print(self.motdict)
             if value == 1:
                 # Create the instance of the motor class
-                LiveMotor = Motor(key, self.CONNECTED)
+                LiveMotor = Motor(key, self.CONNECTED, self.session)
                 # Associate that instance of the motor class with the motor number in a dictionary
                 self.live_motors[LiveMotor.axis_ID] = LiveMotor
                 print(self.live_motors)
                 #print(self.live_motor_sets)
                 # Change the boolean switch in the PLC code to correspond with Live_Motors
-                if self.CONNECTED:
-                    with PLC() as comm:
-                        comm.IPAddress = self.IP_ADDRESS
-                        comm.ProcessorSlot = self.PROCESSOR_SLOT
-                        comm.Write(
-                            'Program:Wave_Control.Live_Motors.{0}'.format(key), value)
+                live_bits[key] = 1
             # The value in motdict is 0. So the motor should be turned off and deleted from the Live_Motor dict
             if value == 2:
                 # Create the instance of the motor class
-                LiveMotor = Motor(key, self.CONNECTED)
+                LiveMotor = Motor(key, self.CONNECTED, self.session)
                 # Associate that instance of the motor class with the motor number in a dictionary
                 print(self.live_motors)
                 if (key in self.live_motors.keys()):
                     del self.live_motors[key]
                 # Change the boolean switch in the PLC code to correspond with Live_Motors
-                if self.CONNECTED:
-                    with PLC() as comm:
-                        comm.IPAddress = self.IP_ADDRESS
-                        comm.ProcessorSlot = self.PROCESSOR_SLOT
-                        comm.Write(
-                            'Program:Wave_Control.Live_Motors.{0}'.format(key), value)
+                live_bits[key] = 1
             # The value in motdict is 0. So the motor should be turned off and deleted from the Live_Motor dict
             if value == 0:
                 if key in self.live_motors:
                     # turns off the motor as defined by the key from motdict
-                    if self.CONNECTED:
-                        with PLC() as comm:
-                            comm.IPAddress = self.IP_ADDRESS
-                            comm.ProcessorSlot = self.PROCESSOR_SLOT
-                            comm.Write(
-                                'Program:Wave_Control.Live_Motors.{0}'.format(key), value)
+                    live_bits[key] = 0
                     # Deletes the entry from the Live_Motors dictionary
                     del self.live_motors[key]
         ##self.motor_off()
-            
+
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = self.IP_ADDRESS
-                comm.ProcessorSlot = self.PROCESSOR_SLOT
-                comm.Write('Program:Wave_Control.Clear_Motor_Error', 1)
-                time.sleep(5)
-                comm.Write('Program:Wave_Control.Clear_Motor_Error', 0)
+            self.session.WriteBits('Program:Wave_Control.Live_Motors', live_bits)
+            self.handshake.pulse('Program:Wave_Control.Clear_Motor_Error', drives_error_free)
 
         self.motor_on()
 
 
-    def thread_motion(self, stroke, tracker):
-        Thread(target=self.motion, args=(stroke, tracker,)).start()
-
-    def record_positions(self,comm):
-        # Starting dictionary for data to input database
-        db_data = {}
-
-        handle = open(
-            f"{getcwd()}/analytics/{str(date.today())}.txt", "a+")
-        i = 0
-        max_runs = 10000
-        runs = 0
-        handle.write("\n" + "----- Run " + str(time.asctime()) + "-----\n" + "                 ")
-        for set in self.live_motors_sets:
-            for motor in set:
-                # DO NOT DELETE
-                # Creating aux_str to label motor
-                aux_str = "Motor "+str(motor)
-
-                # Creating entry in db_data
-                db_data[aux_str] = {}
-
-                handle.write(f"motor {motor:<18d}")
-        handle.write("\n"+"t           ")
-        for motor in self.live_motors:
-            handle.write("demand      actual      ")
-        handle.write("\n")
-        while i < self.ANALYTICS_DURATION and runs < max_runs:
-            self.view.update_progress_bar(i/self.ANALYTICS_DURATION)
-            handle.write(f"{i:7.4f}")
-            for motor in self.live_motors:
-                demandPositon: Any = comm.Read('Program:Wave_Control.Axis[{0}].ComDemandPosition'.format(
-                    motor))
-                actualPosition: Any = comm.Read(
-                    'Program:Wave_Control.Axis[{0}].ComActualPosition'.format(motor))
-                displacement = abs(demandPositon - actualPosition)
-
-                # DO NOT DELETE
-                # Recreating aux_str to access keys in db_data
-                aux_str = "Motor "+str(motor)
-                
-                # aux_str2 to access interval
-                aux_str2 = str(i)
-
-                # Adding the data to db_data
-                db_data[aux_str][aux_str2] = {"Actual Position": actualPosition, "Expected Position": demandPositon, "Displacement": displacement}
-
-                handle.write(f"{demandPositon:>12d}{actualPosition:>12d}")
-            runs += 1
-            handle.write("\n")
-            time.sleep(self.ANALYTICS_INTERVAL)
-            i += self.ANALYTICS_INTERVAL
-
+    def thread_motion(self, stroke, tracker) -> Future:
+        """Queues motion on the command actor."""
+        return self.actor.submit(self.motion, stroke, tracker)
+
+    def stop_motion(self, stroke) -> Future:
+        """Queues motion(stroke, 1) ahead of every command still waiting on the actor."""
+        return self.actor.submit(self.motion, stroke, 1, priority=CommandActor.STOP)
+
+    def record_positions(self, finished: Callable[[], None] = None) -> PositionRecorder:
+        """Starts recording the live motors' positions every ANALYTICS_INTERVAL for ANALYTICS_DURATION
+        and returns straight away, see PositionRecorder. The samples go to the actor as TELEMETRY
+        commands, so the motors can be stopped while they are recorded. Once the recording ends, by
+        running its course or stop_recording(), it is saved and finished() runs on the actor."""
+        def saved(data: Recording):
+            self.save_analytics(data)
+            if finished is not None:
+                finished()
+
+        labels = [motor for motor_set in self.live_motors_sets for motor in motor_set]
+        self.recorder = PositionRecorder(self.session if self.CONNECTED else None, self.actor, self.ui, self.view,
+                                         list(self.live_motors), labels, self.ANALYTICS_INTERVAL,
+                                         self.ANALYTICS_DURATION, f"{self.ANALYTICS_DIR}/{date.today()}.txt", saved)
+        return self.recorder.start()
+
+    def save_analytics(self, data: Recording):
+        """Adds a recording to the database, in the background since it can take a while to time out."""
+        if not self.CONNECTED:
+            return
         # DO NOT DELETE
         # Adding data to the database
-        update_database(str(time.asctime()), self.ANALYTICS_INTERVAL, self.ANALYTICS_DURATION, db_data)
+        Thread(target=update_database, args=(str(time.asctime()), self.ANALYTICS_INTERVAL,
+                                             self.ANALYTICS_DURATION, data), daemon=True).start()
 
-        self.view.destory_progress_bar()
-        handle.close()
+    def stop_recording(self):
+        """Ends the analytics recording, if one is running. Runs on the actor, as part of a stop."""
+        if self.recorder is not None:
+            self.recorder.stop()
 
     def motion(self, stroke, tracker):
         """This command will commence motion.
         Stroke should be a 1 or 2 depending on if a single stroke is wanted or cyclical motion."""
 
-        # For a single stroke, stroke = 1. Run_1 is set to true on the PLC and the code runs. 5 seconds later Run_1 is set False
+        # For a single stroke, stroke = 1. Run_1 is set to true on the PLC and the code runs. Once the stroke is done Run_1 is set False
         if stroke == 1:
             if tracker == 1:
                 self.LOGGER.warning(
@@ -422,19 +467,16 @@ class Model:
                 self.notify_view()
             else:
                 if self.CONNECTED:
-                    with PLC() as comm:
-                        comm.IPAddress = self.IP_ADDRESS
-                        comm.ProcessorSlot = self.PROCESSOR_SLOT
-                        comm.Write('Program:Wave_Control.Run_1', 1)
-                        self.view.update_msg('Motor(s) Running')
-                        time.sleep(5)
-                        comm.Write('Program:Wave_Control.Run_1', 0)
-                        self.view.update_msg('Motor(s) Stopped')
-                        self.LOGGER.log(15, 'Motor(s) single stroke STARTED')
-                        # FIX: Keep state as HOMED (1) after single stroke completes
-                        self.state = 1  # Can run another stroke without re-homing
-                        self.notify_view()
-                        self.view.curve_button['state'] = 'normal'
+                    self.show_msg('Motor(s) Running')
+                    # Run_1 is held until every drive has finished the stroke's second move, at Pos_2
+                    self.handshake.pulse('Program:Wave_Control.Run_1',
+                                         MotionFinished(self.stroke_ends(), self.HOME_TOLERANCE * self.COUNTS_PER_MM))
+                    self.show_msg('Motor(s) Stopped')
+                    self.LOGGER.log(15, 'Motor(s) single stroke STARTED')
+                    # FIX: Keep state as HOMED (1) after single stroke completes
+                    self.state = 1  # Can run another stroke without re-homing
+                    self.notify_view()
+                    self.ui.post(self.view.enable_curve)
                 else:
                     self.LOGGER.log(15, 'Motor(s) single stroke mock STARTED')
                     # FIX: Keep state as HOMED (1) after single stroke in mock mode
@@ -445,31 +487,29 @@ class Model:
         # When tracker = 1 a 0 is written to Run_2, turning off the motion
         elif stroke == 2:
             if self.CONNECTED:
-                with PLC() as comm:
-                    comm.IPAddress = self.IP_ADDRESS
-                    comm.ProcessorSlot = self.PROCESSOR_SLOT
-                    comm.Write('Program:wave_Control.Run_2', 1)
-                    self.LOGGER.log(15, 'Motor(s) continuous STARTED')
-                    
-                    if tracker == 1:
-                        comm.Write('Program:Wave_Control.Run_2', 0)
-                        self.LOGGER.log(15, 'Motor(s) STOPPED')
-                        # FIX: Keep state as HOMED (1) after stopping, not UNPREPARED (0)
-                        # Motors are still homed, just stopped - can restart without re-homing
-                        if self.state == -1:
-                            self.state = 0  # Never prepared, need to prepare
-                        else:
-                            self.state = 1  # Already homed, can restart directly
-                            self.notify_view()
+                if tracker == 1:
+                    self.session.Write('Program:Wave_Control.Run_2', 0)
+                    self.stop_recording()
+                    self.LOGGER.log(15, 'Motor(s) STOPPED')
+                    # FIX: Keep state as HOMED (1) after stopping, not UNPREPARED (0)
+                    # Motors are still homed, just stopped - can restart without re-homing
+                    if self.state == -1:
+                        self.state = 0  # Never prepared, need to prepare
                     else:
-                        self.state = 2
+                        self.state = 1  # Already homed, can restart directly
                         self.notify_view()
-                        self.view.update_msg('Motor(s) Running')
-                        if(self.RECORD_ANALYTICS):
-                            # this could be expanded to other analytics.
-                            self.record_positions(comm)
+                else:
+                    self.session.Write('Program:Wave_Control.Run_2', 1)
+                    self.LOGGER.log(15, 'Motor(s) continuous STARTED')
+                    self.state = 2
+                    self.notify_view()
+                    self.show_msg('Motor(s) Running')
+                    if(self.RECORD_ANALYTICS):
+                        # this could be expanded to other analytics.
+                        self.record_positions()
             else:
                 if tracker == 1:
+                    self.stop_recording()
                     self.LOGGER.log(15, 'Motor(s) mock STOPPED')
                     # FIX: Keep state as HOMED (1) after stopping in mock mode
                     # Motors are still homed, just stopped - can restart without re-homing
@@ -486,50 +526,51 @@ class Model:
                     self.LOGGER.log(15, 'Motor(s) mock STARTED')
                     self.state = 2
                     self.notify_view()
-                    i=0
-                    while i < self.ANALYTICS_DURATION:
-                        time.sleep(1)
-                        
-                        i+=self.ANALYTICS_INTERVAL
-                        self.view.update_progress_bar(i/self.ANALYTICS_DURATION)
-                    self.view.destory_progress_bar()
+                    if(self.RECORD_ANALYTICS):
+                        # moves the progress bar only
+                        self.record_positions()
         else:
             self.LOGGER.error(
                 'Failed to start motors. Make sure you\'ve selected either single stroke or continuous.')
 
-    def thread_curve(self):
-        Thread(target=self.curve).start()
+    def thread_curve(self) -> Future:
+        """Queues curve on the command actor."""
+        return self.actor.submit(self.curve)
 
     def curve(self):
         #self.curve_lock.acquire()
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = self.IP_ADDRESS
-                comm.ProcessorSlot = self.PROCESSOR_SLOT
-                curve_bool = comm.Read('Program:Wave_Control.Run_Curve')
+            curve_bool = self.session.Read('Program:Wave_Control.Run_Curve')
 
-                if curve_bool == 1:
-                    self.LOGGER.warning(
-                        'Curve is already running; ignored repeated button press.')
-                elif curve_bool == 0:
-
-                    # comm.Write('Program:Wave_Control.Run_1', 1)
-                    # time.sleep(5)
-                    # comm.Write('Program:Wave_Control.Run_1', 0)
-                    # time.sleep(5)
+            if curve_bool == 1:
+                self.LOGGER.warning(
+                    'Curve is already running; ignored repeated button press.')
+            elif curve_bool == 0:
+
+                # self.session.Write('Program:Wave_Control.Run_1', 1, replay=False)
+                # time.sleep(5)
+                # self.session.Write('Program:Wave_Control.Run_1', 0)
+                # time.sleep(5)
+
+                if(self.RECORD_ANALYTICS):
+                    def curve_recorded():
+                        # Turn the Run_Curve switch off.
+                        self.session.Write('Program:Wave_Control.Run_Curve', 0)
+                        self.LOGGER.log(15, 'Successfully ran curve.')
+                        self.state = 1
+                        self.notify_view()
 
                     # Writes a 1 to the boolean switch Run_Curve. The PLC executes the correspinding code
-                    comm.Write('Program:Wave_Control.Run_Curve', 1)
-                    # Wait 5 seconds
-                    if(self.RECORD_ANALYTICS):
-                        # this could be expanded to other analytics.
-                        self.ANALYTICS_DURATION = 5
-                        self.record_positions(comm)
-                    else:
-                        time.sleep(5)
-                    # Turn the Run_Curve switch off.
-                    comm.Write('Program:Wave_Control.Run_Curve', 0)
-                    self.LOGGER.log(15, 'Successfully ran curve.')
+                    self.session.Write('Program:Wave_Control.Run_Curve', 1, replay=False)
+                    # this could be expanded to other analytics.
+                    self.ANALYTICS_DURATION = 5
+                    # the rest happens once the recording is done, so a stop can get in meanwhile
+                    self.record_positions(curve_recorded)
+                    return
+                else:
+                    # Run_Curve is held until the drives have finished the curve
+                    self.handshake.pulse('Program:Wave_Control.Run_Curve', MotionFinished())
+                self.LOGGER.log(15, 'Successfully ran curve.')
         else:
             time.sleep(5)
         # FIX: Keep state as HOMED (1) after curve completes
@@ -538,15 +579,60 @@ class Model:
         self.notify_view()
         #self.curve_lock.release()
 
+    def warm_start(self) -> bool:
+        """Rebuilds the model from what the PLC already holds, so restarting the GUI doesn't mean
+        preparing and homing again. Live_Motors, Run_2 and every axis' status come back in two
+        requests, then every Motor_N/Curve_N param of the live motors in one batched read.
+
+        Each live motor gets the PLC's params as both its write_params and current_params. Motors
+        with the same params are grouped into a set. state is homed (1) when every live drive is
+        enabled and homed, running (2) if Run_2 is also on, otherwise unprepared (0).
+        Returns False, changing nothing, when the PLC has no live motors or they can't be read."""
+        live, running = self.session.MultiRead('Program:Wave_Control.Live_Motors', 'Program:Wave_Control.Run_2')
+        if not isinstance(live, int) or not isinstance(running, int):
+            self.LOGGER.warning('Warm start could not read Live_Motors or Run_2')
+            return False
+        axes = [n for n in range(30) if live >> n & 1]
+        if not axes:
+            return False
+        status = self.handshake.read_axes(axes)
+
+        motors: Dict[int, Motor] = {n: Motor(n, True, self.session) for n in axes}
+        tags = {n: motor.param_tags() for n, motor in motors.items()}
+        values = self.session.MultiRead(*[tag for n in axes for _, tag in tags[n]])
+        start = 0
+        sets: Dict[tuple, Dict[int, Motor]] = {}
+        for n in axes:
+            motor = motors[n]
+            for (param_name, tag), value in zip(tags[n], values[start:start+len(tags[n])]):
+                if value == 'Error':
+                    # left out of current_params, so the next attr_write sends it
+                    self.LOGGER.warning(f'Warm start could not read {tag}')
+                    continue
+                motor.write_params[param_name] = value
+                motor.current_params[param_name] = value
+            start += len(tags[n])
+            motor.check_write_success()
+            motor.update_from_axis(status[n])
+            sets.setdefault(tuple(sorted(motor.write_params.items())), {})[n] = motor
+            self.motdict[n] = 2
+
+        self.live_motors = motors
+        self.live_motors_sets = list(sets.values())
+        homed = all(axis['StatusWord'] & HOMED and axis['StatusWord'] & OPERATION_ENABLED for axis in status.values())
+        self.state = (2 if running else 1) if homed else 0
+        self.RUN_ENABLE = True
+        self.warm_started = True
+        self.LOGGER.info(f'Warm start: took over {len(axes)} live motor(s) in {len(sets)} set(s), '
+                         f'{"homed" if homed else "not homed"}')
+        return True
+
     def live_motor_reset(self):
         """Method to write all zeroes to the Live motors array. 
         This method is used to check if the motors are connected 
-        on init so it is not protected by a self.CONNECTED check."""
-        for x in range(0, 30):
-            with PLC() as comm:
-                comm.IPAddress = self.IP_ADDRESS
-                comm.ProcessorSlot = self.PROCESSOR_SLOT
-                comm.Write('Program:Wave_Control.Live_Motors.{}'.format(x), 0)
+        on init so it is not protected by a self.CONNECTED check.
+        All 30 bits are cleared by one masked write."""
+        self.session.WriteBits('Program:Wave_Control.Live_Motors', {x: 0 for x in range(0, 30)})
         self.live_motor_sets = []
         self.live_motors = {}
 
@@ -591,6 +677,53 @@ class Model:
         self.live_motor_sets = []
         self.live_motors = {}
 
+    def health_snapshot(self) -> Dict[int, Dict[str, Any]]:
+        """Reads the Wave_Control.Axis[] structure of all 30 drives in one request and
+        updates every live motor's state, warn, status and control words from it.
+        Returns {axis number: {member name: value}}, or {} when not connected."""
+        if not self.CONNECTED:
+            return {}
+        axes = self.session.ReadUDTArray('Program:Wave_Control.Axis[0]', 30)
+        for motor in self.live_motors.values():
+            motor.update_from_axis(axes[motor.axis_ID])
+        return dict(enumerate(axes))
+
+    def on_connection_state(self, state: str):
+        """Session listener. While the connection is down the PLC may have restarted with its
+        initial values, so what every motor was last written is forgotten and the next
+        attr_write sends every param again."""
+        if state == PLCSession.LOST:
+            for motor in self.all_motors():
+                motor.forget_written()
+
+    def live_axes(self) -> List[int]:
+        """Axis numbers of every live motor, the axes the control steps wait on."""
+        return sorted(motor.axis_ID for motor in self.all_motors())
+
+    def all_motors(self) -> List[Motor]:
+        """Every motor in live_motors and the sets, each once."""
+        motors = {id(motor): motor for motor in self.live_motors.values()}
+        for motor_set in self.live_motors_sets:
+            motors.update({id(motor): motor for motor in motor_set.values()})
+        return list(motors.values())
+
+    def report_io_stats(self, path: str = None):
+        """Logs where PLC request time went, by CIP service and by tag family, to the Feedback tab
+        and writes the same figures to path as JSON (logs/io_stats_<date>.json by default)."""
+        if self.session.stats is None:
+            return
+        for line in self.session.stats.Report():
+            self.LOGGER.info(line)
+        self.session.stats.Dump(path or f"{getcwd()}/logs/io_stats_{date.today()}.json")
+
+    def shutdown(self):
+        """Stops the command actor and closes the shared PLC session. Called when the GUI window is closed.
+        Queued commands are dropped, one already running gets SHUTDOWN_TIMEOUT seconds to finish."""
+        self.actor.close(self.SHUTDOWN_TIMEOUT)
+        if self.RECORD_IO_STATS:
+            self.report_io_stats()
+        self.session.close()
+
     def get_rows(self) -> List[int]:
         """Creates list of rows that contain live motors."""
         row_list: List[int] = []
@@ -643,10 +776,24 @@ class Model:
 
 
     def attr_write(self):
-        """Writes attributes to motors and returns true upon success."""
-        for set in self.live_motors_sets:
-            for motor in set.values():
-                motor.write_to_motor(self.IP_ADDRESS, self.PROCESSOR_SLOT)
+        """Writes attributes to motors and returns true upon success.
+        When connected, only the params changed since the last successful write are sent,
+        the writes for every motor together as multi-service packets."""
+        if self.CONNECTED:
+            batches = []
+            for set in self.live_motors_sets:
+                for motor in set.values():
+                    batches.append((motor, motor.queue_writes(self.IP_ADDRESS, self.PROCESSOR_SLOT, changed_only=True)))
+            requests = [(tag, value) for _, writes in batches for tag, _, value in writes]
+            statuses = self.session.MultiWrite(*requests) if requests else []
+            start = 0
+            for motor, writes in batches:
+                motor.commit_writes(writes, statuses[start:start+len(writes)])
+                start += len(writes)
+        else:
+            for set in self.live_motors_sets:
+                for motor in set.values():
+                    motor.write_to_motor(self.IP_ADDRESS, self.PROCESSOR_SLOT)
         # for motor in self.live_motors.values():
         #     motor.write_to_motor(self.IP_ADDRESS, self.PROCESSOR_SLOT)
 
@@ -1,5 +1,6 @@
-from modules.eip import PLC
-from typing import Any, Dict, List
+from modules.session import PLCSession
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Set, Tuple
 from logging import getLogger, Logger
 from modules.logging.log_utils import LOGGER_NAME
 import time
@@ -12,6 +13,17 @@ class Motor():
     For the drive state, warn word, and status word the meanings of each bit can be found
     in the 0185-1093-E_6V7_MA_MotionCtrlSW-SG5-SG7.pdf"""
     LOGGER: Logger = getLogger(LOGGER_NAME)
+    # param name -> (Wave_Control structure, member) the param is written to, in the order queue_writes sends them
+    PARAM_TAGS: Dict[str, Tuple[str, str]] = {
+        'Move Type': ('Motor', 'MoveType'), 'Profile': ('Motor', 'Profile'),
+        'Position 1': ('Motor', 'Pos_1'), 'Position 2': ('Motor', 'Pos_2'),
+        'Speed 1': ('Motor', 'Spd_1'), 'Speed 2': ('Motor', 'Spd_2'),
+        'Accel 1': ('Motor', 'Accel_1'), 'Accel 2': ('Motor', 'Accel_2'),
+        'Decel 1': ('Motor', 'Decel_1'), 'Decel 2': ('Motor', 'Decel_2'),
+        'Jerk 1': ('Motor', 'Jerk_1'), 'Jerk 2': ('Motor', 'Jerk_2'),
+        'Time 1': ('Motor', 'Time1'), 'Time 2': ('Motor', 'Time2'),
+        'Curve ID': ('Curve', 'Curve_ID'), 'Time Scale': ('Curve', 'TimeScale'),
+        'Amplitude Scale': ('Curve', 'AmplitudeScale'), 'Curve Offset': ('Curve', 'CurveOffset')}
     # whether the GUI is connected to the motors
     CONNECTED: bool
 
@@ -35,6 +47,10 @@ class Motor():
     write_params: Dict[str, int]
     # motion parameters that have most recently been written to the motor
     current_params: Dict[str, int]
+    # (tag, param name, value) writes collected by queue_writes, None when writing directly
+    pending_writes: List[Tuple[str, str, int]]
+    # while queue_writes is collecting, only params in here are queued. None queues every param
+    pending_params: Set[str]
 
     # Drive State
     statevar: str
@@ -45,7 +61,10 @@ class Motor():
     # Control Word
     control_word: str
 
-    def __init__(self, motor_ID: int, CONNECTED: bool):
+    # Connection to the PLC, normally the one shared by the Model
+    session: PLCSession
+
+    def __init__(self, motor_ID: int, CONNECTED: bool, session: PLCSession = None):
         # Checking the motor_ID
         if type(motor_ID) != int:
             raise Exception(
@@ -58,6 +77,7 @@ class Motor():
             self.axis_ID = motor_ID
 
         self.CONNECTED = CONNECTED
+        self.session = session
 
         self.home = False
         self.error = False
@@ -77,6 +97,8 @@ class Motor():
                              'Time 1': 0, 'Time 2': 0, 'Profile': 1, 'Move Type': 0, 'Curve ID': 0, 'Time Scale': 0,
                              'Amplitude Scale': 0, 'Curve Offset': 0}
         self.current_params = {}
+        self.pending_writes = None
+        self.pending_params = None
 
         # Call motor_sort to get the motors row and column position
         self.motor_sort()
@@ -105,6 +127,17 @@ class Motor():
                 final += f"{key}: {self.current_params[key]} \n"
         return final
 
+    @contextmanager
+    def _session(self, ip: str, slot: int) -> Iterator[PLCSession]:
+        """Session for a request this motor makes. A motor created without one (tests, scripts)
+        opens a session for the request and closes it afterwards, so nothing is left connected."""
+        session = self.session if self.session is not None else PLCSession(ip, slot)
+        try:
+            yield session
+        finally:
+            if session is not self.session:
+                session.close()
+
     def motor_sort(self):
         if self.axis_ID % 3 == 0:
             self.row = 1
@@ -119,9 +152,7 @@ class Motor():
     def DriveState(self, ip: str, slot: int):
         """Drive State from MotionCtrlSW-SG5-SG7."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
+            with self._session(ip, slot) as comm:
                 statevar_name = 'Program:Wave_Control.Axis[{0}].StateVar'.format(
                     self.axis_ID)
                 state: Any = comm.Read(statevar_name)
@@ -133,9 +164,7 @@ class Motor():
     def WarnWord(self, ip: str, slot: int):
         """Drive warn word from MotionCtrlSW-SG5-SG7."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
+            with self._session(ip, slot) as comm:
                 warnword_name = 'Program:Wave_Control.Axis[{0}].WarnWord'.format(
                     self.axis_ID)
                 warn: Any = comm.Read(warnword_name)
@@ -147,9 +176,7 @@ class Motor():
     def StatusWord(self, ip: str, slot: int):
         """Status word from MotionCtrlSW-SG5-SG7."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
+            with self._session(ip, slot) as comm:
                 statusword_name = 'Program:Wave_Control.Axis[{0}].StatusWord'.format(
                     self.axis_ID)
                 status: Any = comm.Read(statusword_name)
@@ -161,9 +188,7 @@ class Motor():
     def ControlWord(self, ip: str, slot: int):
         """Control word from MotionCtrlSW-SG5-SG7."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
+            with self._session(ip, slot) as comm:
                 controlword_name = 'Program:Wave_Control.Axis[{0}].ControlWord'.format(
                     self.axis_ID)
                 control: Any = comm.Read(controlword_name)
@@ -172,6 +197,16 @@ class Motor():
             self.control_word = 'Motors not currently connected.'
         return self.control_word
 
+    def update_from_axis(self, axis: Dict[str, Any]):
+        """Takes this drive's decoded Wave_Control.Axis[] structure (see Model.health_snapshot)
+        and updates the same fields the single tag reads above do, without going to the PLC."""
+        self.statevar = bin(axis['StateVar'])
+        self.warn_word = bin(axis['WarnWord'])
+        self.status_word = bin(axis['StatusWord'])
+        self.control_word = bin(axis['ControlWord'])
+        # bit 11 of the status word is Homed
+        self.home = bool(axis['StatusWord'] >> 11 & 1)
+
     def homed(self, ip: str, slot: int):
         """Is the drive homed? Checking the 12th bit of the Status Word for if the motor is homed or not"""
         if self.CONNECTED:
@@ -199,6 +234,32 @@ class Motor():
         """Calls all write functions on motor."""
         # attempt to write to all motors
         if self.CONNECTED:
+            writes = self.queue_writes(ip, slot)
+            with self._session(ip, slot) as session:
+                statuses = session.MultiWrite(*[(tag, value) for tag, _, value in writes])
+            self.commit_writes(writes, statuses)
+        else:
+            time.sleep(.5)
+            self.current_params = self.write_params.copy()
+            self.check_write_success()
+
+    def dirty_params(self) -> Set[str]:
+        """Params whose write_params value hasn't been written to the PLC yet."""
+        return {param for param, value in self.write_params.items()
+                if param not in self.current_params or self.current_params[param] != value}
+
+    def forget_written(self):
+        """Stop trusting current_params, e.g. the PLC may have restarted, so the next write sends everything."""
+        self.current_params = {}
+        self.write_success = False
+
+    def queue_writes(self, ip: str, slot: int, changed_only: bool = False) -> List[Tuple[str, str, int]]:
+        """Validates write_params and returns every (tag, param name, value) write
+        without sending anything, so writes for many motors can be batched together.
+        With changed_only, only the dirty_params are returned, every param is still validated."""
+        self.pending_writes = []
+        self.pending_params = self.dirty_params() if changed_only else None
+        try:
             self.write_movetype(ip, slot)
             self.write_profile(ip, slot)
             self.write_position(ip, slot)
@@ -208,41 +269,57 @@ class Motor():
             self.write_jerk(ip, slot)
             self.write_time(ip, slot)
             self.write_curve(ip, slot)
-        else:
-            time.sleep(.5)
-            self.current_params = self.write_params.copy()
-        # compare current and write dictionaries to determine if write was successful
+            return self.pending_writes
+        finally:
+            self.pending_writes = None
+            self.pending_params = None
+
+    def commit_writes(self, writes: List[Tuple[str, str, int]], statuses: List[int]):
+        """Records the writes the PLC accepted (status 0) as the motor's current_params."""
+        for (tag, param_name, value), status in zip(writes, statuses):
+            if status == 0:
+                self.current_params[param_name] = value
+            else:
+                self.LOGGER.error(f'Failed to write {tag}, CIP status {status}')
+        self.check_write_success()
+
+    def check_write_success(self):
+        """Compare current and write dictionaries to determine if write was successful."""
         if (self.current_params != self.write_params):
             self.write_success = False
             self.LOGGER.error('Not all values were written to motors.')
         else:
             self.write_success = True
 
-    def write_generic(self, ip: str, slot: int, param: str, param_name: str):
+    def write_tag(self, ip: str, slot: int, tag: str, param_name: str):
+        """Writes one param to the PLC, or queues it while queue_writes is collecting writes."""
+        value = self.write_params[param_name]
+        if self.pending_writes is not None:
+            if self.pending_params is None or param_name in self.pending_params:
+                self.pending_writes.append((tag, param_name, value))
+            return
+        with self._session(ip, slot) as session:
+            session.Write(tag, value)
+        self.current_params[param_name] = value
+
+    def param_tag(self, param_name: str) -> str:
+        """The tag on the PLC that holds this motor's param_name."""
+        structure, member = self.PARAM_TAGS[param_name]
+        return f'Program:Wave_Control.{structure}_{self.motor_ID}.{member}'
+
+    def param_tags(self) -> List[Tuple[str, str]]:
+        """(param name, tag) of every param, in the order queue_writes sends them."""
+        return [(param_name, self.param_tag(param_name)) for param_name in self.PARAM_TAGS]
+
+    def write_generic(self, ip: str, slot: int, param_name: str):
         """Generic method for writing to a motor param."""
-        with PLC() as comm:
-            comm.IPAddress = ip
-            comm.ProcessorSlot = slot
-
-            comm.Write(
-                f'Program:Wave_Control.Motor_{self.motor_ID}.{param}', self.write_params[param_name])
-            self.current_params[param_name] = self.write_params[param_name]
-
-    def write_generic_curve(self, ip: str, slot: int, param: str, param_name: str):
-        """Generic method for writing to a motor param."""
-        with PLC() as comm:
-            comm.IPAddress = ip
-            comm.ProcessorSlot = slot
-
-            comm.Write(
-                f'Program:Wave_Control.Curve_{self.motor_ID}.{param}', self.write_params[param_name])
-            self.current_params[param_name] = self.write_params[param_name]
+        self.write_tag(ip, slot, self.param_tag(param_name), param_name)
 
     def write_movetype(self, ip: str, slot: int):
         """Method for writingthe movetype of motor.
         Movetype should be Absolute(0) or Incremental(1)."""
         if self.write_params['Move Type'] == 0 or self.write_params['Move Type'] == 1:
-            self.write_generic(ip, slot, 'MoveType', 'Move Type')
+            self.write_generic(ip, slot, 'Move Type')
         else:
             raise Exception(
                 'The MoveType argument must be a 1 or a 0. 0 for absolute 1 for Incremental')
@@ -251,7 +328,7 @@ class Motor():
         """Method for writing movement profile the motor should use.
         Profile: Trapazoidal(0) Bestehorn(1) S-Curve(2) Sin(3)"""
         if self.write_params['Profile'] >= 0 and self.write_params['Profile'] <= 3:
-            self.write_generic(ip, slot, 'Profile', 'Profile')
+            self.write_generic(ip, slot, 'Profile')
         else:
             raise Exception(
                 'The argument for Profile must be an integer 0,1,2,3. Trapazoidal(0) Bestehorn(1) S-Curve(2) Sin(3)')
@@ -264,8 +341,8 @@ class Motor():
         elif self.write_params['Position 2'] > 368 or self.write_params['Position 2'] < -20:
             raise Exception('Position 2 out of stroke range')
         else:
-            self.write_generic(ip, slot, 'Pos_1', 'Position 1')
-            self.write_generic(ip, slot, 'Pos_2', 'Position 2')
+            self.write_generic(ip, slot, 'Position 1')
+            self.write_generic(ip, slot, 'Position 2')
 
     def write_speed(self, ip: str, slot: int):
         """Method for writing speed values."""
@@ -276,8 +353,8 @@ class Motor():
             raise Exception(
                 'Speed 2 is outside the bounds of the speed limits')
         else:
-            self.write_generic(ip, slot, 'Spd_1', 'Speed 1')
-            self.write_generic(ip, slot, 'Spd_2', 'Speed 2')
+            self.write_generic(ip, slot, 'Speed 1')
+            self.write_generic(ip, slot, 'Speed 2')
 
     def write_accel(self, ip: str, slot: int):
         """Method for writing accelarration values."""
@@ -288,8 +365,8 @@ class Motor():
             raise Exception(
                 'Accel 2 is outside the bounds of the acceleration limit')
         else:
-            self.write_generic(ip, slot, 'Accel_1', 'Accel 1')
-            self.write_generic(ip, slot, 'Accel_2', 'Accel 2')
+            self.write_generic(ip, slot, 'Accel 1')
+            self.write_generic(ip, slot, 'Accel 2')
 
     def write_decel(self, ip: str, slot: int):
         """Method for writing decelarration values."""
@@ -300,34 +377,31 @@ class Motor():
             raise Exception(
                 'Decel 2 is outside the bounds of the deceleration limit')
         else:
-            self.write_generic(ip, slot, 'Decel_1', 'Decel 1')
-            self.write_generic(ip, slot, 'Decel_2', 'Decel 2')
+            self.write_generic(ip, slot, 'Decel 1')
+            self.write_generic(ip, slot, 'Decel 2')
 
     def write_jerk(self, ip: str, slot: int):
         """Method for writing Jerk values."""
-        self.write_generic(ip, slot, 'Jerk_1', 'Jerk 1')
-        self.write_generic(ip, slot, 'Jerk_2', 'Jerk 2')
+        self.write_generic(ip, slot, 'Jerk 1')
+        self.write_generic(ip, slot, 'Jerk 2')
 
     def write_time(self, ip: str, slot: int):
         """Method for writing Time values."""
-        self.write_generic(ip, slot, 'Time1', 'Time 1')
-        self.write_generic(ip, slot, 'Time2', 'Time 2')
+        self.write_generic(ip, slot, 'Time 1')
+        self.write_generic(ip, slot, 'Time 2')
 
     def write_curve(self, ip: str, slot: int):
         """Method for writing curve values."""
-        self.write_generic_curve(ip, slot, 'Curve_ID', 'Curve ID')
-        self.write_generic_curve(ip, slot, 'TimeScale', 'Time Scale')
-        self.write_generic_curve(ip, slot, 'AmplitudeScale', 'Amplitude Scale')
-        self.write_generic_curve(ip, slot, 'CurveOffset', 'Curve Offset')
+        self.write_generic(ip, slot, 'Curve ID')
+        self.write_generic(ip, slot, 'Time Scale')
+        self.write_generic(ip, slot, 'Amplitude Scale')
+        self.write_generic(ip, slot, 'Curve Offset')
 
     def read_movetype(self, ip: str, slot: int):
         """Method for reading the movetype of motor. 
         Movetype should be Absolute(0) or Incremental(1)."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
-
+            with self._session(ip, slot) as comm:
                 move_type: Any = comm.Read(
                     'Program:Wave_Control.motor_{0}.MoveType'.format(self.motor_ID))
                 assert(type(move_type) == int)
@@ -337,10 +411,7 @@ class Motor():
         """Method for reading movement profile the motor should use.
         Profile: Trapazoidal(0) Bestehorn(1) S-Curve(2) Sin(3)"""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
-
+            with self._session(ip, slot) as comm:
                 profile: Any = comm.Read(
                     'Program:Wave_Control.Motor_{0}.Profile'.format(self.motor_ID))
                 assert(type(profile) == int)
@@ -349,10 +420,7 @@ class Motor():
     def read_position(self, ip: str, slot: int):
         """Method for reading Position values."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
-
+            with self._session(ip, slot) as comm:
                 pos1: Any = comm.Read(
                     'Program:Wave_Control.Motor_{0}.Pos_{1}'.format(self.motor_ID, 1))
                 pos2: Any = comm.Read(
@@ -364,10 +432,7 @@ class Motor():
     def read_speed(self, ip: str, slot: int):
         """Method for reading speed values."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
-
+            with self._session(ip, slot) as comm:
                 self.Speed_1 = comm.Read(
                     'Program:Wave_Control.Motor_{0}.Spd_{1}'.format(self.motor_ID, 1))
                 self.Speed_2 = comm.Read(
@@ -376,10 +441,7 @@ class Motor():
     def read_accel(self, ip: str, slot: int):
         """Method for reading accelarration values."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
-
+            with self._session(ip, slot) as comm:
                 self.Accel_1 = comm.Read(
                     'Program:Wave_Control.Motor_{0}.Accel_{1}'.format(self.motor_ID, 1))
                 self.Accel_2 = comm.Read(
@@ -388,9 +450,7 @@ class Motor():
     def read_decel(self, ip: str, slot: int):
         """Method for reading decelarration values."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
+            with self._session(ip, slot) as comm:
                 self.Decel_1 = comm.Read(
                     'Program:Wave_Control.Motor_{0}.Decel_{1}'.format(self.motor_ID, 1))
                 self.Decel_2 = comm.Read(
@@ -399,10 +459,7 @@ class Motor():
     def read_jerk(self, ip: str, slot: int):
         """Method for reading Jerk values."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
-
+            with self._session(ip, slot) as comm:
                 self.Jerk_1 = comm.Read(
                     'Program:Wave_Control.Motor_{0}.Jerk_{1}'.format(self.motor_ID, 1))
                 self.Jerk_2 = comm.Read(
@@ -411,10 +468,7 @@ class Motor():
     def read_time(self, ip: str, slot: int):
         """Method for reading Time values."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
-
+            with self._session(ip, slot) as comm:
                 self.Time_1 = comm.Read(
                     'Program:Wave_Control.Motor_{0}.Time{1}'.format(self.motor_ID, 1))
                 self.Time_2 = comm.Read(
@@ -423,10 +477,7 @@ class Motor():
     def read_curve(self, ip: str, slot: int):
         """Method for reading curve values."""
         if self.CONNECTED:
-            with PLC() as comm:
-                comm.IPAddress = ip
-                comm.ProcessorSlot = slot
-
+            with self._session(ip, slot) as comm:
                 self.Curve_ID = comm.Read(
                     'Program:Wave_Control.Curve_{0}.Curve_ID'.format(self.motor_ID))
                 self.TimeScale = comm.Read(
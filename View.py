@@ -46,9 +46,17 @@ class View:
         # Bind to the <<NotebookTabChanged>> event
         self.tabControl.bind("<<NotebookTabChanged>>", self.tabChanged)
 
+        # close the PLC session cleanly when the window is closed
+        self.root.protocol("WM_DELETE_WINDOW", self.onClose)
+
         # start the GUI
         self.root.mainloop()
 
+    def onClose(self):
+        """Releases the PLC connection before the window is destroyed."""
+        self.model.shutdown()
+        self.root.destroy()
+
     def tabChanged(self, event):
         """Checks which tab is selected and then runs that tabs onSelect method."""
         sTab: int = self.tabControl.index(self.tabControl.select())
@@ -0,0 +1,62 @@
+'''
+Bytes on the wire with tags addressed by name and by symbol
+instance ID, for the writes attr_write sends (14 parameters
+for each of 30 motors) and the status reads of every axis.
+Runs against testing/plc_simulator.py, once at the standard
+500 byte connection size and once with a large connection.
+
+    python -m benchmarks.instance_addressing_bench
+'''
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip import PLC, _compileTag
+from modules.tag_catalog import TagCatalog
+from testing.plc_simulator import PLCSimulator
+
+PARAMS = ['Pos_1', 'Pos_2', 'Spd_1', 'Spd_2', 'Accel_1', 'Accel_2', 'Decel_1', 'Decel_2',
+          'Jerk_1', 'Jerk_2', 'Time1', 'Time2', 'Profile', 'MoveType']
+WRITES = [(f'Program:Wave_Control.Motor_{n}.{param}', 100) for n in range(1, 31) for param in PARAMS]
+READS = [f'Program:Wave_Control.Axis[{n}].{member}' for n in range(30)
+         for member in ('StatusWord', 'ComActualPosition')]
+
+
+def measure(port, instanceAddressing, connectionSize):
+    comm = PLC()
+    comm.IPAddress = '127.0.0.1'
+    comm.Port = port
+    comm.ConnectionSize = connectionSize
+    catalog = TagCatalog()
+    catalog.Attach(comm)
+    catalog.Refresh(comm)
+    comm.InstanceAddressing = instanceAddressing
+    try:
+        # first pass learns the data types, only the second is counted
+        comm.MultiWrite(*WRITES)
+        comm.MultiRead(*READS)
+        ioi = sum(len(_compileTag(comm, tag, None).IOI) for tag, value in WRITES) / len(WRITES)
+        stats = comm.EnableStats()
+        comm.MultiWrite(*WRITES)
+        comm.MultiRead(*READS)
+    finally:
+        comm.Close()
+    packets = stats.Summary()['services']['Multiple Service Packet']
+    return ioi, packets['count'], packets['bytes_sent']
+
+def main():
+    with PLCSimulator() as simulator:
+        print(f'{len(WRITES)} parameter writes and {len(READS)} axis reads')
+        print(f'{"connection":>12}{"addressing":>12}{"IOI bytes":>11}{"packets":>9}{"bytes sent":>12}')
+        for connectionSize in (500, 4000):
+            before = None
+            for instanceAddressing in (False, True):
+                ioi, packets, sent = measure(simulator.port, instanceAddressing, connectionSize)
+                name = 'instance' if instanceAddressing else 'symbolic'
+                saving = f'{1 - sent/before:8.1%} less' if before else ''
+                print(f'{connectionSize:>12}{name:>12}{ioi:>11.1f}{packets:>9}{sent:>12}  {saving}')
+                before = sent
+
+if __name__ == '__main__':
+    main()
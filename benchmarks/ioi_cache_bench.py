@@ -0,0 +1,59 @@
+'''
+Per-call CPU cost of Read/Write with and without the compiled
+tag (IOI) cache.  The "before" numbers run the same steps the
+uncached _readTag/_writeTag did: parse the name, build the IOI,
+add the service, build the header and parse the reply.
+
+    python -m benchmarks.ioi_cache_bench
+'''
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip import (PLC, TagNameParser, InitialRead, _buildTagIOI, _addReadIOI, _addWriteIOI,
+                         _buildEIPHeader, _getBytes, _parseReply)
+from benchmarks.loopback import loopback_plc
+
+PARAMS = ['Pos_1', 'Pos_2', 'Spd_1', 'Spd_2', 'Accel_1', 'Accel_2', 'Decel_1', 'Decel_2', 'Jerk_1', 'Jerk_2']
+TAGS = [f'Program:Wave_Control.Motor_{n}.{param}' for n in range(1, 31) for param in PARAMS] + \
+       [f'Program:Wave_Control.Axis[{n}].ComActualPosition' for n in range(30)]
+
+
+def uncached_read(comm, tag):
+    t, b, i = TagNameParser(tag, 0)
+    InitialRead(comm, t, b, None)
+    tagData = _buildTagIOI(comm, tag, isBoolArray=False)
+    readRequest = _addReadIOI(comm, tagData, 1)
+    status, retData = _getBytes(comm, _buildEIPHeader(comm, readRequest))
+    return _parseReply(comm, tag, 1, retData)
+
+def uncached_write(comm, tag, value):
+    t, b, i = TagNameParser(tag, 0)
+    InitialRead(comm, t, b, None)
+    dataType = comm.KnownTags[b][0]
+    tagData = _buildTagIOI(comm, tag, isBoolArray=False)
+    writeRequest = _addWriteIOI(comm, tagData, [int(value)], dataType)
+    return _getBytes(comm, _buildEIPHeader(comm, writeRequest))
+
+def per_call(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for tag in TAGS:
+            fn(tag)
+    return (time.perf_counter() - start) / (rounds * len(TAGS)) * 1e6
+
+def main(rounds=200):
+    comm = loopback_plc(PLC(), TAGS)
+    results = [('read', per_call(lambda t: uncached_read(comm, t), rounds), per_call(comm.Read, rounds)),
+               ('write', per_call(lambda t: uncached_write(comm, t, 500), rounds),
+                per_call(lambda t: comm.Write(t, 500), rounds))]
+
+    print(f'{len(TAGS)} tags x {rounds} rounds, microseconds per call')
+    print(f'{"":8}{"uncached":>12}{"compiled":>12}{"speedup":>10}')
+    for name, before, after in results:
+        print(f'{name:8}{before:12.2f}{after:12.2f}{before/after:9.1f}x')
+
+if __name__ == '__main__':
+    main()
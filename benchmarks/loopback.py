@@ -0,0 +1,77 @@
+'''
+A stand-in for the PLC socket so the CPU cost of building
+requests and parsing replies can be timed without a network.
+Every send is answered with a canned reply of the right shape
+'''
+
+from struct import pack, unpack_from
+
+
+class LoopbackSocket:
+
+    def __init__(self, value=1234):
+        self.value = value
+        self.pending = b""
+        self.sent = 0
+
+    def send(self, data):
+        self.sent += len(data)
+        service = data[46]
+        if service == 0x4C:
+            # read reply: type code then a DINT value
+            cip = pack('<BBBBHi', 0xCC, 0, 0, 0, 0xC4, self.value)
+        elif service == 0x0A:
+            cip = _multiServiceReply(data[46:], self.value)
+        else:
+            cip = pack('<BBBB', service | 0x80, 0, 0, 0)
+        # sequence count + reply, wrapped in the connected data item
+        item = data[44:46] + cip
+        encap = bytearray(data[:44]) + item
+        encap[2:4] = pack('<H', len(encap) - 24)
+        encap[42:44] = pack('<H', len(item))
+        self.pending += bytes(encap)
+        return len(data)
+
+    def recv(self, size):
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def recv_into(self, buffer, size=0):
+        size = size or len(buffer)
+        data = self.recv(size)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        pass
+
+def _multiServiceReply(request, value):
+    count = unpack_from('<H', request, 6)[0]
+    replies = []
+    for i in range(count):
+        offset = unpack_from('<H', request, 8 + i*2)[0]
+        service = request[6 + offset]
+        if service == 0x4C:
+            replies.append(pack('<BBBBHi', 0xCC, 0, 0, 0, 0xC4, value))
+        else:
+            replies.append(pack('<BBBB', service | 0x80, 0, 0, 0))
+
+    offsets = b""
+    position = 2 + 2*count
+    for reply in replies:
+        offsets += pack('<H', position)
+        position += len(reply)
+    return pack('<BBBBH', 0x8A, 0, 0, 0, count) + offsets + b"".join(replies)
+
+def loopback_plc(plc, tags, value=1234):
+    '''
+    Points a PLC at a LoopbackSocket as if it were connected
+    and tells it every tag is a DINT so no discovery is needed
+    '''
+    plc.Socket = LoopbackSocket(value)
+    plc.SocketConnected = True
+    plc.OTNetworkConnectionID = 1
+    for tag in tags:
+        base = tag.split('[')[0] if tag.endswith(']') else tag
+        plc.KnownTags[base] = (196, 0)
+    return plc
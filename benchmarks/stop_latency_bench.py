@@ -0,0 +1,110 @@
+'''
+How long Stop takes to reach the PLC while analytics are being
+recorded for all 30 motors: from stop_motion() being called to
+Run_2 = 0 having been written. Every sample is a TELEMETRY
+command on the command actor, so a stop waits for at most the
+one sample read in flight. For comparison, "in-line" holds the
+worker for the whole recording like record_positions used to,
+and one request is the time a sample's MultiRead takes.
+Runs against testing/plc_simulator.py.
+
+    python -m benchmarks.stop_latency_bench
+'''
+
+import sys
+import os
+import random
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Motor import Motor
+from modules.session import PLCSession
+from testing.plc_simulator import PLCSimulator
+from testing.simulated_model import ColdStartModel, View
+
+TRIALS = 50
+INLINE_TRIALS = 10
+# seconds of recording the in-line run holds the worker for
+INLINE_DURATION = 1.0
+
+
+class BenchModel(ColdStartModel):
+    RECORD_ANALYTICS = True
+    ANALYTICS_DURATION = 600
+
+    def save_analytics(self, data):
+        pass
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+def request_times(model, count=200):
+    tags = model.recorder.tags
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        model.session.MultiRead(*tags)
+        times.append(time.perf_counter() - start)
+    return times
+
+def stop_latency(model, interval):
+    '''Starts a recording, stops it at a random moment, returns how long the stop took.'''
+    model.ANALYTICS_INTERVAL = interval
+    model.state = 1
+    model.thread_motion(2, 0).result()
+    time.sleep(random.uniform(0.05, 0.05 + 2 * interval))
+    start = time.perf_counter()
+    model.stop_motion(2).result()
+    latency = time.perf_counter() - start
+    model.recorder.done.result()
+    return latency
+
+def inline_latency(model, interval):
+    '''The same with the whole recording as one command, as before samples were split up.'''
+    tags = model.recorder.tags
+
+    def record():
+        next_sample = time.monotonic()
+        for _ in range(int(INLINE_DURATION / interval)):
+            model.session.MultiRead(*tags)
+            next_sample += interval
+            time.sleep(max(0, next_sample - time.monotonic()))
+
+    model.session.Write('Program:Wave_Control.Run_2', 1)
+    recording = model.actor.submit(record)
+    time.sleep(random.uniform(0.05, INLINE_DURATION / 2))
+    start = time.perf_counter()
+    model.stop_motion(2).result()
+    latency = time.perf_counter() - start
+    recording.result()
+    return latency
+
+def row(name, interval, times):
+    ms = [t * 1000 for t in times]
+    interval = '' if interval is None else f'{interval:.2f}'
+    print(f'{name:>14}{interval:>10}{percentile(ms, 0.5):>10.2f}{percentile(ms, 0.95):>10.2f}{max(ms):>10.2f}')
+
+def main():
+    with PLCSimulator() as simulator, tempfile.TemporaryDirectory() as directory:
+        PLCSession.CACHE_DIR = directory
+        BenchModel.ANALYTICS_DIR = directory
+        BenchModel.PLC_PORT = simulator.port
+        model = BenchModel()
+        model.register_view(View())
+        model.live_motors = {n: Motor(n, True, model.session) for n in range(30)}
+        try:
+            stop_latency(model, 0.25)
+            print(f'stop latency with {len(model.live_motors)} axes recorded, over {TRIALS} stops (ms)')
+            print(f'{"":>14}{"interval":>10}{"median":>10}{"p95":>10}{"max":>10}')
+            row('one request', None, request_times(model))
+            for interval in (0.25, 0.05, 0.0):
+                row('telemetry', interval, [stop_latency(model, interval) for _ in range(TRIALS)])
+            row('in-line', 0.05, [inline_latency(model, 0.05) for _ in range(INLINE_TRIALS)])
+        finally:
+            model.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ from tkinter import Button, StringVar, IntVar, Message, Radiobutton, Label, Chec
 from Model import Model  # todo back to model
 from logging import getLogger, Logger
 from modules.logging.log_utils import LOGGER_NAME
+from modules.command_actor import when_done
 
 
 class ControlHome:
@@ -20,6 +21,8 @@ class ControlHome:
         self.tab = ttk.Frame(root)
         self.model = model
         self.model.register_view(self)
+        # the model's commands update this tab through its view queue, drained on the Tk thread
+        self.model.ui.attach(self.tab)
         # set up and place title and content frames
         self.title_frame = ttk.Frame(self.tab, padding=25)
         self.content_frame = ttk.Frame(self.tab, padding=25)
@@ -144,6 +147,9 @@ class ControlHome:
         else:
             self.stop_button['state'] = 'normal'
     
+    def enable_curve(self):
+        self.curve_button['state'] = 'normal'
+
     def destory_progress_bar(self):
         self.progress_bar.destroy()
         self.label_percentage.destroy()
@@ -201,16 +207,21 @@ class ControlHome:
         else:
             # set message box to writing message
             self.msgvar.set('Writing attributes to motors...')
-            self.model.attr_write()
-            # TODO: need to determine how long to set this time
-            self.tab.after(2000, lambda: self.home_motors(
-                motion_type=motion_type))
+            # home once the write has gone out
+            when_done(self.tab, self.model.actor.submit(self.model.attr_write),
+                      lambda future: self.motors_written(future, motion_type))
+
+    def motors_written(self, future, motion_type: int):
+        """Homes once the write queued by prepare_motors has gone out."""
+        if not self.command_failed(future, 'write to motors'):
+            self.home_motors(motion_type=motion_type)
 
     def home_motors(self, motion_type: int):
         """Part two of the start sequence. Attempts to home the motors."""
         if self.model.write_success():
             self.msgvar.set('Homing motors...')
-            self.model.thread_motor_home()
+            when_done(self.tab, self.model.thread_motor_home(),
+                      lambda future: self.command_failed(future, 'home motors'))
             
             # ready: bool = True
             # for motor in self.model.live_motors.values():
@@ -236,12 +247,17 @@ class ControlHome:
         # This allows parameter updates after stopping without requiring rehoming
         if not self.model.written_matches_current():
             self.msgvar.set('Parameters changed - updating motors...')
-            self.model.attr_write()
             # Wait for write to complete
-            self.tab.after(1000, lambda: self._continue_start_motors(motion_type, is_curve))
+            when_done(self.tab, self.model.actor.submit(self.model.attr_write),
+                      lambda future: self.motors_updated(future, motion_type, is_curve))
             return
         
         self._continue_start_motors(motion_type, is_curve)
+
+    def motors_updated(self, future, motion_type: int, is_curve: bool):
+        """Starts the motors once the write queued by start_motors has gone out."""
+        if not self.command_failed(future, 'update motors'):
+            self._continue_start_motors(motion_type, is_curve)
     
     def _continue_start_motors(self, motion_type: int, is_curve: bool):
         """Continue starting motors after parameter update (if needed)."""
@@ -258,12 +274,14 @@ class ControlHome:
             
         if is_curve:
             self.msgvar.set('Starting curve...')
-            self.model.thread_curve()
+            future = self.model.thread_curve()
+            when_done(self.tab, future, lambda future: self.command_failed(future, 'run curve'))
             # TODO: need to determine how long to set this time
-            self.tab.after(2000, lambda: self.msgvar.set('Curve running'))
+            self.tab.after(2000, lambda: future.done() or self.msgvar.set('Curve running'))
         else:
             #self.msgvar.set('Starting motors...')
-            self.model.thread_motion(motion_type, 0)
+            when_done(self.tab, self.model.thread_motion(motion_type, 0),
+                      lambda future: self.command_failed(future, 'run motors'))
             # TODO: need to determine how long to set this time
             #self.tab.after(2000, lambda: self.msgvar.set('Motors running'))
         
@@ -276,19 +294,39 @@ class ControlHome:
         """Method for stopping motors while running."""
         self.stop_button['state']='disabled'
         self.msgvar.set('Stopping motors...')
-        self.model.motion(motion_type, 1)
-        self.msgvar.set('Motors stopped')
+        # the stop goes ahead of anything queued, the message changes once it has gone out
+        when_done(self.tab, self.model.stop_motion(motion_type), self.motors_stopped)
         ##self.start_button['state'] = 'normal'
         ##self.curve_button['state'] = 'normal'
         ##self.prepare_button['state'] = 'disabled'
         ##self.stop_button['state']='disabled'
     
 
+    def motors_stopped(self, future):
+        """Shows how the stop queued by stop_motors went."""
+        if not self.command_failed(future, 'stop motors'):
+            self.msgvar.set('Motors stopped')
+
+    def command_failed(self, future, action: str) -> bool:
+        """Shows the error a command queued on the model's actor raised, if it did, and puts the
+        buttons back the way the model's state says. Returns True if it failed."""
+        if future.exception() is None:
+            return False
+        self.msgvar.set(f'Unable to {action}: {future.exception()}')
+        self.update_button_status()
+        return True
+
     def off_and_reset(self):
         """Performs a complete application reset - returns everything to initial startup state."""
-        # Call comprehensive reset on model
-        self.model.full_application_reset()
-        
+        # Call comprehensive reset on model, the UI is reset once it has run
+        self.msgvar.set('Turning motors off...')
+        when_done(self.tab, self.model.actor.submit(self.model.full_application_reset),
+                  self.reset_ui)
+
+    def reset_ui(self, future):
+        """Second half of off_and_reset, run once the model has been reset."""
+        if self.command_failed(future, 'turn motors off'):
+            return
         # Reset all UI elements on Control Home tab
         self.update_button_status()  # This will enable prepare button since state = 0 after reset
         self.color_motors_green()
@@ -371,7 +409,7 @@ Analytics from multiple runs on the same day will be in the same file, but will
     
 This can only be done when the motors are run continuously.
         
-NOTE: Since this information is pulled during runtime, the motors will appear unresponsive, and can't be stopped (right now) while information is being collected. By default, information is collected every 1/4 of a second for 10 seconds. After 10 seconds, the motors can be stopped.
+NOTE: Information is sampled between other commands, so the motors can be stopped at any time. Stopping the motors ends the recording. By default, information is collected every 1/4 of a second for 10 seconds.
 
 We suggest that you test run your parameters first to ensure they won't fault the machine, then run again with analytics.
     """
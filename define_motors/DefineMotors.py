@@ -6,6 +6,7 @@ from typing import Dict, List, Any
 from Model import Model
 from Motor import Motor
 from modules.tooltip import Tooltip
+from modules.command_actor import when_done
 # use partial when making event handlers with arguments
 from functools import partial
 
@@ -67,7 +68,9 @@ class DefineMotors:
         for i in range(30):
             self.checkButtons.append(Checkbutton(
                 self.motor_frame, text=f'Motor {i}', variable=self.intVars[i], command=partial(model.onCheck, i, self.intVars[i])))
-            self.model.motdict[i] = 0
+            # motors taken over by a warm start are already in a set
+            if self.model.motdict.setdefault(i, 0) == 2:
+                self.checkButtons[i].select()
             self.checkButtonTips.append(
                 Tooltip(self.checkButtons[i], "Deactivated"))
 
@@ -152,6 +155,10 @@ class DefineMotors:
         #self.movement_frame_enable()
         self.param_frame_enable()
         self.color_buttons_green()
+        # show the sets a warm start rebuilt
+        self.setsStringVar.set(self.motorSet_to_string())
+        self.sets_label.config(text=self.setsStringVar.get())
+        self.update_checkbutton_tips()
 
         # Add tab name for Define Motors
         root.add(self.tab, text=' Define Motors')
@@ -293,7 +300,14 @@ class DefineMotors:
             if val.lstrip('-').isnumeric():
                 current_ui_params[param] = int(val)
         
-        self.model.motor_define()
+        # the UI follows once the drives are defined
+        when_done(self.tab, self.model.actor.submit(self.model.motor_define),
+                  lambda future: self.motors_defined(future, current_ui_params))
+
+    def motors_defined(self, future, current_ui_params: Dict[str, int]):
+        """Second half of motor_define, run once the model has defined the motors."""
+        if self.command_failed(future, 'define motors'):
+            return
         self.confirm_sets_button['state'] = 'enable'
         
         # Apply current UI params to newly created motors (so they inherit screen values, not defaults)
@@ -348,9 +362,14 @@ class DefineMotors:
 
     def motor_off(self):
         """Performs a complete application reset - returns everything to initial startup state."""
-        # Call comprehensive reset on model to reset all state variables
-        self.model.full_application_reset()
-        
+        # Call comprehensive reset on model to reset all state variables, the UI follows once it has run
+        when_done(self.tab, self.model.actor.submit(self.model.full_application_reset),
+                  self.reset_ui)
+
+    def reset_ui(self, future):
+        """Second half of motor_off, run once the model has been reset."""
+        if self.command_failed(future, 'turn motors off'):
+            return
         # Reset all motor checkboxes to unchecked state
         for i in range(len(self.checkButtons)):
             self.checkButtons[i].deselect()
@@ -387,10 +406,24 @@ class DefineMotors:
     def stop_motors(self):
         """Stop motors - mirrors ControlHome stop_motors functionality."""
         self.stop_button['state'] = 'disabled'
-        # Call model motion with tracker=1 to stop
+        # Call model motion with tracker=1 to stop, ahead of anything queued
         # Use motion_type 2 (continuous) since that's what needs stopping
-        self.model.motion(2, 1)
-        self.model.LOGGER.info("Motors stopped from Define Motors tab")
+        when_done(self.tab, self.model.stop_motion(2), self.motors_stopped)
+
+    def motors_stopped(self, future):
+        """Logs how the stop queued by stop_motors went."""
+        if not self.command_failed(future, 'stop motors'):
+            self.model.LOGGER.info("Motors stopped from Define Motors tab")
+
+    def command_failed(self, future, action: str) -> bool:
+        """Shows the error a command queued on the model's actor raised, if it did, in Control Home's
+        message box. Returns True if it failed."""
+        if future.exception() is None:
+            return False
+        if hasattr(self.model, 'view'):
+            self.model.view.update_msg(f'Unable to {action}: {future.exception()}')
+        self.update_stop_button_status()
+        return True
 
     def update_stop_button_status(self):
         """Update stop button state based on model state. Called by model.notify_view()."""
@@ -16,7 +16,8 @@ from Model import Model
 
 def main() -> None:
     model: Model = Model()
-    if model.CONNECTED:
+    # a warm start keeps the motors the PLC already has running
+    if model.CONNECTED and not model.warm_started:
         model.motor_off()
     view: View = View(model)
 
@@ -0,0 +1,118 @@
+from concurrent.futures import Future
+from itertools import count
+from logging import getLogger, Logger
+from heapq import heappop, heappush
+from threading import Condition, Thread
+from typing import Any, Callable, List, Tuple
+import time
+from modules.logging.log_utils import LOGGER_NAME
+
+
+def when_done(widget, future: Future, callback: Callable[[Future], None], interval: int = 50):
+    """Calls callback(future) once future is done, from the Tk thread: widget.after checks on it
+    every interval ms. Tk widgets may only be touched from the thread running mainloop, so this
+    is how the views pick up the result of a command."""
+    if future.done():
+        callback(future)
+    else:
+        widget.after(interval, when_done, widget, future, callback, interval)
+
+
+class CommandActor:
+    """The one thread that talks to the PLC on behalf of the GUI.
+
+    Commands are queued with submit() and run one at a time by a single worker, lowest priority
+    number first and in submission order within a priority, so two commands never interleave their
+    requests and a button press never blocks the Tk thread. submit() returns a Future holding the
+    command's result or the exception it raised. schedule() queues a command once a delay has passed.
+
+    There are three classes of traffic: STOP, CONTROL (every other button) and TELEMETRY (analytics
+    sampling). A running command isn't interrupted, so long jobs like sampling are split into one
+    short command per request: a STOP waits for at most the request in flight, then overtakes
+    every CONTROL and TELEMETRY command still waiting."""
+    LOGGER: Logger = getLogger(LOGGER_NAME)
+    # priorities, lower runs first
+    STOP: int = 0
+    CONTROL: int = 1
+    TELEMETRY: int = 2
+
+    # heap of (priority, sequence, function, args, future) ready to run
+    ready: List[Tuple]
+    # heap of (due time.monotonic(), sequence, priority, function, args, future) waiting for their time
+    timers: List[Tuple]
+    # tie breaker so equal priorities run in the order they were submitted
+    sequence: count
+    # runs the commands, a daemon so a stuck command can't keep the process alive
+    worker: Thread
+    # set by close(), nothing more is accepted
+    closed: bool
+    # guards ready, timers and closed, and wakes the worker when they change
+    condition: Condition
+
+    def __init__(self, name: str = 'plc-commands'):
+        self.ready = []
+        self.timers = []
+        self.sequence = count()
+        self.closed = False
+        self.condition = Condition()
+        self.worker = Thread(target=self._run, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, fn: Callable[..., Any], *args, priority: int = CONTROL) -> Future:
+        """Queues fn(*args) and returns the Future of its result."""
+        return self.schedule(0, fn, *args, priority=priority)
+
+    def schedule(self, delay: float, fn: Callable[..., Any], *args, priority: int = CONTROL) -> Future:
+        """Queues fn(*args) once delay seconds have passed and returns the Future of its result.
+        It then waits its turn like any other command of its priority."""
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('The PLC command queue is closed.')
+            if delay > 0:
+                heappush(self.timers, (time.monotonic() + delay, next(self.sequence), priority, fn, args, future))
+            else:
+                heappush(self.ready, (priority, next(self.sequence), fn, args, future))
+            self.condition.notify()
+        return future
+
+    def _next(self) -> Tuple:
+        """Waits for the next command to run, None once closed."""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                while self.timers and self.timers[0][0] <= now:
+                    _, sequence, priority, fn, args, future = heappop(self.timers)
+                    heappush(self.ready, (priority, sequence, fn, args, future))
+                if self.ready:
+                    return heappop(self.ready)
+                if self.closed:
+                    return None
+                self.condition.wait(self.timers[0][0] - now if self.timers else None)
+
+    def _run(self):
+        while True:
+            command = self._next()
+            if command is None:
+                return
+            _, _, fn, args, future = command
+            # a command cancelled while it waited is dropped
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                self.LOGGER.error(f'PLC command {getattr(fn, "__name__", fn)} failed: {e}')
+                future.set_exception(e)
+
+    def close(self, timeout: float = None):
+        """Shutdown hook: cancels the commands still waiting, lets the running one finish and stops the worker.
+        Gives up waiting after timeout seconds."""
+        with self.condition:
+            self.closed = True
+            for command in self.ready + self.timers:
+                command[-1].cancel()
+            self.ready = []
+            self.timers = []
+            self.condition.notify()
+        self.worker.join(timeout)
@@ -19,15 +19,36 @@
 
 from datetime import datetime, timedelta
 from modules.lgxDevice import *
+import json
 import math
+import os
+from modules.eip_stats import RequestStats
 from random import randrange
+import selectors
 import socket
 from struct import *
 import sys
 import time
 
+try:
+    import numpy as np
+except ImportError:
+    # only ReadArray needs it
+    np = None
+
 programNames = []
 
+# the connected message header is the same layout every time
+EIPHeaderStruct = Struct('<HHIIQIIHHHHIHHH')
+
+# bump when the layout of the tag cache file changes
+TagCacheVersion = 1
+
+# seconds Discover() answers from its last results instead of asking the network again
+DiscoveryCacheTTL = 30.0
+# (address, port) -> (time.monotonic() of the discovery, devices found)
+_discoveryCache = {}
+
 class PLC:
 
     def __init__(self):
@@ -51,8 +72,27 @@ class PLC:
         self.SequenceCounter = 1
         self.Offset = 0
         self.KnownTags = {}
+        self.CompiledTags = {}
+        # template instance -> compiled UDTTemplate
+        self.Templates = {}
+        # TagCatalog symbols and templates are looked up in, see modules/tag_catalog.py
+        self.Catalog = None
+        # address compiled tags by symbol instance ID from the Catalog rather than by name,
+        # turned back off if the controller turns out not to support it
+        self.InstanceAddressing = False
+        self.InstanceAddressingChecked = False
+        # file KnownTags is loaded from on connect and saved to on close, None to disable
+        self.TagCacheFile = None
+        self.TagCacheFingerprint = None
+        self.TagCacheCount = 0
         self.TagList = []
         self.StructIdentifier = 0x0fCE
+        # bytes per connected message, above 511 a Large Forward Open is tried first
+        self.ConnectionSize = 500
+        # replies are received into this, grown if a bigger one comes in
+        self.ReceiveBuffer = memoryview(bytearray(4096))
+        # RequestStats every request is recorded in, None to skip the bookkeeping
+        self.Stats = None
         self.Version = '0.2.0'
         self.CIPTypes = {160:(88 ,"STRUCT", 'B'),
                          193:(1, "BOOL", '?'),
@@ -97,12 +137,50 @@ class PLC:
         '''
         return _writeTag(self, tag, value, datatype)
 
+    def WriteBits(self, tag, bits):
+        '''
+        Set and clear several bits of an integer tag in one
+        request.  bits is {bit number: value}, bit numbers past
+        the first word carry on into the next array element.
+        The bits of each word go out as one read-modify-write
+        (0x4E) with a combined OR/AND mask, other bits are left
+        as they are
+        '''
+        return _writeBits(self, tag, bits)
+
     def MultiRead(self, *args):
         '''
         Read multiple tags in one request
         '''
         return _multiRead(self, args)
 
+    def MultiWrite(self, *args):
+        '''
+        Write multiple tags in as few requests as possible
+        args are (tag, value) pairs, returns the CIP status
+        of each write in the same order (0 is success)
+        '''
+        return _multiWrite(self, args)
+
+    def ReadArray(self, tag, count, dtype=None):
+        '''
+        Read count elements of an array into a numpy array,
+        tag is the first element to read ("Axis[0]").  Arrays
+        of structures get a structured dtype built from the
+        UDT's template unless one is passed.  Needs numpy
+        '''
+        return _readArray(self, tag, count, dtype)
+
+    def ReadUDTArray(self, tag, count, instance=None):
+        '''
+        Read count elements of an array of structures in one
+        go and decode each into a dict of member values, tag
+        is the first element to read ("Axis[0]").  The UDT's
+        template is found from the tag list unless its
+        instance is passed
+        '''
+        return _readUDTArray(self, tag, count, instance)
+
     def GetPLCTime(self):
         '''
         Get the PLC's clock time
@@ -138,6 +216,13 @@ class PLC:
         programName = "Program:ExampleProgram"
         '''
 
+        if self.Catalog:
+            self.Catalog.Refresh(self)
+            tags = self.Catalog.ProgramTags(programName)
+            if tags is None:
+                print("Program not found, please check name!")
+            return tags
+
         # Ensure programNames is not empty 
         if not programNames:
             _getTagList(self)
@@ -162,11 +247,15 @@ class PLC:
             _getTagList(self)
         return programNames
 
-    def Discover(self):
+    def Discover(self, callback=None, maxAge=None, timeout=0.5):
         '''
-        Query all the EIP devices on the network
+        Query all the EIP devices on the network, every interface
+        at once.  callback(device) is called as each one answers,
+        return True from it to stop listening early.  Results
+        younger than maxAge seconds (DiscoveryCacheTTL if None)
+        are reused without asking the network, 0 always asks
         '''
-        return _discover()
+        return _discover(callback, maxAge, timeout, port=self.Port)
 
     def GetModuleProperties(self, slot):
         '''
@@ -174,12 +263,65 @@ class PLC:
         '''
         return _getModuleProperties(self, slot)
 
+    def KeepAlive(self):
+        '''
+        Send the smallest connected request there is so an
+        otherwise idle connection isn't timed out
+        '''
+        return _keepAlive(self)
+
+    def EnableStats(self):
+        '''
+        Start recording the count, bytes and latency of every
+        request, returns the RequestStats they go in
+        '''
+        if self.Stats is None:
+            self.Stats = RequestStats()
+        return self.Stats
+
     def Close(self):
         '''
         Close the connection to the PLC
         '''
         return _closeConnection(self)
 
+class CompiledTag:
+    '''
+    The parts of a request that never change for a tag, built
+    once so repeat reads and writes only pack the value and
+    the EIP header
+    '''
+
+    def __init__(self):
+        self.TagName = ''
+        self.BaseTag = ''
+        self.DataType = 0x00
+        self.IOI = b""
+        self.ReadRequest = b""
+        self.WritePrefix = b""
+        self.Struct = None
+        self.Convert = int
+        # plain atomic value, not a bit, bool array or string
+        self.Simple = False
+
+class UDTTemplate:
+    '''
+    A UDT's layout read from its template, compiled into
+    where every member sits and how to unpack it so whole
+    structures can be decoded straight from a reply
+    '''
+
+    def __init__(self):
+        self.Name = ''
+        self.Instance = 0x00
+        self.Handle = 0x00
+        # bytes one structure takes up
+        self.Size = 0x00
+        # (name, type, offset, array size or bit number) as the template lists them
+        self.Members = []
+        # (name, Struct, nested UDTTemplate or None for a BOOL, offset, element count or bit number)
+        self.Decoders = []
+
 class LgxTag:
     
     def __init__(self):
@@ -200,9 +342,116 @@ def _readTag(self, tag, elements, dt):
     
     if not _connect(self): return None
 
+    compiled = _compileTag(self, tag, dt)
+    if compiled.Simple and elements == 1:
+        eipHeader = _buildEIPHeader(self, compiled.ReadRequest)
+        status, retData = _getBytes(self, eipHeader)
+        if status == 0:
+            return compiled.Struct.unpack_from(retData, 52)[0]
+        if status in cipErrorCodes.keys():
+            err = cipErrorCodes[status]
+        else:
+            err = 'Unknown error'
+        raise Exception('Read failed, ' + err)
+
+    readRequest = _buildReadRequest(self, tag, elements)
+    eipHeader = _buildEIPHeader(self, readRequest)
+    status, retData = _getBytes(self, eipHeader)
+
+    if status == 0 or status == 6:
+        return _parseReply(self, tag, elements, retData)
+    else:
+        if status in cipErrorCodes.keys():
+            err = cipErrorCodes[status]
+        else:
+            err = 'Unknown error'
+        raise Exception('Read failed, ' + err)       
+
+def _readArray(self, tag, elements, dtype):
+    '''
+    Processes the array read, numpy uses the buffer the
+    raw data was read into as is
+    '''
+    if np is None:
+        raise ImportError('ReadArray needs numpy, pip install numpy')
+
+    self.Offset = 0
+
+    if not _connect(self): return None
+
     t,b,i = TagNameParser(tag, 0)
-    InitialRead(self, t, b, dt)
+    InitialRead(self, t, b, None)
+    dataType = self.KnownTags[b][0]
+
+    if dtype is None:
+        if dataType == 218:
+            raise ValueError('Pass a numpy dtype to read an array of ' + self.CIPTypes[dataType][1])
+        if dataType == 160:
+            dtype = _templateDtype(self, _compileTemplate(self, _findTemplateInstance(self, b)))
+        else:
+            dtype = np.dtype('<' + self.CIPTypes[dataType][2])
+    else:
+        dtype = np.dtype(dtype)
+
+    buffer = _readBytes(self, tag, elements, elements * dtype.itemsize)
+    return np.frombuffer(buffer, dtype, elements)
+
+def _readUDTArray(self, tag, elements, instance):
+    '''
+    Processes the array of structures read, the raw bytes
+    of every element come in one (fragmented) read and are
+    decoded with the compiled template
+    '''
+    self.Offset = 0
+
+    if not _connect(self): return None
+
+    if instance is None:
+        t,b,i = TagNameParser(tag, 0)
+        instance = _findTemplateInstance(self, b)
+    template = _compileTemplate(self, instance)
+
+    data = _readBytes(self, tag, elements, elements * template.Size)
+    return [_decodeUDT(template, data, n * template.Size) for n in range(elements)]
+
+def _readBytes(self, tag, elements, byteCount):
+    '''
+    Read the raw data of elements of an array into one
+    preallocated buffer.  Replies that don't fit in one
+    packet come back in pieces with partial reads, each
+    piece is copied in at its byte offset
+    '''
+    buffer = bytearray(byteCount)
+    tagIOI = _buildTagIOI(self, tag, isBoolArray=False)
+    self.Offset = 0
+    status = 6
+
+    while status == 6 and self.Offset < len(buffer):
+        readRequest = _addPartialReadIOI(self, tagIOI, elements)
+        eipHeader = _buildEIPHeader(self, readRequest)
+        status, retData = _getBytes(self, eipHeader)
 
+        if status != 0 and status != 6:
+            if status in cipErrorCodes.keys():
+                err = cipErrorCodes[status]
+            else:
+                err = 'Unknown error'
+            raise Exception('Read failed, ' + err)
+
+        # structures carry a 2 byte handle after the type code
+        start = 54 if retData[50] == 160 else 52
+        piece = retData[start:start + len(buffer) - self.Offset]
+        buffer[self.Offset:self.Offset + len(piece)] = piece
+        self.Offset += len(piece)
+
+    return buffer
+
+def _buildReadRequest(self, tag, elements):
+    '''
+    Builds the read service for a tag whose type is already
+    known, bool arrays and bits of a word read whole words
+    '''
+    t,b,i = TagNameParser(tag, 0)
     datatype = self.KnownTags[b][0]
     bitCount = self.CIPTypes[datatype][0] * 8
 
@@ -225,32 +474,42 @@ def _readTag(self, tag, elements, dt):
         # everything else
         tagData = _buildTagIOI(self, tag, isBoolArray=False)
         readRequest = _addReadIOI(self, tagData, elements)
-        
-    eipHeader = _buildEIPHeader(self, readRequest)
+
+    return readRequest
+
+def _writeTag(self, tag, value, dt):
+    '''
+    Processes the write request
+    '''
+    self.Offset = 0
+
+    if not _connect(self): return None
+
+    writeRequest = _buildWriteRequest(self, tag, value, dt)
+    eipHeader = _buildEIPHeader(self, writeRequest)
     status, retData = _getBytes(self, eipHeader)
 
-    if status == 0 or status == 6:
-        return _parseReply(self, tag, elements, retData)
+    if status == 0:
+        return
     else:
         if status in cipErrorCodes.keys():
             err = cipErrorCodes[status]
         else:
             err = 'Unknown error'
-        raise Exception('Read failed, ' + err)       
+        raise Exception('Write failed, ' + err)
 
-def _writeTag(self, tag, value, dt):
+def _buildWriteRequest(self, tag, value, dt):
     '''
-    Processes the write request
+    Builds the write service for a single tag, used on
+    its own or as one segment of a multi-service request
     '''
-    self.Offset = 0
     writeData = []
 
-    if not _connect(self): return None
-
-    t,b,i = TagNameParser(tag, 0)
-    InitialRead(self, t, b, dt)
+    compiled = _compileTag(self, tag, dt)
+    if compiled.Simple and not isinstance(value, list):
+        return compiled.WritePrefix + compiled.Struct.pack(compiled.Convert(value))
 
-    dataType = self.KnownTags[b][0]
+    dataType = compiled.DataType
 
     # check if values passed were a list
     if isinstance(value, list):
@@ -277,70 +536,197 @@ def _writeTag(self, tag, value, dt):
     else:
         tagData = _buildTagIOI(self, tag, isBoolArray=False)
         writeRequest = _addWriteIOI(self, tagData, writeData, dataType)
-    
-    eipHeader = _buildEIPHeader(self, writeRequest)
-    status, retData = _getBytes(self, eipHeader)
 
-    if status == 0:
-        return
-    else:
-        if status in cipErrorCodes.keys():
-            err = cipErrorCodes[status]
-        else:
-            err = 'Unknown error'
-        raise Exception('Write failed, ' + err)
-    
+    return writeRequest
+
 def _multiRead(self, args):
     '''
-    Processes the multiple read request
+    Processes the multiple read request.  When the tags
+    don't fit in one packet the request is split at the
+    connection size and the replies are joined in order
+    '''
+    self.Offset = 0
+    reply = []
+
+    if not _connect(self): return None
+
+    serviceSegments, replySizes = _multiReadSegments(self, args)
+
+    for start, end in _multiServiceChunks(self, serviceSegments, replySizes):
+        readRequest = _buildMultiServiceRequest(serviceSegments[start:end])
+        eipHeader = _buildEIPHeader(self, readRequest)
+        status, retData = _getBytes(self, eipHeader)
+
+        # 0x1E means at least one of the reads failed, MultiParser marks those
+        if status == 0 or status == 0x1E:
+            reply.extend(MultiParser(self, args[start:end], retData))
+        else:
+            if status in cipErrorCodes.keys():
+                err = cipErrorCodes[status]
+            else:
+                err = 'Unknown error'
+            raise Exception('Multi-read failed, ' + err)
+
+    return reply
+
+def _multiReadSegments(self, args):
+    '''
+    Builds the read service for each tag of a multi-read
+    along with the size its reply will take up
     '''
     serviceSegments = []
-    segments = b""
-    tagCount = len(args)
+    replySizes = []
+    for tag in args:
+        compiled = _compileTag(self, tag, None)
+        dataType = compiled.DataType
+        serviceSegments.append(compiled.ReadRequest)
+        # reply header, type code and the value, structs carry a 2 byte handle
+        replySizes.append(6 + self.CIPTypes[dataType][0] + (2 if dataType == 160 else 0))
+    return serviceSegments, replySizes
+
+def _multiWrite(self, args):
+    '''
+    Processes the multiple write request.  The writes are
+    split over as many multi-service packets as needed to
+    stay inside the connection size
+    '''
     self.Offset = 0
+    statuses = []
 
     if not _connect(self): return None
 
-    for i in range(tagCount):
-        tag,base,ind = TagNameParser(args[i], 0)
-        InitialRead(self, tag, base, None)
-    
-        dataType = self.KnownTags[base][0]
-        if dataType == 211:
-            tagIOI = _buildTagIOI(self, tag, isBoolArray=True)
+    serviceSegments = [_buildWriteRequest(self, tag, value, None) for tag, value in args]
+    # every write reply is service, reserved, status and extended status size
+    replySizes = [4] * len(serviceSegments)
+
+    for start, end in _multiServiceChunks(self, serviceSegments, replySizes):
+        writeRequest = _buildMultiServiceRequest(serviceSegments[start:end])
+        eipHeader = _buildEIPHeader(self, writeRequest)
+        status, retData = _getBytes(self, eipHeader)
+
+        # 0x1E means at least one of the writes failed, the rest are in the reply
+        if status == 0 or status == 0x1E:
+            statuses.extend(_multiServiceStatus(retData))
         else:
-            tagIOI = _buildTagIOI(self, tag, isBoolArray=False)
-        readIOI = _addReadIOI(self, tagIOI, 1)
-        serviceSegments.append(readIOI)
+            if status in cipErrorCodes.keys():
+                err = cipErrorCodes[status]
+            else:
+                err = 'Unknown error'
+            raise Exception('Multi-write failed, ' + err)
 
-    header = _buildMultiServiceHeader()
-    segmentCount = pack('<H', tagCount)
-        
-    temp = len(header)
-    if tagCount > 2:
-        temp += (tagCount-2)*2
-    offsets = pack('<H', temp)
+    return statuses
 
-    # assemble all the segments
-    for i in range(tagCount):
-        segments += serviceSegments[i]
+def _writeBits(self, tag, bits):
+    '''
+    Processes the masked bit write, one read-modify-write
+    service per word, all in one multi-service packet when
+    the bits span several words
+    '''
+    self.Offset = 0
 
-    for i in range(tagCount-1):	
-        temp += len(serviceSegments[i])
-        offsets += pack('<H', temp)
+    if not _connect(self): return None
 
-    readRequest = header+segmentCount+offsets+segments
-    eipHeader = _buildEIPHeader(self, readRequest)
-    status, retData = _getBytes(self, eipHeader)
+    width = None
+    words = {}
+    for bit, value in bits.items():
+        if width is None:
+            width = self.CIPTypes[_compileTag(self, tag, None).DataType][0] * 8
+        orMask, andMask = words.get(bit // width, (0, -1))
+        if value:
+            orMask |= 1 << bit % width
+        else:
+            andMask &= ~(1 << bit % width)
+        words[bit // width] = (orMask, andMask)
 
-    if status == 0:
-        return MultiParser(self, args, retData)
+    serviceSegments = []
+    for word, (orMask, andMask) in sorted(words.items()):
+        compiled = _compileTag(self, _wordTag(tag, word), None)
+        size = self.CIPTypes[compiled.DataType][0]
+        ones = (1 << size*8) - 1
+        serviceSegments.append(pack('<BB', 0x4E, len(compiled.IOI)//2) + compiled.IOI +
+                               pack('<H', size) + (orMask & ones).to_bytes(size, 'little') +
+                               (andMask & ones).to_bytes(size, 'little'))
+    if not serviceSegments:
+        return
+
+    if len(serviceSegments) == 1:
+        status, retData = _getBytes(self, _buildEIPHeader(self, serviceSegments[0]))
     else:
-        if status in cipErrorCodes.keys():
-            err = cipErrorCodes[status]
-        else:
-            err = 'Unknown error'
-        raise Exception('Multi-read failed, ' + err)
+        for start, end in _multiServiceChunks(self, serviceSegments, [4] * len(serviceSegments)):
+            status, retData = _getBytes(self, _buildEIPHeader(self, _buildMultiServiceRequest(serviceSegments[start:end])))
+            if status == 0x1E:
+                status = next(s for s in _multiServiceStatus(retData) if s != 0)
+            if status != 0:
+                break
+
+    if status != 0:
+        raise Exception('Bit write failed, ' + cipErrorCodes.get(status, 'Unknown error'))
+
+def _wordTag(tag, word):
+    '''
+    The tag name of the array element word elements after tag
+    '''
+    if word == 0:
+        return tag
+    if tag.endswith(']'):
+        base, index = tag[:-1].rsplit('[', 1)
+        return '{}[{}]'.format(base, int(index) + word)
+    return '{}[{}]'.format(tag, word)
+
+def _multiServiceChunks(self, serviceSegments, replySizes):
+    '''
+    Splits a list of services into (start, end) ranges where
+    both the request and the reply of each range fit in one
+    connected message
+    '''
+    # sequence count goes in front of every connected message
+    limit = self.ConnectionSize - 2
+    chunks = []
+    start = 0
+    requestLen = len(_buildMultiServiceHeader()) + 2
+    replyLen = 6
+
+    for i in range(len(serviceSegments)):
+        requestLen += len(serviceSegments[i]) + 2
+        replyLen += replySizes[i] + 2
+        if (requestLen > limit or replyLen > limit) and i > start:
+            chunks.append((start, i))
+            start = i
+            requestLen = len(_buildMultiServiceHeader()) + 2 + len(serviceSegments[i]) + 2
+            replyLen = 6 + replySizes[i] + 2
+
+    if start < len(serviceSegments):
+        chunks.append((start, len(serviceSegments)))
+    return chunks
+
+def _buildMultiServiceRequest(serviceSegments):
+    '''
+    Wraps a list of services in a multiple service packet
+    '''
+    header = _buildMultiServiceHeader()
+    segmentCount = pack('<H', len(serviceSegments))
+
+    # offsets are counted from the service count
+    temp = 2 + 2*len(serviceSegments)
+    offsets = b""
+    for segment in serviceSegments:
+        offsets += pack('<H', temp)
+        temp += len(segment)
+
+    return header + segmentCount + offsets + b"".join(serviceSegments)
+
+def _multiServiceStatus(data):
+    '''
+    Gets the status of each service in a multiple service reply
+    '''
+    stripped = memoryview(data)[50:]
+    serviceCount = unpack_from('<H', stripped, 0)[0]
+
+    statuses = []
+    for i in range(serviceCount):
+        offset = unpack_from('<H', stripped, 2+(i*2))[0]
+        statuses.append(unpack_from('<B', stripped, offset+2)[0])
+    return statuses
 
 def _getPLCTime(self):
     '''
@@ -382,6 +768,45 @@ def _getPLCTime(self):
             err = 'Unknown error'
         raise Exception('Failed to get PLC time, ' + err)
 
+def _keepAlive(self):
+    '''
+    Reads the identity object's vendor ID over the connection,
+    a 6 byte reply, which is enough for the controller to keep
+    the connection and session open
+    '''
+    if not _connect(self): return None
+
+    AttributeService = 0x0E
+    AttributeSize = 0x03
+    AttributeClassType = 0x20
+    AttributeClass = 0x01
+    AttributeInstanceType = 0x24
+    AttributeInstance = 0x01
+    AttributeType = 0x30
+    VendorAttribute = 0x01
+
+    AttributePacket = pack('<8B',
+                           AttributeService,
+                           AttributeSize,
+                           AttributeClassType,
+                           AttributeClass,
+                           AttributeInstanceType,
+                           AttributeInstance,
+                           AttributeType,
+                           VendorAttribute)
+
+    eipHeader = _buildEIPHeader(self, AttributePacket)
+    status, retData = _getBytes(self, eipHeader)
+
+    if status == 0:
+        return True
+    else:
+        if status in cipErrorCodes.keys():
+            err = cipErrorCodes[status]
+        else:
+            err = 'Unknown error'
+        raise Exception('Keep alive failed, ' + err)
+
 def _setPLCTime(self):
     '''
     Requests the PLC clock time
@@ -540,7 +965,8 @@ def _getTemplateAttribute(self, instance):
     readRequest = _buildTemplateAttributes(instance)
     eipHeader = _buildEIPHeader(self, readRequest)
     status, retData = _getBytes(self, eipHeader)
-    return retData
+    # copied out of the receive buffer, the next request reuses it
+    return bytes(retData)
 
 def _getTemplate(self, instance, dataLen):
     '''
@@ -552,7 +978,7 @@ def _getTemplate(self, instance, dataLen):
     readRequest = _readTemplateService(instance, dataLen)
     eipHeader = _buildEIPHeader(self, readRequest)
     status, retData = _getBytes(self, eipHeader)
-    return retData 
+    return bytes(retData)
 
 def _buildTemplateAttributes(instance):
     
@@ -602,7 +1028,7 @@ def _buildTemplateService(instance, dataLen):
                 TemplateOffset,
                 DataLength)
 
-def _readTemplateService(instance, dataLen):
+def _readTemplateService(instance, dataLen, offset=0):
 
     TemplateService = 0x4c
     TemplateLength = 0x03
@@ -610,7 +1036,7 @@ def _readTemplateService(instance, dataLen):
     TemplateClass = 0x6c
     TemplateInstanceType = 0x25
     TemplateInstance = instance
-    TemplateOffset = 0x00
+    TemplateOffset = offset
     DataLength = dataLen
     
     return pack('<BBBBHHIH',
@@ -623,54 +1049,260 @@ def _readTemplateService(instance, dataLen):
                 TemplateOffset,
                 DataLength)
 
-def _discover():
-    devices = []
+def _findTemplateInstance(self, baseTag):
+    '''
+    Look up which template a structure tag uses, fetching
+    the tag list of its program (or the controller) if it
+    hasn't been read yet
+    '''
+    if self.Catalog:
+        lgxTag = self.Catalog.Tag(baseTag)
+        if lgxTag is None and self.Catalog.Refresh(self):
+            lgxTag = self.Catalog.Tag(baseTag)
+        if lgxTag is not None and lgxTag.Struct:
+            return lgxTag.DataTypeValue
+        raise ValueError(baseTag + ' is not a structure tag')
+
+    for attempt in range(2):
+        for lgxTag in self.TagList:
+            if lgxTag.TagName == baseTag and lgxTag.Struct:
+                return lgxTag.DataTypeValue
+        if attempt == 0:
+            if baseTag.startswith('Program:'):
+                _getProgramTagList(self, baseTag.split('.')[0])
+            else:
+                _getTagList(self)
+
+    raise ValueError(baseTag + ' is not a structure tag')
+
+def _getTemplateInfo(self, instance):
+    '''
+    Read the attributes of a template, returns the structure
+    handle, member count, template definition size (in 32 bit
+    words) and the size of one structure in bytes
+    '''
+    AttributePacket = pack('<BBBBHHHHHHH',
+                           0x03,    # get attribute list
+                           0x03,    # path size
+                           0x20,    # class
+                           0x6c,    # template object
+                           0x25,    # 16 bit instance
+                           instance,
+                           4,       # attribute count
+                           1, 2, 4, 5)
+
+    eipHeader = _buildEIPHeader(self, AttributePacket)
+    status, retData = _getBytes(self, eipHeader)
+
+    if status != 0:
+        if status in cipErrorCodes.keys():
+            err = cipErrorCodes[status]
+        else:
+            err = 'Unknown error'
+        raise Exception('Failed to get template attributes, ' + err)
+
+    # each attribute is its id, its status then its value
+    handle = unpack_from('<H', retData, 56)[0]
+    memberCount = unpack_from('<H', retData, 62)[0]
+    definitionSize = unpack_from('<I', retData, 68)[0]
+    structureSize = unpack_from('<I', retData, 76)[0]
+    return handle, memberCount, definitionSize, structureSize
+
+def _getTemplateData(self, instance, dataLen):
+    '''
+    Read the member list and names of a template, it may take
+    more than one request when it doesn't fit in one reply
+    '''
+    data = b""
+    status = 6
+
+    while status == 6:
+        readRequest = _readTemplateService(instance, dataLen - len(data), len(data))
+        eipHeader = _buildEIPHeader(self, readRequest)
+        status, retData = _getBytes(self, eipHeader)
+
+        if status != 0 and status != 6:
+            if status in cipErrorCodes.keys():
+                err = cipErrorCodes[status]
+            else:
+                err = 'Unknown error'
+            raise Exception('Failed to read template, ' + err)
+        data += bytes(retData[50:])
+
+    return data
+
+def _compileTemplate(self, instance):
+    '''
+    Read a UDT template and work out how to decode each member,
+    only done the first time the template is used
+    '''
+    template = self.Templates.get(instance)
+    if template:
+        return template
+
+    template = UDTTemplate()
+    template.Instance = instance
+    template.Handle, memberCount, definitionSize, template.Size = _getTemplateInfo(self, instance)
+    data = _getTemplateData(self, instance, definitionSize * 4 - 21)
+
+    # 8 bytes of member info each, then the template name and the member names
+    names = data[memberCount*8:].split(b'\x00')
+    template.Name = str(names[0].split(b';')[0], 'utf-8')
+
+    for m in range(memberCount):
+        info, memberType, offset = unpack_from('<HHI', data, m*8)
+        template.Members.append((str(names[m+1], 'utf-8'), memberType, offset, info))
+
+    self.Templates[instance] = template
+    _buildDecoders(self, template)
+    return template
+
+def _buildDecoders(self, template):
+    '''
+    Work out how to unpack each member of a template from its
+    member list, nested structures are compiled as needed
+    '''
+    template.Decoders = []
+    for name, memberType, offset, info in template.Members:
+        # hidden members hold the bits of BOOL members
+        if name.startswith('ZZZZZZZZZZ') or name.startswith('__'):
+            continue
+        # arrays have their element count in info
+        count = info if memberType & 0x2000 else None
+
+        if memberType & 0x8000:
+            nested = _compileTemplate(self, memberType & 0x0fff)
+            template.Decoders.append((name, None, nested, offset, count))
+        elif memberType & 0xff == 0xc1:
+            # BOOL, info is the bit in the hidden member
+            template.Decoders.append((name, None, None, offset, info))
+        elif memberType & 0xff in self.CIPTypes:
+            CIPFormat = self.CIPTypes[memberType & 0xff][2]
+            template.Decoders.append((name, Struct('<' + str(count or 1) + CIPFormat), None, offset, count))
+
+def _templateDtype(self, template):
+    '''
+    A numpy structured dtype laid out like a compiled template,
+    so ReadArray can decode arrays of the UDT.  numpy has no
+    bit fields, BOOL members are left out, their bits are in
+    the hidden member that holds them
+    '''
+    names, formats, offsets = [], [], []
+    for name, memberType, offset, info in template.Members:
+        count = info if memberType & 0x2000 else None
+        if memberType & 0x8000:
+            memberDtype = _templateDtype(self, _compileTemplate(self, memberType & 0x0fff))
+        elif memberType & 0xff in self.CIPTypes and memberType & 0xff != 0xc1:
+            memberDtype = np.dtype('<' + self.CIPTypes[memberType & 0xff][2])
+        else:
+            continue
+        names.append(name)
+        formats.append(memberDtype if count is None else (memberDtype, (count,)))
+        offsets.append(offset)
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': template.Size})
+
+def _decodeUDT(template, data, start):
+    '''
+    Decode one structure that starts at start in data into
+    a dict of member name -> value, arrays become lists and
+    nested structures dicts
+    '''
+    record = {}
+    for name, memberStruct, nested, offset, count in template.Decoders:
+        if memberStruct:
+            values = memberStruct.unpack_from(data, start+offset)
+            record[name] = values[0] if count is None else list(values)
+        elif nested:
+            if count is None:
+                record[name] = _decodeUDT(nested, data, start+offset)
+            else:
+                record[name] = [_decodeUDT(nested, data, start+offset+n*nested.Size) for n in range(count)]
+        else:
+            record[name] = bool(data[start+offset] >> count & 1)
+    return record
+
+def _discover(callback=None, maxAge=None, timeout=0.5, address='255.255.255.255', port=44818):
+    '''
+    Send ListIdentity from every IPv4 interface (and once
+    unbound, which is what works on linux) at the same time
+    and collect the replies until timeout.  A device that
+    answers on more than one interface is only listed once
+    '''
+    if maxAge is None:
+        maxAge = DiscoveryCacheTTL
+    cached = _discoveryCache.get((address, port))
+    if cached and time.monotonic() - cached[0] < maxAge:
+        devices = list(cached[1])
+        if callback:
+            for device in devices:
+                if callback(device): break
+        return devices
+
     request = _buildListIdentity()
-  
-    # get available ip addresses
-    addresses = socket.getaddrinfo(socket.gethostname(), None)
-
-    # we're going to send a request for all available ipv4
-    # addresses and build a list of all the devices that reply
-    for ip in addresses:
-        if ip[0] == 2:  # IP v4
-            # create a socket
+    devices = []
+    stopped = False
+    sockets = []
+    selector = selectors.DefaultSelector()
+    try:
+        for interface in _discoveryInterfaces():
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.settimeout(0.5)
+            s.setblocking(False)
             s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            s.bind((ip[4][0], 0))
-            s.sendto(request, ('255.255.255.255', 44818))
             try:
-                while(1):
-                    ret = s.recv(1024)
-                    context = unpack_from('<Q', ret, 14)[0]
-                    if context == 0x006d6f4d6948:
-                        device = _parseIdentityResponse(ret)
-                        if device.IPAddress:
-                            devices.append(device)
-            except:
-                pass
-                  
-    # added this because looping through addresses above doesn't work on
-    # linux so this is a "just in case".  If we don't get results with the 
-    # above code, try one more time without binding to an address
-    if len(devices) == 0:
-          s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-          s.settimeout(0.5)
-          s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-          s.sendto(request, ('255.255.255.255', 44818))
-          try:
-              while(1):
-                ret = s.recv(1024)
-                context = unpack_from('<Q', ret, 14)[0]
-                if context == 0x006d6f4d6948:
-                    device = _parseIdentityResponse(ret)
-                    if device.IPAddress:
-                        devices.append(device)
-          except:
-              pass
-
-    return devices   
+                if interface:
+                    s.bind((interface, 0))
+                s.sendto(request, (address, port))
+            except OSError:
+                s.close()
+                continue
+            sockets.append(s)
+            selector.register(s, selectors.EVENT_READ)
+
+        found = set()
+        deadline = time.monotonic() + timeout
+        while sockets and not stopped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, events in selector.select(remaining):
+                try:
+                    ret = key.fileobj.recv(1024)
+                except OSError:
+                    continue
+                if len(ret) < 63 or unpack_from('<Q', ret, 14)[0] != 0x006d6f4d6948:
+                    continue
+                device = _parseIdentityResponse(ret)
+                if not device.IPAddress or device.IPAddress in found:
+                    continue
+                found.add(device.IPAddress)
+                devices.append(device)
+                if callback and callback(device):
+                    stopped = True
+                    break
+    finally:
+        selector.close()
+        for s in sockets:
+            s.close()
+
+    # an early stop may have missed devices, don't let it stand in for a full discovery
+    if not stopped:
+        _discoveryCache[(address, port)] = (time.monotonic(), list(devices))
+    return devices
+
+def _discoveryInterfaces():
+    '''
+    The IPv4 addresses of this machine, and None for an
+    unbound socket
+    '''
+    try:
+        addresses = socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)
+    except OSError:
+        addresses = []
+    interfaces = []
+    for address in addresses:
+        if address[4][0] not in interfaces:
+            interfaces.append(address[4][0])
+    return interfaces + [None]
 
 def _getModuleProperties(self, slot):
     '''
@@ -706,7 +1338,7 @@ def _getModuleProperties(self, slot):
     eipHeader = _buildEIPSendRRDataHeader(self, len(frame)) + frame
     pad = pack('<I', 0x00)
     self.Socket.send(eipHeader)
-    retData = pad + self.Socket.recv(1024)
+    retData = pad + _recvFrame(self)
     status = unpack_from('<B', retData, 46)[0]
     
     if status == 0:
@@ -722,6 +1354,7 @@ def _connect(self):
     if self.SocketConnected:
         return True
     
+    started = time.perf_counter()
     try:
         self.Socket = socket.socket()
         self.Socket.settimeout(5.0)
@@ -733,7 +1366,7 @@ def _connect(self):
         raise
 
     self.Socket.send(_buildRegisterSession(self))
-    retData = self.Socket.recv(1024)
+    retData = _recvFrame(self)
     if retData:
         self.SessionHandle = unpack_from('<I', retData, 4)[0]
     else:
@@ -741,8 +1374,14 @@ def _connect(self):
         raise Exception("Failed to register session")
 
     self.Socket.send(_buildForwardOpenPacket(self))
-    retData = self.Socket.recv(1024)
-    sts = unpack_from('<b', retData, 42)[0]
+    retData = _recvFrame(self)
+    sts = unpack_from('<b', retData, 42)[0] if retData else 1
+    if sts and self.ConnectionSize > 511:
+        # the controller doesn't do large connections, settle for a standard one
+        self.ConnectionSize = 500
+        self.Socket.send(_buildForwardOpenPacket(self))
+        retData = _recvFrame(self)
+        sts = unpack_from('<b', retData, 42)[0] if retData else 1
     if not sts:
         self.OTNetworkConnectionID = unpack_from('<I', retData, 44)[0]
         self.SocketConnected = True
@@ -750,36 +1389,155 @@ def _connect(self):
         self.SocketConnected = False
         raise Exception("Forward Open Failed")
 
+    if self.Stats is not None:
+        # TCP connect, register session and forward open together
+        self.Stats.Record('Connect', '(session)', 0, 0, time.perf_counter() - started)
+
+    if self.TagCacheFile:
+        _loadTagCache(self, _getControllerFingerprint(self))
+
     return True
 
 def _closeConnection(self):
     '''
     Close the connection to the PLC (forward close, unregister session)
     '''
+    if self.TagCacheFile:
+        _saveTagCache(self)
     self.SocketConnected = False
     closePacket = _buildForwardClosePacket(self)
     unregPacket = _buildUnregisterSession(self)
     try:
         self.Socket.send(closePacket)
-        retData = self.Socket.recv(1024)
+        retData = _recvFrame(self)
         self.Socket.send(unregPacket)
-        retData = self.Socket.recv(1024)
-        self.Socket.close()
     except:
         pass
+    finally:
+        self.Socket.close()
+
+
+def _getControllerFingerprint(self):
+    '''
+    Read the controller's change counters (class 0xAC), they
+    change whenever the program or its tags are edited or a
+    new program is downloaded.  Returns None if the controller
+    doesn't support it
+    '''
+    AttributeService = 0x03
+    AttributeSize = 0x02
+    AttributeClassType = 0x20
+    AttributeClass = 0xAC
+    AttributeInstanceType = 0x24
+    AttributeInstance = 0x01
+    Attributes = (0x01, 0x02, 0x03, 0x04, 0x0A)
+
+    AttributePacket = pack('<BBBBBBH',
+                           AttributeService,
+                           AttributeSize,
+                           AttributeClassType,
+                           AttributeClass,
+                           AttributeInstanceType,
+                           AttributeInstance,
+                           len(Attributes))
+    AttributePacket += pack('<{}H'.format(len(Attributes)), *Attributes)
+
+    eipHeader = _buildEIPHeader(self, AttributePacket)
+    status, retData = _getBytes(self, eipHeader)
 
+    if status == 0 and retData:
+        # attribute values follow the 4 byte reply header
+        return retData[50:].hex()
+    return None
+
+def _loadTagCache(self, fingerprint):
+    '''
+    Fill KnownTags from the cache file if it was saved against
+    the same controller program, otherwise start from nothing
+    '''
+    self.TagCacheFingerprint = fingerprint
+    self.TagCacheCount = 0
+    if fingerprint is None:
+        return False
+
+    cache = _readCacheFile(self.TagCacheFile, TagCacheVersion)
+    if cache is None or cache['fingerprint'] != fingerprint:
+        return False
+
+    for tag, (dataType, dataLen) in cache.get('tags', {}).items():
+        self.KnownTags.setdefault(tag, (dataType, dataLen))
+    self.TagCacheCount = len(self.KnownTags)
+    return True
+
+def _saveTagCache(self):
+    '''
+    Write KnownTags to the cache file if anything new was
+    learned since it was loaded
+    '''
+    if self.TagCacheFingerprint is None or len(self.KnownTags) == self.TagCacheCount:
+        return False
+
+    tags = {tag: list(info) for tag, info in self.KnownTags.items()}
+    if not _writeCacheFile(self.TagCacheFile, TagCacheVersion, self.TagCacheFingerprint, {'tags': tags}):
+        return False
+
+    self.TagCacheCount = len(self.KnownTags)
+    return True
+
+def _readCacheFile(path, version):
+    '''
+    The contents of a cache file written by _writeCacheFile,
+    None if there is none or it was written with another version
+    '''
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != version:
+        return None
+    cache.setdefault('fingerprint', None)
+    return cache
+
+def _writeCacheFile(path, version, fingerprint, contents):
+    '''
+    Save contents (a dict) with the layout version and the
+    controller fingerprint they were read against, True if it
+    was written
+    '''
+    cache = dict(contents, version=version, fingerprint=fingerprint)
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # write then rename so a crash never leaves half a file behind
+        temp = path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(cache, f)
+        os.replace(temp, path)
+    except OSError:
+        return False
+    return True
 
 def _getBytes(self, data):
     '''
     Sends data and gets the return data
     '''
     try:
-        self.Socket.send(data)
-        retData = self.Socket.recv(1024)
+        if self.Stats is not None:
+            started = time.perf_counter()
+            self.Socket.send(data)
+            retData = _recvFrame(self)
+            self.Stats.RecordRequest(data, retData, time.perf_counter() - started)
+        else:
+            self.Socket.send(data)
+            retData = _recvFrame(self)
         if retData:
             status = unpack_from('<B', retData, 48)[0]
             return status, retData
         else:
+            # the PLC closed the socket on us
+            self.SocketConnected = False
             return 1, None
     except (socket.gaierror):
         self.SocketConnected = False
@@ -788,6 +1546,39 @@ def _getBytes(self, data):
         self.SocketConnected = False
         return 7, None
         
+def _recvFrame(self):
+    '''
+    Receive one whole encapsulation packet into the reused
+    receive buffer, the length in the 24 byte header says
+    how much follows it.  Returns a memoryview that is only
+    good until the next receive, or an empty string if the
+    PLC closed the connection
+    '''
+    if not _recvInto(self, 0, 24):
+        return b""
+    frameLen = 24 + unpack_from('<H', self.ReceiveBuffer, 2)[0]
+    if frameLen > len(self.ReceiveBuffer):
+        # bigger than anything so far, views of the old buffer stay valid
+        header = bytes(self.ReceiveBuffer[:24])
+        self.ReceiveBuffer = memoryview(bytearray(frameLen))
+        self.ReceiveBuffer[:24] = header
+    if not _recvInto(self, 24, frameLen):
+        return b""
+    return self.ReceiveBuffer[:frameLen]
+
+def _recvInto(self, start, end):
+    '''
+    Keep receiving into the buffer until it is filled from
+    start to end, False if the socket closed first
+    '''
+    buffer = self.ReceiveBuffer
+    while start < end:
+        received = self.Socket.recv_into(buffer[start:end], end - start)
+        if not received:
+            return False
+        start += received
+    return True
+
 def _buildRegisterSession(self):
     '''
     Register our CIP connection
@@ -847,9 +1638,15 @@ def _buildForwardClosePacket(self):
 def _buildCIPForwardOpen(self):
     '''
     Forward Open happens after a connection is made,
-    this will sequp the CIP connection parameters
+    this will sequp the CIP connection parameters.
+    Connections bigger than 511 bytes need a Large
+    Forward Open, which has 32 bit connection parameters
     '''
-    CIPService = 0x54
+    LargeConnection = self.ConnectionSize > 511
+    if LargeConnection:
+        CIPService = 0x5B
+    else:
+        CIPService = 0x54
     CIPPathSize = 0x02
     CIPClassType = 0x20
 
@@ -867,14 +1664,20 @@ def _buildCIPForwardOpen(self):
     CIPOriginatorSerialNumber = self.OriginatorSerialNumber
     CIPMultiplier = 0x03
     CIPOTRPI = 0x00201234
-    CIPOTNetworkConnectionParameters = 0x43f4
-
     CIPTORPI = 0x00204001
-    CIPTONetworkConnectionParameters = 0x43f4
+    # point to point, variable size, low priority
+    if LargeConnection:
+        CIPOTNetworkConnectionParameters = 0x42000000 | self.ConnectionSize
+        CIPTONetworkConnectionParameters = 0x42000000 | self.ConnectionSize
+        ParameterFormat = 'I'
+    else:
+        CIPOTNetworkConnectionParameters = 0x4200 | self.ConnectionSize
+        CIPTONetworkConnectionParameters = 0x4200 | self.ConnectionSize
+        ParameterFormat = 'H'
 
     CIPTransportTrigger = 0xA3
 
-    ForwardOpen = pack('<BBBBBBBBIIHHIIIhIhB',
+    ForwardOpen = pack('<BBBBBBBBIIHHIII{0}I{0}B'.format(ParameterFormat),
                        CIPService,
                        CIPPathSize,
                        CIPClassType,
@@ -1079,6 +1882,52 @@ def _buildTagIOI(self, tagName, isBoolArray):
 
     return RequestTagData
 
+def _buildInstanceIOI(self, tagName, isBoolArray):
+    '''
+    The same IOI as _buildTagIOI but with the tag itself
+    addressed by its symbol instance ID from the catalog, so
+    Program:Wave_Control.Motor_12.Accel_1 goes out as the
+    program name, 20 6B 24 <instance> and then Accel_1.  The
+    controller skips the name lookup and the request is
+    shorter.  Returns None if the tag isn't in the catalog or
+    the controller doesn't take instance IDs
+    '''
+    tagArray = tagName.split('.')
+    programName = None
+    if tagArray[0].startswith('Program:'):
+        programName = tagArray.pop(0)
+    t,symbolName,i = TagNameParser(tagArray[0], 0)
+
+    lgxTag = self.Catalog.Tag(programName + '.' + symbolName if programName else symbolName)
+    if lgxTag is None:
+        return None
+
+    # the program and symbol name segments as _buildTagIOI encodes them
+    programSegment = _buildTagIOI(self, programName, isBoolArray=False) if programName else b""
+    nameSegmentLen = 2 + len(symbolName) + len(symbolName) % 2
+    symbolicIOI = _buildTagIOI(self, tagName, isBoolArray)
+
+    if lgxTag.InstanceID < 256:
+        instanceSegment = pack('<BBBB', 0x20, 0x6B, 0x24, lgxTag.InstanceID)
+    else:
+        instanceSegment = pack('<BBBBH', 0x20, 0x6B, 0x25, 0x00, lgxTag.InstanceID)
+    instanceIOI = programSegment + instanceSegment + symbolicIOI[len(programSegment) + nameSegmentLen:]
+
+    if not self.InstanceAddressingChecked:
+        # read one element the new way the first time, older firmware rejects the path
+        eipHeader = _buildEIPHeader(self, _addPartialReadIOI(self, instanceIOI, 1))
+        status, retData = _getBytes(self, eipHeader)
+        if status == 0x04 or status == 0x05:
+            # path segment error or destination unknown
+            self.InstanceAddressingChecked = True
+            self.InstanceAddressing = False
+            return None
+        if status != 0 and status != 6:
+            # didn't get an answer, ask again with the next tag
+            return None
+        self.InstanceAddressingChecked = True
+    return instanceIOI
+
 def _addReadIOI(self, tagIOI, elements):
     '''
     Add the read service to the tagIOI
@@ -1099,8 +1948,8 @@ def _addPartialReadIOI(self, tagIOI, elements):
     readIOI = pack('<BB', RequestService, RequestPathSize)
     readIOI += tagIOI
     readIOI += pack('<H', int(elements))
-    readIOI += pack('<H', self.Offset)
-    readIOI += pack('<H', 0x0000)
+    # byte offset to start reading from
+    readIOI += pack('<I', self.Offset)
     return readIOI
 
 def _addWriteIOI(self, tagIOI, writeData, dataType):
@@ -1203,20 +2052,19 @@ def _buildEIPHeader(self, tagIOI):
     self.SequenceCounter += 1
     self.SequenceCounter = self.SequenceCounter%0x10000
     
-    EIPHeaderFrame = pack('<HHIIQIIHHHHIHHH',
-                          EIPCommand,
-                          EIPLength,
-                          EIPSessionHandle,
-                          EIPStatus,
-                          EIPContext,
-                          EIPOptions,
-                          EIPInterfaceHandle,
-                          EIPTimeout,
-                          EIPItemCount,
-                          EIPItem1ID,
-                          EIPItem1Length,
-                          EIPItem1,
-                          EIPItem2ID,EIPItem2Length,EIPSequence)
+    EIPHeaderFrame = EIPHeaderStruct.pack(EIPCommand,
+                                          EIPLength,
+                                          EIPSessionHandle,
+                                          EIPStatus,
+                                          EIPContext,
+                                          EIPOptions,
+                                          EIPInterfaceHandle,
+                                          EIPTimeout,
+                                          EIPItemCount,
+                                          EIPItem1ID,
+                                          EIPItem1Length,
+                                          EIPItem1,
+                                          EIPItem2ID,EIPItem2Length,EIPSequence)
     
     return EIPHeaderFrame+tagIOI
 
@@ -1329,12 +2177,12 @@ def _getReplyValues(self, tag, elements, data):
                 index = 54+(counter*dataSize)
                 NameLength = unpack_from('<L', data, index)[0]
                 s = data[index+4:index+4+NameLength]
-                vals.append(str(s.decode('utf-8')))
+                vals.append(str(s, 'utf-8'))
             elif datatype == 218:
                 index = 52+(counter*dataSize)
                 NameLength = unpack_from('<B', data, index)[0]
                 s = data[index+1:index+1+NameLength]
-                vals.append(str(s.decode('utf-8')))
+                vals.append(str(s, 'utf-8'))
             else:
                 returnvalue = unpack_from(CIPFormat, data, index)[0]
                 vals.append(returnvalue)
@@ -1352,7 +2200,7 @@ def _getReplyValues(self, tag, elements, data):
                 eipHeader = _buildEIPHeader(self, readIOI)
 
                 self.Socket.send(eipHeader)
-                data = self.Socket.recv(1024)
+                data = _recvFrame(self)
                 status = unpack_from('<B', data, 48)[0]
                 numbytes = len(data)-dataSize
 
@@ -1454,6 +2302,41 @@ def InitialRead(self, tag, baseTag, dt):
         else:
             raise ValueError("Failed to read tag: " + tag + ' - unknown error ' + str(status))
 
+def _compileTag(self, tag, dt):
+    '''
+    Look up the compiled request parts for a tag, parsing
+    the name and building the IOI only the first time the
+    tag is used
+    '''
+    compiled = self.CompiledTags.get(tag)
+    if compiled:
+        return compiled
+
+    t,b,i = TagNameParser(tag, 0)
+    InitialRead(self, t, b, dt)
+
+    compiled = CompiledTag()
+    compiled.TagName = tag
+    compiled.BaseTag = b
+    compiled.DataType = self.KnownTags[b][0]
+    compiled.IOI = None
+    if self.InstanceAddressing and self.Catalog:
+        compiled.IOI = _buildInstanceIOI(self, tag, isBoolArray=compiled.DataType == 211)
+    if not compiled.IOI:
+        compiled.IOI = _buildTagIOI(self, tag, isBoolArray=compiled.DataType == 211)
+    compiled.ReadRequest = _addReadIOI(self, compiled.IOI, 1)
+
+    if compiled.DataType in self.CIPTypes and compiled.DataType not in (160, 211, 218) and not BitofWord(tag):
+        compiled.Simple = True
+        compiled.Struct = Struct('<' + self.CIPTypes[compiled.DataType][2])
+        if compiled.DataType == 202 or compiled.DataType == 203:
+            compiled.Convert = float
+        compiled.WritePrefix = pack('<BB', 0x4D, int(len(compiled.IOI)/2)) + compiled.IOI
+        compiled.WritePrefix += pack('<BBH', compiled.DataType, 0x00, 1)
+
+    self.CompiledTags[tag] = compiled
+    return compiled
+
 def TagNameParser(tag, offset):
     '''
     parse the packet to get the base tag name
@@ -1487,8 +2370,9 @@ def MultiParser(self, tags, data):
     '''
     Takes multi read reply data and returns an array of the values
     '''
-    # remove the beginning of the packet because we just don't care about it
-    stripped = data[50:]
+    # skip the beginning of the packet because we just don't care about it,
+    # a memoryview so the reply isn't copied
+    stripped = memoryview(data)[50:]
     tagCount = unpack_from('<H', stripped, 0)[0]
     
     # get the offset values for each of the tags in the packet
@@ -1516,7 +2400,7 @@ def MultiParser(self, tags, data):
             elif dataTypeValue == 160:
                 strlen = unpack_from('<B', stripped, offset+8)[0]
                 s = stripped[offset+12:offset+12+strlen]
-                reply.append(str(s.decode('utf-8')))
+                reply.append(str(s, 'utf-8'))
             else:
                 dataTypeFormat = self.CIPTypes[dataTypeValue][2]
                 reply.append(unpack_from(dataTypeFormat, stripped, offset+6)[0])
@@ -1654,7 +2538,7 @@ def parseLgxTag(self, packet, programName):
 
     t = LgxTag()
     length = unpack_from('<H', packet, 4)[0]
-    name = packet[6:length+6].decode('utf-8')
+    name = str(packet[6:length+6], 'utf-8')
     if programName:
         t.TagName = str(programName + '.' + name)
     else:
@@ -0,0 +1,276 @@
+'''
+asyncio client for the same connected messaging PLC uses.
+
+PLC sends one request and waits for its reply before the next
+one can go out, so every call costs a full round trip.  AsyncPLC
+keeps several connected requests in flight on one connection and
+matches each reply to its request by the sequence count that
+_buildEIPHeader puts in every connected message.  Sampling,
+status polling and parameter writes can then overlap:
+
+    async with AsyncPLC('192.168.1.10') as comm:
+        positions, status = await asyncio.gather(
+            comm.MultiRead(*position_tags),
+            comm.Read('Program:Wave_Control.Axis[0].StatusWord'))
+
+The request building and reply parsing is shared with PLC, so
+both clients send exactly the same bytes.
+'''
+
+import asyncio
+from struct import unpack_from
+from modules.eip import (PLC, MultiParser, TagNameParser, cipErrorCodes,
+                         _addPartialReadIOI, _buildEIPHeader, _buildForwardClosePacket,
+                         _buildForwardOpenPacket, _buildMultiServiceRequest, _buildReadRequest,
+                         _buildRegisterSession, _buildTagIOI, _buildUnregisterSession,
+                         _buildWriteRequest, _compileTag, _multiReadSegments,
+                         _multiServiceChunks, _multiServiceStatus, _parseReply)
+
+
+class AsyncPLC:
+
+    def __init__(self, ip='', slot=0, maxOutstanding=8):
+        '''
+        maxOutstanding is how many requests may be waiting on a
+        reply at once, controllers queue a handful per connection
+        '''
+        # holds the session, sequence count and tag caches the request builders use
+        self.State = PLC()
+        self.State.IPAddress = ip
+        self.State.ProcessorSlot = slot
+        self.Timeout = 5.0
+        self.MaxOutstanding = maxOutstanding
+        self.SocketConnected = False
+        self.Reader = None
+        self.Writer = None
+        self.ReplyTask = None
+        # sequence count -> future waiting on that reply
+        self.Pending = {}
+        self.Outstanding = None
+        # one Connect at a time, requests gathered before the first connect all wait on it
+        self.Connecting = None
+
+    async def __aenter__(self):
+        await self.Connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.Close()
+
+    async def Connect(self):
+        '''
+        Open the connection, register a session and forward open
+        '''
+        if self.Connecting is None:
+            # made here so it belongs to the running event loop
+            self.Connecting = asyncio.Lock()
+        async with self.Connecting:
+            if self.SocketConnected:
+                return True
+            return await self._connect()
+
+    async def _connect(self):
+        plc = self.State
+        self.Reader, self.Writer = await asyncio.wait_for(
+            asyncio.open_connection(plc.IPAddress, plc.Port), self.Timeout)
+
+        retData = await self._exchange(_buildRegisterSession(plc))
+        plc.SessionHandle = unpack_from('<I', retData, 4)[0]
+
+        retData = await self._exchange(_buildForwardOpenPacket(plc))
+        if unpack_from('<b', retData, 42)[0] and plc.ConnectionSize > 511:
+            # the controller doesn't do large connections, settle for a standard one
+            plc.ConnectionSize = 500
+            retData = await self._exchange(_buildForwardOpenPacket(plc))
+        if unpack_from('<b', retData, 42)[0]:
+            self.Writer.close()
+            raise Exception("Forward Open Failed")
+        plc.OTNetworkConnectionID = unpack_from('<I', retData, 44)[0]
+
+        self.Pending = {}
+        self.Outstanding = asyncio.Semaphore(self.MaxOutstanding)
+        self.ReplyTask = asyncio.ensure_future(self._dispatchReplies())
+        self.SocketConnected = plc.SocketConnected = True
+        return True
+
+    async def Close(self):
+        '''
+        Forward close and unregister the session
+        '''
+        if not self.SocketConnected:
+            if self.Writer:
+                self.Writer.close()
+            return
+        self.SocketConnected = self.State.SocketConnected = False
+
+        self.ReplyTask.cancel()
+        try:
+            await self.ReplyTask
+        except asyncio.CancelledError:
+            pass
+        self._failPending(ConnectionError('Connection closed'))
+
+        try:
+            await self._exchange(_buildForwardClosePacket(self.State))
+            self.Writer.write(_buildUnregisterSession(self.State))
+            await self.Writer.drain()
+        except Exception:
+            pass
+        finally:
+            self.Writer.close()
+
+    async def Read(self, tag, count=1, datatype=None):
+        '''
+        Read a single tag, or count elements of an array
+        '''
+        await self._knowTag(tag, datatype)
+
+        compiled = _compileTag(self.State, tag, datatype)
+        if compiled.Simple and count == 1:
+            status, retData = await self._request(compiled.ReadRequest)
+            if status == 0:
+                return compiled.Struct.unpack_from(retData, 52)[0]
+            raise Exception('Read failed, ' + cipErrorCodes.get(status, 'Unknown error'))
+
+        status, retData = await self._request(_buildReadRequest(self.State, tag, count))
+        if status == 0:
+            return _parseReply(self.State, tag, count, retData)
+        if status == 6:
+            # the rest would come in follow up partial reads, PLC handles those
+            raise Exception('Read failed, ' + tag + ' does not fit in one reply')
+        raise Exception('Read failed, ' + cipErrorCodes.get(status, 'Unknown error'))
+
+    async def Write(self, tag, value, datatype=None):
+        '''
+        Write a single tag, or a list of values to an array
+        '''
+        await self._knowTag(tag, datatype)
+
+        status, retData = await self._request(_buildWriteRequest(self.State, tag, value, datatype))
+        if status != 0:
+            raise Exception('Write failed, ' + cipErrorCodes.get(status, 'Unknown error'))
+
+    async def MultiRead(self, *args):
+        '''
+        Read multiple tags, the packets the read is split into
+        all go out before the first reply comes back
+        '''
+        await asyncio.gather(*[self._knowTag(tag, None) for tag in args])
+
+        serviceSegments, replySizes = _multiReadSegments(self.State, args)
+        chunks = _multiServiceChunks(self.State, serviceSegments, replySizes)
+        replies = await asyncio.gather(*[self._request(_buildMultiServiceRequest(serviceSegments[start:end]))
+                                         for start, end in chunks])
+
+        reply = []
+        for (start, end), (status, retData) in zip(chunks, replies):
+            # 0x1E means at least one of the reads failed, MultiParser marks those
+            if status != 0 and status != 0x1E:
+                raise Exception('Multi-read failed, ' + cipErrorCodes.get(status, 'Unknown error'))
+            reply.extend(MultiParser(self.State, args[start:end], retData))
+        return reply
+
+    async def MultiWrite(self, *args):
+        '''
+        Write multiple (tag, value) pairs, returns the CIP
+        status of each write in the same order (0 is success)
+        '''
+        await asyncio.gather(*[self._knowTag(tag, None) for tag, value in args])
+
+        serviceSegments = [_buildWriteRequest(self.State, tag, value, None) for tag, value in args]
+        chunks = _multiServiceChunks(self.State, serviceSegments, [4] * len(serviceSegments))
+        replies = await asyncio.gather(*[self._request(_buildMultiServiceRequest(serviceSegments[start:end]))
+                                         for start, end in chunks])
+
+        statuses = []
+        for status, retData in replies:
+            if status != 0 and status != 0x1E:
+                raise Exception('Multi-write failed, ' + cipErrorCodes.get(status, 'Unknown error'))
+            statuses.extend(_multiServiceStatus(retData))
+        return statuses
+
+    async def _knowTag(self, tag, dt):
+        '''
+        Same as InitialRead, learn the data type of a tag the
+        first time it is used
+        '''
+        plc = self.State
+        t, b, i = TagNameParser(tag, 0)
+        if b in plc.KnownTags:
+            return
+        if dt:
+            plc.KnownTags[b] = (dt, 0)
+            return
+
+        tagData = _buildTagIOI(plc, b, isBoolArray=False)
+        status, retData = await self._request(_addPartialReadIOI(plc, tagData, 1))
+        if status == 0 or status == 6:
+            dataType = unpack_from('<B', retData, 50)[0]
+            dataLen = unpack_from('<H', retData, 2)[0]
+            plc.KnownTags[b] = (dataType, dataLen)
+        else:
+            raise ValueError(cipErrorCodes.get(status, "Failed to read tag: " + tag + ' - unknown error ' + str(status)))
+
+    async def _request(self, cipRequest):
+        '''
+        Send one connected request and wait for its reply,
+        returns the general status and the whole reply
+        '''
+        if not self.SocketConnected:
+            await self.Connect()
+
+        async with self.Outstanding:
+            eipHeader = _buildEIPHeader(self.State, cipRequest)
+            sequence = unpack_from('<H', eipHeader, 44)[0]
+            reply = asyncio.get_running_loop().create_future()
+            self.Pending[sequence] = reply
+            try:
+                self.Writer.write(eipHeader)
+                await self.Writer.drain()
+                retData = await asyncio.wait_for(reply, self.Timeout)
+            finally:
+                self.Pending.pop(sequence, None)
+
+        return unpack_from('<B', retData, 48)[0], retData
+
+    async def _exchange(self, packet):
+        '''
+        Send an unconnected packet and read its reply, only used
+        while nothing else is in flight (connect and close)
+        '''
+        self.Writer.write(packet)
+        await self.Writer.drain()
+        return await asyncio.wait_for(self._readFrame(), self.Timeout)
+
+    async def _readFrame(self):
+        '''
+        Read one whole encapsulation packet, the 24 byte header
+        says how long the rest of it is
+        '''
+        header = await self.Reader.readexactly(24)
+        length = unpack_from('<H', header, 2)[0]
+        return header + await self.Reader.readexactly(length)
+
+    async def _dispatchReplies(self):
+        '''
+        Hand each connected reply to the request with the same
+        sequence count, in whatever order they arrive
+        '''
+        try:
+            while True:
+                retData = await self._readFrame()
+                if unpack_from('<H', retData, 0)[0] != 0x70:
+                    continue
+                reply = self.Pending.get(unpack_from('<H', retData, 44)[0])
+                if reply is not None and not reply.done():
+                    reply.set_result(retData)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            # the PLC went away, nothing in flight is coming back
+            self.SocketConnected = self.State.SocketConnected = False
+            self._failPending(ConnectionError('Lost connection to the PLC: ' + str(e)))
+
+    def _failPending(self, error):
+        for reply in self.Pending.values():
+            if not reply.done():
+                reply.set_exception(error)
+        self.Pending = {}
@@ -0,0 +1,212 @@
+'''
+Opt-in request instrumentation for PLC.  With PLC.Stats left
+at None the only cost on the request path is one attribute
+check, once it is set every request _getBytes sends and every
+_connect is recorded:
+
+    stats = comm.EnableStats()
+    ...
+    print('\n'.join(stats.Report()))
+    stats.Dump('logs/io_stats.json')
+
+Requests are grouped by CIP service and by tag family, the
+tag path with its numbers taken out, so Motor_1.Pos_1 and
+Motor_30.Pos_1 are both Program:Wave_Control.Motor_#.Pos_#.
+Each group keeps a count, the bytes sent and received and a
+latency histogram the percentiles are read from.
+'''
+
+import json
+import math
+import re
+from struct import unpack_from
+from threading import Lock
+
+# CIP service code -> name in the reports
+ServiceNames = {0x01: 'Get Attributes All',
+                0x03: 'Get Attribute List',
+                0x0A: 'Multiple Service Packet',
+                0x0E: 'Get Attribute Single',
+                0x4C: 'Read Tag',
+                0x4D: 'Write Tag',
+                0x4E: 'Read Modify Write Tag',
+                0x52: 'Read Tag Fragmented',
+                0x53: 'Write Tag Fragmented',
+                0x54: 'Forward Open',
+                0x55: 'Get Instance Attribute List',
+                0x5B: 'Large Forward Open'}
+
+# histogram buckets grow by a quarter octave, 1us to about 70s in 104 buckets
+BucketsPerOctave = 4
+BucketCount = 104
+
+_digits = re.compile(r'\d+')
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+        self.Counts = [0] * BucketCount
+        self.Count = 0
+        self.Total = 0.0
+        self.Max = 0.0
+
+    def Add(self, seconds):
+        microseconds = seconds * 1e6
+        bucket = int(math.log2(microseconds) * BucketsPerOctave) if microseconds > 1 else 0
+        self.Counts[min(bucket, BucketCount - 1)] += 1
+        self.Count += 1
+        self.Total += seconds
+        self.Max = max(self.Max, seconds)
+
+    def Percentile(self, p):
+        '''
+        Upper edge of the bucket the p'th percentile falls in,
+        in seconds, so at most a fifth over the real value
+        '''
+        if not self.Count:
+            return 0.0
+        rank = math.ceil(self.Count * p / 100.0)
+        seen = 0
+        for bucket, count in enumerate(self.Counts):
+            seen += count
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / BucketsPerOctave) / 1e6, self.Max)
+        return self.Max
+
+
+class RequestGroup:
+
+    def __init__(self):
+        self.Count = 0
+        self.BytesSent = 0
+        self.BytesReceived = 0
+        self.Latency = LatencyHistogram()
+
+    def Summary(self):
+        return {'count': self.Count,
+                'bytes_sent': self.BytesSent,
+                'bytes_received': self.BytesReceived,
+                'total_ms': round(self.Latency.Total * 1e3, 3),
+                'mean_ms': round(self.Latency.Total / self.Count * 1e3, 3) if self.Count else 0.0,
+                'p50_ms': round(self.Latency.Percentile(50) * 1e3, 3),
+                'p95_ms': round(self.Latency.Percentile(95) * 1e3, 3),
+                'p99_ms': round(self.Latency.Percentile(99) * 1e3, 3),
+                'max_ms': round(self.Latency.Max * 1e3, 3)}
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.Services = {}
+        self.Families = {}
+        self.Lock = Lock()
+
+    def Record(self, service, family, sent, received, seconds):
+        '''
+        Add one request to its service and tag family
+        '''
+        with self.Lock:
+            for groups, key in ((self.Services, service), (self.Families, family)):
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = RequestGroup()
+                group.Count += 1
+                group.BytesSent += sent
+                group.BytesReceived += received
+                group.Latency.Add(seconds)
+
+    def RecordRequest(self, request, reply, seconds):
+        '''
+        Record an encapsulated request as sent by _getBytes
+        and its reply (None if nothing came back)
+        '''
+        received = len(reply) if reply is not None else 0
+        command = unpack_from('<H', request, 0)[0]
+        if command == 0x70:
+            # connected message, the CIP request follows the sequence count
+            service, family = _describe(request, 46)
+        elif command == 0x6F:
+            service, family = _describe(request, 40)
+        else:
+            service, family = 'Command 0x{:02X}'.format(command), '(session)'
+        self.Record(service, family, len(request), received, seconds)
+
+    def Reset(self):
+        with self.Lock:
+            self.Services = {}
+            self.Families = {}
+
+    def Summary(self):
+        '''
+        {'services': {name: figures}, 'families': {family: figures}}
+        with each group sorted by the total time spent on it
+        '''
+        with self.Lock:
+            return {'services': _sortedSummary(self.Services),
+                    'families': _sortedSummary(self.Families)}
+
+    def Report(self):
+        '''
+        The summary as lines of text, for the Feedback tab
+        '''
+        summary = self.Summary()
+        lines = []
+        for title, groups in (('service', summary['services']), ('tag family', summary['families'])):
+            lines.append('{:<48}{:>7}{:>10}{:>10}{:>9}{:>9}{:>9}'.format(
+                'PLC requests by ' + title, 'count', 'sent', 'received', 'p50 ms', 'p95 ms', 'p99 ms'))
+            for name, figures in groups.items():
+                lines.append('{:<48}{:>7}{:>10}{:>10}{:>9.2f}{:>9.2f}{:>9.2f}'.format(
+                    name, figures['count'], figures['bytes_sent'], figures['bytes_received'],
+                    figures['p50_ms'], figures['p95_ms'], figures['p99_ms']))
+        return lines
+
+    def Dump(self, path):
+        '''
+        Write the summary to a JSON file
+        '''
+        with open(path, 'w') as f:
+            json.dump(self.Summary(), f, indent=2)
+
+
+def _sortedSummary(groups):
+    ordered = sorted(groups.items(), key=lambda item: item[1].Latency.Total, reverse=True)
+    return {name: group.Summary() for name, group in ordered}
+
+def _describe(request, start):
+    '''
+    Service name and tag family of the CIP request at start
+    '''
+    service = request[start]
+    name = ServiceNames.get(service, 'Service 0x{:02X}'.format(service))
+    if service == 0x0A:
+        return name, '(multiple tags)'
+    if service in (0x54, 0x5B):
+        return name, '(session)'
+    return name, _family(request[start + 2:start + 2 + request[start + 1] * 2])
+
+def _family(path):
+    '''
+    The symbolic names in a request path with the numbers
+    taken out, element indexes are left out altogether
+    '''
+    names = []
+    i = 0
+    while i < len(path):
+        segment = path[i]
+        if segment == 0x91:
+            length = path[i + 1]
+            names.append(_digits.sub('#', bytes(path[i + 2:i + 2 + length]).decode('utf-8', 'replace')))
+            i += 2 + length + length % 2
+        elif segment == 0x20:
+            names.append('class 0x{:02X}'.format(path[i + 1]))
+            i += 2
+        elif segment in (0x28, 0x24, 0x30):
+            i += 2
+        elif segment in (0x29, 0x25):
+            i += 4
+        elif segment == 0x2A:
+            i += 6
+        else:
+            break
+    return '.'.join(names) or '(unknown)'
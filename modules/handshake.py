@@ -0,0 +1,221 @@
+from logging import getLogger, Logger
+from typing import Any, Callable, Dict, Iterable, List, Set
+import time
+from modules.session import PLCSession
+from modules.logging.log_utils import LOGGER_NAME
+
+# LinMot status word bits, see 0185-1093-E_6V7_MA_MotionCtrlSW-SG5-SG7.pdf
+OPERATION_ENABLED: int = 1 << 0
+ERROR: int = 1 << 3
+IN_TARGET: int = 1 << 10
+HOMED: int = 1 << 11
+MOTION_ACTIVE: int = 1 << 13
+# LinMot control word bit the PLC sets to start homing
+HOME_COMMAND: int = 1 << 11
+
+# {axis number: decoded Wave_Control.Axis[] structure} of the axes a step waits on
+Axes = Dict[int, Dict[str, Any]]
+
+
+def drives_enabled(axes: Axes) -> bool:
+    """Motor_Boot is done once every drive reports operation enabled."""
+    return all(axis['StatusWord'] & OPERATION_ENABLED for axis in axes.values())
+
+
+def drives_error_free(axes: Axes) -> bool:
+    """Clear_Motor_Error is done once no drive reports an error."""
+    return not any(axis['StatusWord'] & ERROR for axis in axes.values())
+
+
+def drives_homed(axes: Axes) -> bool:
+    return all(axis['StatusWord'] & HOMED for axis in axes.values())
+
+
+class MotionFinished:
+    """Confirms a Run_1 stroke or a curve: the drives started moving and have all come to rest in target.
+    Motion counts as started on the motion active bit, or on a demand position that moved since the
+    first poll in case a short move began and ended between two polls. Use a new one for each step.
+
+    A single stroke is two moves, to Pos_1 and then Pos_2, and the drives rest in target between them.
+    Given ends, an axis number -> demand position it finishes at, a drive only counts as done once it
+    rests within tolerance of its end, so the gap between the moves isn't taken for the end of the stroke."""
+    start: Dict[int, int]
+    started: bool
+    # axis number -> final demand position, axes not in it are done wherever they come to rest
+    ends: Dict[int, int]
+    tolerance: int
+
+    def __init__(self, ends: Dict[int, int] = None, tolerance: int = 0):
+        self.start = None
+        self.started = False
+        self.ends = ends or {}
+        self.tolerance = tolerance
+
+    def __call__(self, axes: Axes) -> bool:
+        if self.start is None:
+            self.start = {n: axis['ComDemandPosition'] for n, axis in axes.items()}
+        self.started = self.started or any(
+            axis['StatusWord'] & MOTION_ACTIVE or axis['ComDemandPosition'] != self.start.get(n)
+            for n, axis in axes.items())
+        return self.started and all(
+            axis['StatusWord'] & IN_TARGET and not axis['StatusWord'] & MOTION_ACTIVE
+            and (n not in self.ends or abs(axis['ComDemandPosition'] - self.ends[n]) <= self.tolerance)
+            for n, axis in axes.items())
+
+
+class Handshake:
+    """Runs the control steps of the Wave_Control program: set a trigger bit, poll the drives'
+    status until the PLC confirms the step, then clear the trigger. A step takes as long as the
+    hardware needs instead of a fixed wait, up to timeout.
+
+    Only a change the trigger caused confirms it. When the condition already holds before the
+    trigger is set, e.g. every drive enabled before Motor_Boot, nothing will show the PLC saw the
+    trigger, so it is held for hold seconds like the fixed wait it replaced.
+
+    All 30 Axis[] structures come back in one request, so each poll costs a single round trip."""
+    LOGGER: Logger = getLogger(LOGGER_NAME)
+    AXIS_TAG: str = 'Program:Wave_Control.Axis[0]'
+    AXIS_COUNT: int = 30
+
+    session: PLCSession
+    # the axis numbers a step waits on, normally the live motors
+    axes: Callable[[], Iterable[int]]
+    # seconds between status polls
+    poll_interval: float
+    # give up on a step after this many seconds
+    timeout: float
+    # a trigger is held at least this long so the PLC scan can't miss it, even if already confirmed
+    min_pulse: float
+    # how long a trigger is held when its condition held before it was set
+    hold: float
+
+    def __init__(self, session: PLCSession, axes: Callable[[], Iterable[int]],
+                 poll_interval: float = 0.05, timeout: float = 5.0, min_pulse: float = 0.1, hold: float = 5.0):
+        self.session = session
+        self.axes = axes
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.min_pulse = min_pulse
+        self.hold = hold
+
+    def read_axes(self, only: Iterable[int] = None) -> Axes:
+        """The Axis[] structures of the axes we wait on, or of the axes in only, read together."""
+        axes: List[Dict[str, Any]] = self.session.ReadUDTArray(self.AXIS_TAG, self.AXIS_COUNT)
+        return {n: axes[n] for n in (self.axes() if only is None else only)}
+
+    def wait(self, confirmed: Callable[[Axes], bool], timeout: float = None) -> bool:
+        """Polls until confirmed(axes) is true. Returns False if timeout ran out first."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            if confirmed(self.read_axes()):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def pulse(self, trigger: str, confirmed: Callable[[Axes], bool], timeout: float = None) -> bool:
+        """Sets trigger, waits for confirmed and clears trigger again, even if the wait failed.
+        If confirmed already holds before the trigger is set, the trigger is held for hold seconds instead.
+        Returns whether the PLC confirmed in time, logs a warning if it didn't.
+        The set isn't replayed after a lost connection since the PLC may already have acted on it."""
+        already = confirmed(self.read_axes())
+        started = time.monotonic()
+        self.session.Write(trigger, 1, replay=False)
+        try:
+            if already:
+                time.sleep(self.hold)
+                ok = True
+            else:
+                ok = self.wait(confirmed, timeout)
+                time.sleep(max(0, started + self.min_pulse - time.monotonic()))
+        finally:
+            self.session.Write(trigger, 0)
+        elapsed = time.monotonic() - started
+        if ok:
+            self.LOGGER.debug(f'{trigger} confirmed after {elapsed:.2f}s')
+        else:
+            self.LOGGER.warning(f'{trigger} not confirmed by the drives after {elapsed:.1f}s')
+        return ok
+
+
+class HomingMonitor:
+    """Watches the live axes while the PLC homes them and records how long each one took.
+
+    A homed bit left over from an earlier homing doesn't count straight away: an axis is done once
+    it has been seen not homed during this run (the drive clears the bit when homing starts), or
+    seen with the home command set and then without it, and reports homed again. A homed bit is
+    never trusted while the home command is set. An axis never seen commanded or not homed within
+    settle seconds was already home and is taken as homed."""
+    LOGGER: Logger = getLogger(LOGGER_NAME)
+
+    handshake: Handshake
+    # time.monotonic() the run started
+    started: float
+    # axis number -> seconds from the start until it reported homed
+    homed_after: Dict[int, float]
+    # axes seen homing (not homed, or with the home command) during this run
+    seen_homing: Set[int]
+    # axes seen with the home command set, waiting for it to drop
+    commanded: Set[int]
+    # the Axis[] structures from the latest poll
+    axes: Axes
+    # seconds before a homed bit is trusted without having seen the axis homing
+    settle: float
+    # the axes watched, None for every axis the handshake waits on
+    only: List[int]
+
+    def __init__(self, handshake: Handshake, settle: float = 0.5, only: Iterable[int] = None):
+        self.handshake = handshake
+        self.settle = settle
+        self.only = None if only is None else list(only)
+        self.started = time.monotonic()
+        self.homed_after = {}
+        self.seen_homing = set()
+        self.commanded = set()
+        self.axes = {}
+
+    def poll(self) -> bool:
+        """Reads every live axis once and returns whether all of them are homed."""
+        self.axes = self.handshake.read_axes(self.only)
+        now = time.monotonic()
+        for n, axis in self.axes.items():
+            if n in self.homed_after:
+                continue
+            homed = axis['StatusWord'] & HOMED
+            command = axis['ControlWord'] & HOME_COMMAND
+            if not homed:
+                self.seen_homing.add(n)
+            if command:
+                # still homing, the homed bit may be the one from before
+                self.commanded.add(n)
+                continue
+            if n in self.commanded:
+                self.seen_homing.add(n)
+            if homed and (n in self.seen_homing or now - self.started >= self.settle):
+                self.homed_after[n] = now - self.started
+        return all(n in self.homed_after for n in self.axes)
+
+    def pending(self) -> List[int]:
+        """Axes that haven't reported homed yet."""
+        return [n for n in self.axes if n not in self.homed_after]
+
+    def run(self, timeout: float, poll_interval: float = None,
+            progress: Callable[['HomingMonitor'], None] = None) -> bool:
+        """Polls until every axis is homed or timeout runs out, calling progress(self) after each poll.
+        Returns whether every axis homed."""
+        poll_interval = self.handshake.poll_interval if poll_interval is None else poll_interval
+        deadline = self.started + timeout
+        while True:
+            done = self.poll()
+            if progress is not None:
+                progress(self)
+            remaining = deadline - time.monotonic()
+            if done or remaining <= 0:
+                break
+            time.sleep(min(poll_interval, remaining))
+        for n in sorted(self.homed_after):
+            self.LOGGER.info(f'Axis {n} homed after {self.homed_after[n]:.2f}s')
+        if not done:
+            self.LOGGER.warning(f'Axes {self.pending()} not homed after {timeout:.0f}s')
+        return done
@@ -3,6 +3,7 @@ from logging import LogRecord, addLevelName, Handler, DEBUG, CRITICAL, Formatter
 import tkinter as tk
 from datetime import date
 from os import getcwd
+from modules.view_queue import ViewQueue
 
 addLevelName(15, "SUCCESS")
 LOGGER_NAME = "logger"
@@ -13,14 +14,18 @@ class TextboxLogHandler(Handler):
     """Emits all levels of logs to the desired tkinter textbox.
 
         In the future, this may be modified to work better with a scrollable text box.
+        Records logged off the Tk thread, e.g. by the command actor, are written by the Tk thread.
     """
     text: tk.Text
+    ui: ViewQueue
 
     def __init__(self, text: tk.Text):
         Handler.__init__(self)
         self.text = text
         self.text.configure(fg="#dedede")
         self.text.configure(state='normal')
+        self.ui = ViewQueue()
+        self.ui.attach(self.text)
 
         self.text.tag_configure("SUCCESS", foreground="lime green")
         self.text.tag_configure("DEBUG", foreground="light blue")
@@ -31,7 +36,9 @@ class TextboxLogHandler(Handler):
             "CRITICAL", foreground="crimson", underline=True)
 
     def emit(self, record: LogRecord):
-        msg = self.format(record)
+        self.ui.post(self.__write, self.format(record))
+
+    def __write(self, msg: str):
         self.text.insert(tk.END, msg + "\n")
         self.__apply_coloring()
 
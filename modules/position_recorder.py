@@ -0,0 +1,148 @@
+from concurrent.futures import Future
+from logging import getLogger, Logger
+from typing import Any, Callable, Dict, List
+import time
+from modules.command_actor import CommandActor
+from modules.session import PLCSession
+from modules.view_queue import ViewQueue
+from modules.logging.log_utils import LOGGER_NAME
+
+# "Motor n" -> elapsed time -> demand, actual and displacement, as saved to the database
+Recording = Dict[str, Dict[str, Dict[str, int]]]
+
+
+class PositionRecorder:
+    """Records the demand and actual position of the live axes every interval seconds for duration
+    seconds, to the day's analytics file and the database, and moves the progress bar as it goes.
+
+    Every sample is its own TELEMETRY command on the command actor, scheduled for its slot on a fixed
+    timetable, so the worker is free between samples: a stop pressed during a recording waits for at
+    most the one MultiRead in flight. stop() ends the recording early, it and every sample run on the
+    actor's worker so they never overlap. The progress bar is a Tk widget, so its updates are posted to ui.
+    Without a session (mock mode) only the progress bar moves."""
+    LOGGER: Logger = getLogger(LOGGER_NAME)
+    # the most samples one recording takes
+    MAX_RUNS: int = 10000
+
+    session: PLCSession
+    actor: CommandActor
+    # runs the view updates on the Tk thread
+    ui: ViewQueue
+    # ControlHome, owns the progress bar
+    view: Any
+    # axis numbers sampled, and the motor labels for the file header
+    axes: List[int]
+    labels: List[int]
+    interval: float
+    duration: float
+    # the analytics file, appended to
+    path: str
+    # demand and actual of every axis, fetched together so each pair comes from the same scan
+    tags: List[str]
+    data: Recording
+    handle: Any
+    # seconds into the recording of the next sample, and how many were taken
+    elapsed: float
+    runs: int
+    # time.monotonic() the next sample is due
+    next_sample: float
+    # the next sample, queued on the actor
+    pending: Future
+    # called with data on the actor once the recording ends
+    finished: Callable[[Recording], None]
+    # resolves to the number of samples taken once the recording ends
+    done: Future
+
+    def __init__(self, session: PLCSession, actor: CommandActor, ui: ViewQueue, view: Any, axes: List[int], labels: List[int],
+                 interval: float, duration: float, path: str, finished: Callable[[Recording], None] = None):
+        self.session = session
+        self.actor = actor
+        self.ui = ui
+        self.view = view
+        self.axes = list(axes)
+        self.labels = list(labels)
+        self.interval = interval
+        self.duration = duration
+        self.path = path
+        self.finished = finished
+        self.tags = []
+        for motor in self.axes:
+            self.tags.append('Program:Wave_Control.Axis[{0}].ComDemandPosition'.format(motor))
+            self.tags.append('Program:Wave_Control.Axis[{0}].ComActualPosition'.format(motor))
+        self.data = {}
+        self.handle = None
+        self.elapsed = 0
+        self.runs = 0
+        self.pending = None
+        self.done = Future()
+
+    def start(self) -> 'PositionRecorder':
+        """Writes the file header and queues the first sample."""
+        self.done.set_running_or_notify_cancel()
+        if self.session is not None:
+            self.handle = open(self.path, "a+")
+            self.handle.write("\n" + "----- Run " + str(time.asctime()) + "-----\n" + "                 ")
+            for motor in self.labels:
+                # DO NOT DELETE
+                # Creating entry in data, labelled by motor
+                self.data["Motor "+str(motor)] = {}
+                self.handle.write(f"motor {motor:<18d}")
+            self.handle.write("\n"+"t           ")
+            for motor in self.axes:
+                self.handle.write("demand      actual      ")
+            self.handle.write("\n")
+        self.next_sample = time.monotonic()
+        self.pending = self.actor.submit(self.sample, priority=CommandActor.TELEMETRY)
+        return self
+
+    def sample(self):
+        """Takes one sample and queues the next, or ends the recording once duration is up."""
+        if self.done.done():
+            return
+        if self.elapsed >= self.duration or self.runs >= self.MAX_RUNS:
+            self.stop()
+            return
+        try:
+            self.ui.post(self.view.update_progress_bar, self.elapsed/self.duration)
+            if self.session is not None:
+                self.handle.write(f"{self.elapsed:7.4f}")
+                positions: List[Any] = self.session.MultiRead(*self.tags)
+                for n, motor in enumerate(self.axes):
+                    demandPositon: Any = positions[2*n]
+                    actualPosition: Any = positions[2*n + 1]
+                    displacement = abs(demandPositon - actualPosition)
+
+                    # DO NOT DELETE
+                    # Adding the data to data, by motor and interval
+                    self.data.setdefault("Motor "+str(motor), {})[str(self.elapsed)] = {
+                        "Actual Position": actualPosition, "Expected Position": demandPositon, "Displacement": displacement}
+
+                    self.handle.write(f"{demandPositon:>12d}{actualPosition:>12d}")
+                self.handle.write("\n")
+        except Exception:
+            # a failed read ends the recording, with what was taken so far
+            self.stop()
+            raise
+        self.runs += 1
+        # sample on a fixed schedule so the time spent reading doesn't stretch the interval
+        self.next_sample += self.interval
+        self.elapsed += self.interval
+        self.pending = self.actor.schedule(self.next_sample - time.monotonic(), self.sample,
+                                           priority=CommandActor.TELEMETRY)
+
+    def stop(self):
+        """Ends the recording: drops the next sample, closes the file and calls finished.
+        Must run on the actor, e.g. from a stop command. Does nothing if it already ended."""
+        if self.done.done():
+            return
+        if self.pending is not None:
+            self.pending.cancel()
+        try:
+            self.ui.post(self.view.destory_progress_bar)
+            if self.handle is not None:
+                self.handle.close()
+            if self.finished is not None:
+                self.finished(self.data)
+        finally:
+            self.LOGGER.debug(f'Recorded {self.runs} position sample(s) over {self.elapsed:.2f}s')
+            self.done.set_result(self.runs)
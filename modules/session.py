@@ -0,0 +1,347 @@
+from logging import getLogger, Logger
+from os import getcwd
+from threading import Event, RLock, Thread
+from typing import Callable, List
+import time
+from modules.eip import PLC, _closeConnection, _connect
+from modules.lgxDevice import LGXDevice
+from modules.eip_stats import RequestStats
+from modules.tag_catalog import TagCatalog
+from modules.logging.log_utils import LOGGER_NAME
+
+
+# ListIdentity device type of a controller
+CONTROLLER_DEVICE_TYPE: int = 0x0E
+
+
+def find_controller(ip: str, port: int = 44818, timeout: float = 0.5, serial_number: str = None) -> str:
+    """Where to find the PLC: ip, unless a ListIdentity broadcast finds nothing at ip but does find the
+    controller with serial_number elsewhere. A controller with any other serial number is never used,
+    so the GUI can't end up driving the wrong rig; without serial_number the answer is always ip.
+    Listening stops as soon as ip answers. A discovery that ran to the end is cached by modules.eip
+    for DiscoveryCacheTTL, so asking again soon after doesn't touch the network.
+    Falls back to ip when nothing answers, e.g. the PLC is behind a router that drops broadcasts."""
+    controllers: List[LGXDevice] = []
+
+    def found(device: LGXDevice) -> bool:
+        if device.DeviceID == CONTROLLER_DEVICE_TYPE:
+            controllers.append(device)
+        return device.IPAddress == ip
+
+    def matches(device: LGXDevice) -> bool:
+        return serial_number is not None and str(device.SerialNumber).lower() == serial_number.lower()
+
+    probe = PLC()
+    probe.Port = port
+    try:
+        devices = probe.Discover(found, timeout=timeout)
+    except OSError as e:
+        PLCSession.LOGGER.warning(f'PLC discovery failed: {e}')
+        return ip
+    at_ip = [device for device in devices if device.IPAddress == ip]
+    if at_ip:
+        if serial_number is not None and not matches(at_ip[0]):
+            PLCSession.LOGGER.warning(f'The controller at {ip} has serial number {at_ip[0].SerialNumber}, '
+                                      f'expected {serial_number}.')
+        return ip
+    if not controllers:
+        return ip
+    expected = [device for device in controllers if matches(device)]
+    if not expected:
+        PLCSession.LOGGER.warning(f'Nothing answered at {ip}. Controller(s) found at '
+                                  f'{", ".join(f"{d.IPAddress} (serial {d.SerialNumber})" for d in controllers)}, '
+                                  f'none with serial number {serial_number}, staying at {ip}.')
+        return ip
+    PLCSession.LOGGER.warning(f'Nothing answered at {ip}, using controller {serial_number} '
+                              f'found at {expected[0].IPAddress}.')
+    return expected[0].IPAddress
+
+
+class RequestNotReplayed(ConnectionError):
+    """The connection dropped during a request that isn't safe to send twice (a pulse).
+    The session has reconnected, the caller decides whether to try again."""
+
+
+class PLCSession:
+    """Long-lived EtherNet/IP session shared by the Model and every Motor.
+
+    Opening a PLC() costs a TCP connect, RegisterSession and ForwardOpen, so
+    instead of doing that for every tag we keep one connection open and hand
+    it out under a lock. Each Read/Write holds the lock for a single request,
+    so long running loops (homing, analytics) never starve other threads.
+    Use `with session as comm:` when several requests must go out back to back.
+
+    Tag data types are kept in an on-disk cache per PLC so a restart doesn't
+    have to rediscover every tag, see `tag_cache_file`.
+
+    While connected, a background thread sends a tiny keep alive request whenever
+    the connection has been idle for KEEPALIVE_INTERVAL, so long waits (homing,
+    continuous runs) don't let the controller time the connection out.
+
+    A connection that drops is reopened with exponential backoff, from RECONNECT_DELAY
+    up to RECONNECT_MAX_DELAY over RECONNECT_ATTEMPTS tries. The request that hit the
+    drop is sent again once reconnected, unless it was made with replay=False, e.g. a
+    command pulse the PLC may already have acted on. Listeners added with add_listener
+    are told about every change of connection state."""
+    LOGGER: Logger = getLogger(LOGGER_NAME)
+    # bytes per packet, big enough for the whole 30 axis grid in one or two packets.
+    # Controllers without Large Forward Open support fall back to 500
+    CONNECTION_SIZE: int = 4000
+    # directory the per-PLC tag caches are kept in
+    CACHE_DIR: str = f"{getcwd()}/cache"
+    # seconds of idle before a keep alive goes out, the controller drops a connection after about a minute
+    KEEPALIVE_INTERVAL: float = 10.0
+    # address tags by symbol instance ID once the tag catalog is loaded, the PLC turns it off if unsupported
+    INSTANCE_ADDRESSING: bool = True
+    # reconnect backoff: first delay, doubling up to the max delay, over this many attempts
+    RECONNECT_ATTEMPTS: int = 6
+    RECONNECT_DELAY: float = 0.25
+    RECONNECT_MAX_DELAY: float = 4.0
+
+    # connection states passed to listeners
+    CONNECTED: str = 'connected'
+    LOST: str = 'lost'
+    RECONNECTING: str = 'reconnecting'
+    OFFLINE: str = 'offline'
+
+    # the PLC we talk to
+    ip: str
+    slot: int
+    port: int
+    # where the PLC's tag data types are cached between runs
+    tag_cache_file: str
+    # the PLC's symbols and UDT templates, kept in cache/catalog_<ip>.json
+    catalog: TagCatalog
+    # the underlying pylogix connection, created on first use
+    comm: PLC
+    # request instrumentation, kept across reconnects. None unless enable_stats() was called
+    stats: RequestStats
+    # serializes access to comm between the GUI and worker threads
+    lock: RLock
+    # time.monotonic() of the last request, keep alives only go out when idle
+    last_request: float
+    # sends the keep alives, stopped by setting stopping
+    keepalive: Thread
+    stopping: Event
+    # last state the listeners were told about, None before the first connect
+    state: str
+    # the connection dropped without close() being called, so the next connect backs off
+    lost: bool
+    # called with the new state on every change, while the session lock is held
+    listeners: List[Callable[[str], None]]
+
+    def __init__(self, ip: str, slot: int, port: int = 44818):
+        self.ip = ip
+        self.slot = slot
+        self.port = port
+        self.tag_cache_file = f"{self.CACHE_DIR}/tags_{ip}.json"
+        self.catalog = TagCatalog(f"{self.CACHE_DIR}/catalog_{ip}.json")
+        self.comm = None
+        self.stats = None
+        self.lock = RLock()
+        self.last_request = time.monotonic()
+        self.keepalive = None
+        self.stopping = Event()
+        self.state = None
+        self.lost = False
+        self.listeners = []
+
+    def __enter__(self) -> PLC:
+        self.lock.acquire()
+        try:
+            return self._connected()
+        except:
+            self._drop()
+            self.lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.last_request = time.monotonic()
+        try:
+            # a failed request may have left the socket half open, start fresh next time
+            if exc_type is not None and self.comm is not None and not self.comm.SocketConnected:
+                self._lose(exc_val)
+        finally:
+            self.lock.release()
+        return False
+
+    def _connected(self) -> PLC:
+        """Returns the open connection, (re)connecting if it was never opened or was lost.
+        After a lost connection this backs off and retries, a first connect is only tried once."""
+        if self.lost:
+            return self._reconnect()
+        return self._open()
+
+    def _open(self) -> PLC:
+        opening = self.comm is None
+        if opening:
+            self.comm = PLC()
+            self.comm.IPAddress = self.ip
+            self.comm.ProcessorSlot = self.slot
+            self.comm.Port = self.port
+            self.comm.TagCacheFile = self.tag_cache_file
+            self.comm.ConnectionSize = self.CONNECTION_SIZE
+            self.comm.Stats = self.stats
+            self.catalog.Attach(self.comm)
+            self.comm.InstanceAddressing = self.INSTANCE_ADDRESSING
+        _connect(self.comm)
+        if opening and self.INSTANCE_ADDRESSING:
+            # instance IDs come from the catalog, check it is current before any tag is compiled
+            try:
+                self.catalog.Refresh(self.comm)
+            except Exception as e:
+                # only an optimisation, carry on with symbolic addressing
+                self.LOGGER.warning(f'Could not read the tag catalog ({e}), addressing tags by name.')
+                self.comm.InstanceAddressing = False
+                self.comm.Catalog = None
+        self.lost = False
+        self._notify(self.CONNECTED)
+        if self.keepalive is None or not self.keepalive.is_alive():
+            self.stopping = Event()
+            self.keepalive = Thread(target=self._keep_alive, args=(self.stopping,), daemon=True)
+            self.keepalive.start()
+        return self.comm
+
+    def _reconnect(self) -> PLC:
+        """Reopens a lost connection, waiting longer after each failed attempt.
+        Raises the last error once RECONNECT_ATTEMPTS have failed, the next request starts over."""
+        delay = self.RECONNECT_DELAY
+        for attempt in range(1, self.RECONNECT_ATTEMPTS + 1):
+            self._notify(self.RECONNECTING)
+            try:
+                return self._open()
+            except Exception as e:
+                self._drop()
+                if attempt == self.RECONNECT_ATTEMPTS:
+                    self.LOGGER.error(f'Could not reconnect to the PLC after {attempt} attempts ({e}).')
+                    self._notify(self.OFFLINE)
+                    raise
+                self.LOGGER.warning(f'Reconnect attempt {attempt} failed ({e}), retrying in {delay:.2f}s.')
+                time.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def _lose(self, error: Exception):
+        """The connection died under us: tear it down and have the next connect back off."""
+        self.LOGGER.warning(f'Lost connection to the PLC ({error}), reconnecting.')
+        self._drop()
+        self.lost = True
+        self._notify(self.LOST)
+
+    def _notify(self, state: str):
+        if state == self.state and state == self.CONNECTED:
+            return
+        self.state = state
+        for listener in list(self.listeners):
+            try:
+                listener(state)
+            except Exception as e:
+                self.LOGGER.error(f'PLC connection listener failed: {e}')
+
+    def _keep_alive(self, stopping: Event):
+        """Keep alive thread: pings the PLC whenever the connection has sat idle for KEEPALIVE_INTERVAL.
+        It never waits on the lock, if someone holds it the connection isn't idle. Only a ping that
+        finds the socket gone drops the connection, an error reply is just logged."""
+        while not stopping.wait(max(self.KEEPALIVE_INTERVAL - (time.monotonic() - self.last_request),
+                                     self.KEEPALIVE_INTERVAL / 10)):
+            if time.monotonic() - self.last_request < self.KEEPALIVE_INTERVAL:
+                continue
+            if not self.lock.acquire(blocking=False):
+                continue
+            try:
+                if self.comm is not None and self.comm.SocketConnected:
+                    self.comm.KeepAlive()
+            except Exception as e:
+                if isinstance(e, OSError) or self.comm is None or not self.comm.SocketConnected:
+                    # the socket is gone, the next real request reconnects
+                    self._lose(e)
+                else:
+                    # the PLC answered with an error, the connection itself is fine
+                    self.LOGGER.warning(f'Keep alive failed ({e}), keeping the connection.')
+            finally:
+                self.last_request = time.monotonic()
+                self.lock.release()
+
+    def _drop(self):
+        """Tears down the current connection so the next request reconnects."""
+        if self.comm is not None:
+            _closeConnection(self.comm)
+            self.comm = None
+
+    def _call(self, method: str, *args, replay: bool = True):
+        """Runs one request on the shared connection.
+        If the connection turns out to be dead it is reopened and, if replay is set, the request sent once more.
+        Reads and absolute writes can be replayed, a pulse the PLC may already have seen cannot."""
+        with self.lock:
+            try:
+                comm = self._connected()
+            except:
+                # nothing to retry if we can't reach the PLC at all
+                self._drop()
+                raise
+            try:
+                return getattr(comm, method)(*args)
+            except Exception as e:
+                if self.comm is not None and self.comm.SocketConnected:
+                    # the PLC answered, this is a real error (bad tag, bad value...)
+                    raise
+                self._lose(e)
+                comm = self._connected()
+                if not replay:
+                    raise RequestNotReplayed(f'Connection lost during {method}{args}, not sent again.') from e
+                return getattr(comm, method)(*args)
+            finally:
+                self.last_request = time.monotonic()
+
+    def Read(self, tag, count=1, datatype=None):
+        return self._call('Read', tag, count, datatype)
+
+    def Write(self, tag, value, datatype=None, replay: bool = True):
+        return self._call('Write', tag, value, datatype, replay=replay)
+
+    def WriteBits(self, tag, bits):
+        return self._call('WriteBits', tag, bits)
+
+    def MultiRead(self, *args):
+        return self._call('MultiRead', *args)
+
+    def MultiWrite(self, *args):
+        return self._call('MultiWrite', *args)
+
+    def ReadUDTArray(self, tag, count, instance=None):
+        return self._call('ReadUDTArray', tag, count, instance)
+
+    def GetProgramTagList(self, programName):
+        return self._call('GetProgramTagList', programName)
+
+    def add_listener(self, listener: Callable[[str], None]):
+        """Calls listener(state) whenever the connection becomes CONNECTED, LOST, RECONNECTING or OFFLINE.
+        It runs on whichever thread made the request, with the session locked, so it must not block."""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str], None]):
+        self.listeners.remove(listener)
+
+    def tag_catalog(self) -> TagCatalog:
+        """The PLC's symbols and templates, downloaded again only if the program changed since last time."""
+        with self.lock:
+            self.catalog.Refresh(self._connected())
+            return self.catalog
+
+    def enable_stats(self) -> RequestStats:
+        """Starts recording the count, bytes and latency of every request made on this session."""
+        with self.lock:
+            if self.stats is None:
+                self.stats = RequestStats()
+            if self.comm is not None:
+                self.comm.Stats = self.stats
+            return self.stats
+
+    def close(self):
+        """Shutdown hook: stop the keep alives, forward close and unregister the session."""
+        self.stopping.set()
+        with self.lock:
+            self._drop()
+            self.lost = False
+            self.state = None
+        if self.keepalive is not None:
+            self.keepalive.join()
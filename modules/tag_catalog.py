@@ -0,0 +1,289 @@
+'''
+A controller's symbols and UDT templates, kept in memory and
+on disk and only downloaded again when the controller says
+something changed.
+
+GetTagList/GetProgramTagList start from nothing every time:
+page through the controller's symbols with 0x55, then every
+program's, then read every template again.  The catalog does
+that once, remembers the controller change counters (class
+0xAC) it was built against and on Refresh only looks again
+when those have moved.  Even then templates whose structure
+handle is unchanged are kept instead of being read again.
+Controllers without change counters get their symbols listed
+and compared with the catalog instead, which still saves
+reading the templates when nothing changed.
+
+    catalog = TagCatalog('cache/catalog.json')
+    catalog.Attach(comm)
+    catalog.Refresh(comm)
+    catalog.Tag('Program:Wave_Control.Axis').DataTypeValue
+    catalog.Template(instance).Size
+
+Once attached, PLC looks up the templates of structure tags
+and answers GetProgramTagList from the catalog.
+'''
+
+from struct import unpack_from
+from threading import RLock
+from modules.eip import (LgxTag, UDTTemplate, _buildDecoders, _buildEIPHeader, _buildTagListRequest,
+                         _compileTemplate, _connect, _getBytes, _getControllerFingerprint,
+                         _getTemplateInfo, _readCacheFile, _writeCacheFile, cipErrorCodes, parseLgxTag)
+
+# bump when the layout of the catalog file changes
+CatalogVersion = 1
+
+# symbols the controller lists that aren't tags
+_hiddenSymbols = ('__DEFVAL_', 'Routine:', 'Map:', 'Task:')
+
+
+class TagCatalog:
+
+    def __init__(self, cacheFile=None):
+        '''
+        cacheFile is where the catalog is kept between runs,
+        None to keep it in memory only
+        '''
+        self.CacheFile = cacheFile
+        # controller change counters the catalog was built against
+        self.Fingerprint = None
+        self.Programs = []
+        # lower case tag name -> LgxTag, names are not case sensitive in Logix
+        self.Tags = {}
+        # (program name or None, instance ID) -> LgxTag
+        self.Instances = {}
+        # template instance -> UDTTemplate, shared with the attached PLC
+        self.Templates = {}
+        self.Lock = RLock()
+        self.Loaded = False
+
+    def Attach(self, plc):
+        '''
+        Let plc find symbols and templates here
+        '''
+        plc.Catalog = self
+        plc.Templates = self.Templates
+
+    def Refresh(self, plc, force=False):
+        '''
+        Bring the catalog up to date with the controller plc is
+        connected to.  Only reads the change counters unless they
+        moved since the catalog was built (or force is set).  A
+        controller without them has its symbols listed and
+        compared with the catalog's.
+        Returns True if the symbols were downloaded again
+        '''
+        with self.Lock:
+            if not _connect(plc): return False
+            fingerprint = _getControllerFingerprint(plc)
+            if not self.Loaded:
+                self.Load()
+            symbols = None
+            if not force and self.Tags:
+                if fingerprint is not None:
+                    current = fingerprint == self.Fingerprint
+                else:
+                    symbols = _listAllSymbols(plc)
+                    current = self._sameSymbols(symbols[1])
+                if current:
+                    self._buildDecoders(plc)
+                    return False
+
+            if symbols is not None or self.Fingerprint is not None and fingerprint != self.Fingerprint:
+                # the program was edited, what the client learned about tags may be stale
+                plc.KnownTags.clear()
+                plc.CompiledTags.clear()
+
+            self._setSymbols(*(symbols or _listAllSymbols(plc)))
+            self._refreshTemplates(plc)
+            self.Fingerprint = fingerprint
+            self.Save()
+            return True
+
+    def Tag(self, name):
+        '''
+        The LgxTag of a controller or program scope tag, None if
+        the controller has no such tag
+        '''
+        return self.Tags.get(name.lower())
+
+    def Instance(self, instance, programName=None):
+        '''
+        The LgxTag with a symbol instance ID, in programName or
+        at controller scope
+        '''
+        return self.Instances.get((programName.lower() if programName else None, instance))
+
+    def Template(self, instance):
+        return self.Templates.get(instance)
+
+    def ProgramTags(self, programName):
+        '''
+        Every tag of a program, None if there is no such program
+        '''
+        prefix = programName.lower() + '.'
+        if programName.lower() not in [p.lower() for p in self.Programs]:
+            return None
+        return [tag for name, tag in self.Tags.items() if name.startswith(prefix)]
+
+    def Load(self):
+        '''
+        Fill the catalog from the cache file, True if there was
+        a usable one.  Refresh decides whether it is current
+        '''
+        self.Loaded = True
+        if not self.CacheFile:
+            return False
+        cache = _readCacheFile(self.CacheFile, CatalogVersion)
+        if cache is None:
+            return False
+
+        self.Programs = cache['programs']
+        self._clearSymbols()
+        for name, instance, typeWord, size, dataType in cache['tags']:
+            tag = _makeTag(name, instance, typeWord, size)
+            tag.DataType = dataType
+            self._addSymbol(tag, name.split('.')[0] if '.' in name else None)
+
+        self.Templates.clear()
+        for instance, (name, handle, size, members) in cache['templates'].items():
+            template = UDTTemplate()
+            template.Instance = int(instance)
+            template.Name = name
+            template.Handle = handle
+            template.Size = size
+            template.Members = [tuple(member) for member in members]
+            self.Templates[template.Instance] = template
+        self.Fingerprint = cache['fingerprint']
+        return True
+
+    def Save(self):
+        '''
+        Write the catalog to the cache file
+        '''
+        if not self.CacheFile:
+            return False
+        return _writeCacheFile(self.CacheFile, CatalogVersion, self.Fingerprint, {
+            'programs': self.Programs,
+            'tags': [[tag.TagName, tag.InstanceID, _typeWord(tag), tag.Size, tag.DataType]
+                     for tag in self.Tags.values()],
+            'templates': {instance: [t.Name, t.Handle, t.Size, [list(m) for m in t.Members]]
+                          for instance, t in self.Templates.items()}})
+
+    def _setSymbols(self, programs, symbols):
+        '''
+        Replace the symbols with what _listAllSymbols returned
+        '''
+        self._clearSymbols()
+        self.Programs = programs
+        for tag, programName in symbols:
+            self._addSymbol(tag, programName)
+
+    def _sameSymbols(self, symbols):
+        '''
+        Whether the controller lists the same symbols, with the
+        same instance IDs and types, as the catalog holds
+        '''
+        listed = {(tag.TagName.lower(), tag.InstanceID, _typeWord(tag)) for tag, programName in symbols}
+        return listed == {(name, tag.InstanceID, _typeWord(tag)) for name, tag in self.Tags.items()}
+
+    def _refreshTemplates(self, plc):
+        '''
+        Keep the templates whose structure handle is unchanged,
+        read the new and changed ones
+        '''
+        changed = False
+        for instance in list(self.Templates):
+            try:
+                handle = _getTemplateInfo(plc, instance)[0]
+            except Exception:
+                # the structure was deleted
+                handle = None
+            if handle != self.Templates[instance].Handle:
+                del self.Templates[instance]
+                changed = True
+        if changed:
+            # decoders of other structures may point at a nested one that changed
+            for template in self.Templates.values():
+                template.Decoders = []
+        self._buildDecoders(plc)
+        for instance in {tag.DataTypeValue for tag in self.Tags.values() if tag.Struct}:
+            _compileTemplate(plc, instance)
+
+        for tag in self.Tags.values():
+            if tag.Struct:
+                tag.DataType = self.Templates[tag.DataTypeValue].Name
+            elif tag.SymbolType in plc.CIPTypes:
+                tag.DataType = plc.CIPTypes[tag.SymbolType][1]
+
+    def _buildDecoders(self, plc):
+        '''
+        Templates loaded from the cache file only have their
+        member list, work out the decoders from it
+        '''
+        for template in list(self.Templates.values()):
+            if not template.Decoders:
+                _buildDecoders(plc, template)
+
+    def _clearSymbols(self):
+        self.Tags = {}
+        self.Instances = {}
+
+    def _addSymbol(self, tag, programName):
+        self.Tags[tag.TagName.lower()] = tag
+        self.Instances[(programName.lower() if programName else None, tag.InstanceID)] = tag
+
+
+def _listSymbols(plc, programName):
+    '''
+    Page through the symbols of a program (or the controller)
+    the same way _getTagList does, without touching TagList
+    '''
+    tags = []
+    plc.Offset = 0
+    status = 6
+    while status == 6:
+        eipHeader = _buildEIPHeader(plc, _buildTagListRequest(plc, programName))
+        status, retData = _getBytes(plc, eipHeader)
+        if status != 0 and status != 6:
+            raise Exception('Failed to list tags, ' + cipErrorCodes.get(status, 'Unknown error'))
+
+        packetStart = 50
+        while packetStart < len(retData):
+            tagLen = unpack_from('<H', retData, packetStart+4)[0]
+            tag = parseLgxTag(plc, retData[packetStart:packetStart+tagLen+20], programName)
+            # the next page starts after the last instance of this one
+            plc.Offset = unpack_from('<I', retData, packetStart)[0] + 1
+            if not any(hidden in tag.TagName for hidden in _hiddenSymbols):
+                tags.append(tag)
+            packetStart += tagLen + 20
+    return tags
+
+def _listAllSymbols(plc):
+    '''
+    The programs and every (symbol, program name) of the
+    controller, None for the program of controller scope ones
+    '''
+    programs = []
+    symbols = []
+    for tag in _listSymbols(plc, None):
+        symbols.append((tag, None))
+        if tag.TagName.startswith('Program:'):
+            programs.append(tag.TagName)
+    for programName in programs:
+        symbols += [(tag, programName) for tag in _listSymbols(plc, programName)]
+    return programs, symbols
+
+def _typeWord(tag):
+    return tag.DataTypeValue | tag.Array << 13 | tag.Struct << 15
+
+def _makeTag(name, instance, typeWord, size):
+    tag = LgxTag()
+    tag.TagName = name
+    tag.InstanceID = instance
+    tag.SymbolType = typeWord & 0xff
+    tag.DataTypeValue = typeWord & 0xfff
+    tag.Array = (typeWord & 0x6000) >> 13
+    tag.Struct = (typeWord & 0x8000) >> 15
+    tag.Size = size
+    return tag
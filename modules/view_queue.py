@@ -0,0 +1,59 @@
+from queue import Empty, SimpleQueue
+from threading import get_ident
+from typing import Any, Callable
+
+
+class ViewQueue:
+    """Hands calls into the views over to the Tk thread. Tk widgets may only be touched from the thread
+    running mainloop, but the model's commands run on the command actor's worker.
+
+    post() may be called from any thread. On the Tk thread it runs the call straight away, from any other
+    thread the call is queued and the Tk thread runs it the next time it drains the queue, every interval
+    ms once attach() has been called. Until then there is no Tk thread (tests, scripts, the model being
+    set up) and posted calls run where they are made."""
+    # (function, args) waiting for the Tk thread
+    calls: SimpleQueue
+    # the widget whose after() drains the queue, None until attached
+    widget: Any
+    # thread ident of the Tk thread
+    thread: int
+    interval: int
+
+    def __init__(self):
+        self.calls = SimpleQueue()
+        self.widget = None
+        self.thread = None
+        self.interval = 50
+
+    def attach(self, widget, interval: int = 50):
+        """Starts draining the queue with widget.after. Must be called from the Tk thread."""
+        self.widget = widget
+        self.thread = get_ident()
+        self.interval = interval
+        widget.after(interval, self._drain)
+
+    def post(self, fn: Callable[..., Any], *args):
+        """Runs fn(*args) on the Tk thread."""
+        if self.widget is None:
+            fn(*args)
+        elif get_ident() == self.thread:
+            # whatever was queued before comes first
+            self.drain()
+            fn(*args)
+        else:
+            self.calls.put((fn, args))
+
+    def drain(self):
+        """Runs every queued call, in the order they were posted."""
+        while True:
+            try:
+                fn, args = self.calls.get_nowait()
+            except Empty:
+                return
+            fn(*args)
+
+    def _drain(self):
+        try:
+            self.drain()
+        finally:
+            self.widget.after(self.interval, self._drain)
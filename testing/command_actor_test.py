@@ -0,0 +1,165 @@
+"""
+Tests for modules/command_actor.py and the Model commands queued on it
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from concurrent.futures import CancelledError
+from types import SimpleNamespace
+from modules.command_actor import CommandActor, when_done
+
+
+@pytest.fixture
+def actor():
+    actor = CommandActor()
+    yield actor
+    actor.close(1.0)
+
+
+def blocker(actor):
+    """Occupies the worker until the returned event is set."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5.0)
+    actor.submit(block)
+    assert started.wait(1.0)
+    return release
+
+
+def test_results_and_errors(actor):
+    assert actor.submit(sum, [1, 2, 3]).result(1.0) == 6
+    failed = actor.submit(int, 'not a number')
+    with pytest.raises(ValueError):
+        failed.result(1.0)
+    # the worker carries on after a failed command
+    assert actor.submit(len, 'abc').result(1.0) == 3
+
+
+def test_one_at_a_time_in_order(actor):
+    ran = []
+    running = []
+
+    def command(n):
+        running.append(n)
+        assert len(running) == 1
+        time.sleep(0.01)
+        ran.append(n)
+        running.remove(n)
+
+    release = blocker(actor)
+    futures = [actor.submit(command, n) for n in range(5)]
+    release.set()
+    for future in futures:
+        future.result(1.0)
+    assert ran == [0, 1, 2, 3, 4]
+
+
+def test_stop_overtakes_queued_commands(actor):
+    ran = []
+    release = blocker(actor)
+    control = [actor.submit(ran.append, f'control {n}') for n in range(3)]
+    stop = actor.submit(ran.append, 'stop', priority=CommandActor.STOP)
+    release.set()
+    stop.result(1.0)
+    for future in control:
+        future.result(1.0)
+    assert ran == ['stop', 'control 0', 'control 1', 'control 2']
+
+
+def test_priority_classes(actor):
+    ran = []
+    release = blocker(actor)
+    actor.submit(ran.append, 'telemetry', priority=CommandActor.TELEMETRY)
+    actor.submit(ran.append, 'control')
+    actor.submit(ran.append, 'stop', priority=CommandActor.STOP)
+    release.set()
+    actor.submit(ran.append, 'last', priority=CommandActor.TELEMETRY).result(1.0)
+    assert ran == ['stop', 'control', 'telemetry', 'last']
+
+
+def test_schedule_waits_for_its_time(actor):
+    ran = []
+    start = time.monotonic()
+    later = actor.schedule(0.2, lambda: ran.append(('later', time.monotonic() - start)))
+    actor.schedule(0.05, lambda: ran.append(('sooner', time.monotonic() - start)))
+    actor.submit(ran.append, ('now', 0))
+    later.result(1.0)
+    assert [name for name, _ in ran] == ['now', 'sooner', 'later']
+    assert ran[1][1] >= 0.05 and ran[2][1] >= 0.2
+
+
+def test_close_cancels_waiting_commands():
+    actor = CommandActor()
+    release = blocker(actor)
+    waiting = actor.submit(time.sleep, 0)
+    timer = actor.schedule(10, time.sleep, 0)
+    threading.Timer(0.1, release.set).start()
+    actor.close(2.0)
+
+    assert not actor.worker.is_alive()
+    with pytest.raises(CancelledError):
+        waiting.result(0)
+    assert timer.cancelled()
+    with pytest.raises(RuntimeError):
+        actor.submit(time.sleep, 0)
+
+
+def test_when_done_polls_with_after(actor):
+    class Widget:
+        """Stands in for a Tk widget, runs after() callbacks when told to."""
+
+        def __init__(self):
+            self.pending = []
+
+        def after(self, ms, fn, *args):
+            self.pending.append((fn, args))
+
+        def run_pending(self):
+            pending, self.pending = self.pending, []
+            for fn, args in pending:
+                fn(*args)
+
+    widget = Widget()
+    results = []
+    release = blocker(actor)
+    future = actor.submit(lambda: 'done')
+    when_done(widget, future, lambda f: results.append(f.result()))
+    widget.run_pending()
+    assert results == [] and widget.pending
+
+    release.set()
+    future.result(1.0)
+    widget.run_pending()
+    assert results == ['done']
+
+
+def test_model_stop_queued_ahead(simulator, model):
+    model.state = 1
+    release = blocker(model.actor)
+    started = model.thread_motion(2, 0)
+    stopped = model.stop_motion(2)
+    release.set()
+
+    # the stop ran first, so the start queued before it leaves the drives running
+    stopped.result(2.0)
+    started.result(2.0)
+    assert model.state == 2
+    assert simulator.plc.get('Run_2') == 1
+
+
+def test_model_view_updates_wait_for_tk_thread(model):
+    # a Tk loop that only drains when told to
+    model.ui.attach(SimpleNamespace(after=lambda ms, fn: None))
+    model.state = 1
+    model.thread_motion(2, 0).result(2.0)
+    assert model.view.messages == []
+    model.ui.drain()
+    assert model.view.messages == ['Motor(s) Running']
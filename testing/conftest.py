@@ -0,0 +1,60 @@
+"""
+Fixtures shared by the tests that run against testing/plc_simulator.py. A module changes the
+simulator's speed by overriding time_scale, and the model's settings by overriding model_class.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from modules.eip import PLC
+from modules.session import PLCSession
+from testing.plc_simulator import PLCSimulator
+from testing.simulated_model import SimulatedModel, View
+
+
+@pytest.fixture
+def time_scale():
+    """How many times faster than real time the simulated drives move."""
+    return 1.0
+
+
+@pytest.fixture
+def simulator(time_scale):
+    with PLCSimulator(time_scale=time_scale) as plc:
+        yield plc
+
+
+@pytest.fixture
+def comm(simulator):
+    plc = PLC()
+    plc.IPAddress = '127.0.0.1'
+    plc.Port = simulator.port
+    yield plc
+    plc.Close()
+
+
+@pytest.fixture
+def model_class():
+    return SimulatedModel
+
+
+@pytest.fixture
+def start_model(simulator, model_class, tmp_path, monkeypatch):
+    """Starts a model_class connected to the simulator, with a View registered. The caller shuts it down."""
+    monkeypatch.setattr(PLCSession, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(model_class, 'PLC_PORT', simulator.port)
+
+    def start():
+        model = model_class()
+        model.register_view(View())
+        return model
+    return start
+
+
+@pytest.fixture
+def model(start_model):
+    model = start_model()
+    yield model
+    model.shutdown()
@@ -0,0 +1,79 @@
+"""
+Tests for only writing the motor params that changed, Motor.queue_writes(changed_only=True) and
+Model.attr_write, against testing/plc_simulator.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from Motor import Motor
+
+
+@pytest.fixture
+def model(start_model):
+    model = start_model()
+    motors = {n: Motor(n, True, model.session) for n in (0, 1, 2)}
+    model.live_motors = motors
+    model.live_motors_sets = [{0: motors[0], 1: motors[1]}, {2: motors[2]}]
+    yield model
+    model.shutdown()
+
+
+def test_dirty_params():
+    motor = Motor(3, False)
+    assert motor.dirty_params() == set(motor.write_params)
+
+    motor.current_params = motor.write_params.copy()
+    motor.write_params['Speed 1'] = 600
+    assert motor.dirty_params() == {'Speed 1'}
+    assert motor.queue_writes('', 0, changed_only=True) == [('Program:Wave_Control.Motor_4.Spd_1', 'Speed 1', 600)]
+    assert len(motor.queue_writes('', 0)) == len(motor.write_params)
+    # the tags warm_start reads are the ones queue_writes writes
+    assert [(param, tag) for tag, param, _ in motor.queue_writes('', 0)] == motor.param_tags()
+    assert motor.param_tag('Curve ID') == 'Program:Wave_Control.Curve_4.Curve_ID'
+
+    # params that didn't change are still checked
+    motor.current_params['Position 1'] = motor.write_params['Position 1'] = 400
+    with pytest.raises(Exception):
+        motor.queue_writes('', 0, changed_only=True)
+
+
+def test_only_changed_params_sent(simulator, model):
+    model.attr_write()
+    assert model.written_matches_current()
+    # changed behind our back, a full write would put it back
+    simulator.plc.set('Motor_1', 100, 'Pos_1')
+
+    model.live_motors[2].write_params['Speed 1'] = 650
+    assert not model.written_matches_current()
+    stats = model.session.enable_stats()
+    model.attr_write()
+
+    assert model.written_matches_current() and model.write_success()
+    assert simulator.plc.get('Motor_3', 'Spd_1') == 650
+    assert simulator.plc.get('Motor_1', 'Pos_1') == 100
+    # one packet with one write in it
+    assert sum(group['count'] for group in stats.Summary()['services'].values()) == 1
+
+
+def test_nothing_changed(simulator, model):
+    model.attr_write()
+    requests = simulator.requests
+    model.attr_write()
+    assert simulator.requests == requests
+    assert model.write_success()
+
+
+def test_everything_sent_after_lost_connection(simulator, model):
+    model.attr_write()
+    simulator.plc.set('Motor_1', 100, 'Pos_1')
+    simulator.drop_connections()
+    # the read finds the connection gone and reconnects
+    model.session.Read('Program:Wave_Control.Live_Motors')
+
+    assert not model.written_matches_current()
+    model.attr_write()
+    assert simulator.plc.get('Motor_1', 'Pos_1') == 0
+    assert model.written_matches_current()
@@ -0,0 +1,132 @@
+"""
+Tests for the pipelined asyncio client in modules/eip_async.py
+against a small in-process server that answers requests out of order
+"""
+
+import sys
+import os
+import asyncio
+from struct import pack, unpack_from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip_async import AsyncPLC
+
+
+class OutOfOrderServer:
+    """Holds connected requests until `batch` have arrived, then answers them last first.
+    Reads of Data[n] return n*10 so a reply matched to the wrong request shows up."""
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.held = []
+        self.writes = []
+        self.discoveries = 0
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(24)
+                data = header + await reader.readexactly(unpack_from('<H', header, 2)[0])
+                command = unpack_from('<H', data, 0)[0]
+                if command == 0x65:
+                    writer.write(self.frame(data[:24], pack('<HH', 1, 0), session=7))
+                elif command == 0x6F:
+                    # general status at 42, O->T connection id at 44
+                    writer.write(self.frame(data[:24], bytes(20) + pack('<I', 99)))
+                elif command == 0x70:
+                    self.held.append(data)
+                    if len(self.held) >= self.batch:
+                        for request in reversed(self.held):
+                            writer.write(self.reply(request))
+                        self.held = []
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    def frame(self, header, body, session=None):
+        header = bytearray(header)
+        header[2:4] = pack('<H', len(body))
+        if session is not None:
+            header[4:8] = pack('<I', session)
+        return bytes(header) + body
+
+    def reply(self, request):
+        service = request[46]
+        if service == 0x52:
+            self.discoveries += 1
+            cip = pack('<BBBBHi', 0xD2, 0, 0, 0, 0xC4, 0)
+        elif service == 0x4C:
+            # element segment 0x28 n sits just before the element count
+            cip = pack('<BBBBHi', 0xCC, 0, 0, 0, 0xC4, request[-3] * 10)
+        else:
+            self.writes.append(unpack_from('<i', request, len(request) - 4)[0])
+            cip = pack('<BBBB', service | 0x80, 0, 0, 0)
+        item = request[44:46] + cip
+        return self.frame(request[:24], request[24:40] + pack('<HH', 0xB1, len(item)) + item)
+
+
+def run(server, client):
+    async def main():
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        comm = AsyncPLC('127.0.0.1')
+        comm.State.Port = port
+        try:
+            async with comm:
+                return await client(comm)
+        finally:
+            listener.close()
+    return asyncio.run(main())
+
+
+def test_out_of_order_replies_matched_by_sequence():
+    server = OutOfOrderServer(batch=8)
+
+    async def client(comm):
+        comm.State.KnownTags['Data'] = (196, 0)
+        return await asyncio.gather(*[comm.Read(f'Data[{n}]') for n in range(8)])
+
+    assert run(server, client) == [n * 10 for n in range(8)]
+
+
+def test_outstanding_requests_limited():
+    # the server only answers once 4 are in flight, so a limit of 4 must not deadlock
+    server = OutOfOrderServer(batch=4)
+
+    async def client(comm):
+        comm.MaxOutstanding = 4
+        await comm.Close()
+        await comm.Connect()
+        comm.State.KnownTags['Data'] = (196, 0)
+        return await asyncio.gather(*[comm.Read(f'Data[{n}]') for n in range(12)])
+
+    assert run(server, client) == [n * 10 for n in range(12)]
+
+
+def test_type_discovered_then_written():
+    server = OutOfOrderServer(batch=1)
+
+    async def client(comm):
+        await comm.Write('Program:Wave_Control.Motor_1.Spd_1', 250)
+        await comm.Write('Program:Wave_Control.Motor_1.Spd_1', 300)
+
+    run(server, client)
+    assert server.discoveries == 1
+    assert server.writes == [250, 300]
+
+
+def test_multi_read_connects_once(simulator):
+    # the first request connects, however many go out together
+    tags = [f'Program:Wave_Control.Motor_{n}.Spd_1' for n in range(1, 6)]
+    for n in range(5):
+        simulator.plc.set(f'Motor_{n + 1}', n * 10, 'Spd_1')
+
+    async def main():
+        comm = AsyncPLC('127.0.0.1')
+        comm.State.Port = simulator.port
+        try:
+            return await comm.MultiRead(*tags)
+        finally:
+            await comm.Close()
+
+    assert asyncio.run(main()) == [n * 10 for n in range(5)]
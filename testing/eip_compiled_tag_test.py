@@ -0,0 +1,43 @@
+"""
+Tests that the compiled tag cache in modules/eip.py builds
+exactly the requests the uncached code path builds
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip import PLC, _compileTag, _buildTagIOI, _addReadIOI, _addWriteIOI, _buildWriteRequest
+
+
+def dint_plc(*tags):
+    comm = PLC()
+    for tag in tags:
+        comm.KnownTags[tag] = (196, 0)
+    return comm
+
+
+def test_compiled_read_request_matches():
+    tag = 'Program:Wave_Control.Motor_12.Accel_1'
+    comm = dint_plc(tag)
+    compiled = _compileTag(comm, tag, None)
+    assert compiled.Simple
+    assert compiled.ReadRequest == _addReadIOI(comm, _buildTagIOI(comm, tag, isBoolArray=False), 1)
+
+
+def test_compiled_write_request_matches():
+    tag = 'Program:Wave_Control.Axis[3].ComActualPosition'
+    comm = dint_plc(tag)
+    expected = _addWriteIOI(comm, _buildTagIOI(comm, tag, isBoolArray=False), [-20], 196)
+    assert _buildWriteRequest(comm, tag, -20, None) == expected
+
+
+def test_compiled_tag_is_cached():
+    tag = 'Program:Wave_Control.Motor_1.Spd_1'
+    comm = dint_plc(tag)
+    assert _compileTag(comm, tag, None) is _compileTag(comm, tag, None)
+
+
+def test_bit_of_word_not_simple():
+    comm = dint_plc('Program:Wave_Control.Live_Motors.3')
+    assert not _compileTag(comm, 'Program:Wave_Control.Live_Motors.3', None).Simple
@@ -0,0 +1,96 @@
+"""
+Tests for discovering devices with ListIdentity in modules/eip.py, against testing/plc_simulator.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import pytest
+import modules.eip
+from modules.eip import _discover
+from modules.lgxDevice import LGXDevice
+from modules.session import find_controller
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    modules.eip._discoveryCache.clear()
+    yield
+    modules.eip._discoveryCache.clear()
+
+
+def device(ip, deviceID, serial='0x1'):
+    device = LGXDevice()
+    device.IPAddress = ip
+    device.DeviceID = deviceID
+    device.SerialNumber = serial
+    return device
+
+
+def test_identity(simulator):
+    devices = _discover(address='127.0.0.1', port=simulator.port)
+
+    # every interface asked, the controller listed once
+    assert len(devices) == 1
+    assert devices[0].IPAddress == '127.0.0.1'
+    assert devices[0].Device == 'Programmable Logic Controller'
+    assert devices[0].ProductName == '1756-L83E/B'
+    assert devices[0].Revision == '32.11'
+
+
+def test_interfaces_asked_together(simulator, monkeypatch):
+    monkeypatch.setattr(modules.eip, '_discoveryInterfaces', lambda: [None] * 6)
+    start = time.monotonic()
+    assert len(_discover(timeout=0.3, address='127.0.0.1', port=simulator.port)) == 1
+    # one timeout in all, not one per interface
+    assert time.monotonic() - start < 0.6
+
+
+def test_cached(simulator):
+    port = simulator.port
+    _discover(address='127.0.0.1', port=port)
+    simulator.stop()
+
+    streamed = []
+    assert [d.IPAddress for d in _discover(streamed.append, address='127.0.0.1', port=port)] == ['127.0.0.1']
+    assert [d.IPAddress for d in streamed] == ['127.0.0.1']
+    assert _discover(maxAge=0, timeout=0.1, address='127.0.0.1', port=port) == []
+
+
+def test_stop_early(simulator):
+    start = time.monotonic()
+    devices = _discover(lambda device: True, timeout=2.0, address='127.0.0.1', port=simulator.port)
+    assert len(devices) == 1
+    assert time.monotonic() - start < 1.0
+    # a discovery cut short isn't reused
+    assert modules.eip._discoveryCache == {}
+
+
+def test_find_controller(caplog):
+    modules.eip._discoveryCache[('255.255.255.255', 44818)] = (
+        time.monotonic(), [device('192.168.1.20', 0x0C), device('192.168.1.10', 0x0E, '0xc0ffee')])
+
+    assert find_controller('192.168.1.1', serial_number='0xC0FFEE') == '192.168.1.10'
+    assert 'using controller 0xC0FFEE found at 192.168.1.10' in caplog.text
+    # answers at the configured address, even if it isn't the controller we saw
+    assert find_controller('192.168.1.20', serial_number='0xc0ffee') == '192.168.1.20'
+
+    # never moves to a controller it wasn't told to expect
+    assert find_controller('192.168.1.1') == '192.168.1.1'
+    assert find_controller('192.168.1.1', serial_number='0xbad') == '192.168.1.1'
+    assert 'none with serial number 0xbad' in caplog.text
+
+    modules.eip._discoveryCache[('255.255.255.255', 44818)] = (time.monotonic(), [device('192.168.1.20', 0x0C)])
+    assert find_controller('192.168.1.1', serial_number='0xc0ffee') == '192.168.1.1'
+
+
+def test_find_simulated_controller(simulator, caplog):
+    # the simulator answers at 127.0.0.1 with serial number 0xc0ffee
+    modules.eip._discoveryCache[('255.255.255.255', simulator.port)] = (
+        time.monotonic(), _discover(address='127.0.0.1', port=simulator.port))
+    assert find_controller('127.0.0.1', simulator.port, serial_number='0xc0ffee') == '127.0.0.1'
+    assert find_controller('127.0.0.2', simulator.port, serial_number='0xc0ffee') == '127.0.0.1'
+    assert find_controller('127.0.0.1', simulator.port, serial_number='0xbad') == '127.0.0.1'
+    assert 'expected 0xbad' in caplog.text
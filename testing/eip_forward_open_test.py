@@ -0,0 +1,116 @@
+"""
+Tests for Large Forward Open and framed receives in modules/eip.py
+"""
+
+import sys
+import os
+from struct import pack, unpack_from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.eip as eip
+from modules.eip import PLC, _buildCIPForwardOpen, _connect, _recvFrame
+
+
+class ScriptedSocket:
+    """Answers register session and forward open, rejecting Large Forward Open when told to.
+    Replies come back a few bytes at a time like a slow network would deliver them."""
+
+    def __init__(self, large_supported, chunk=7):
+        self.large_supported = large_supported
+        self.chunk = chunk
+        self.forward_opens = []
+        self.pending = b""
+
+    def send(self, data):
+        command = unpack_from('<H', data, 0)[0]
+        body = b""
+        if command == 0x6F:
+            service = data[40]
+            self.forward_opens.append(service)
+            status = 0x08 if service == 0x5B and not self.large_supported else 0
+            # general status at 42, O->T connection id at 44
+            body = bytes(18) + pack('<BBI', status, 0, 99)
+        header = bytearray(data[:24])
+        header[2:4] = pack('<H', len(body))
+        self.pending += bytes(header) + body
+        return len(data)
+
+    def recv(self, size):
+        size = min(size, self.chunk)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def recv_into(self, buffer, size=0):
+        data = self.recv(size or len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def settimeout(self, timeout):
+        pass
+
+    def connect(self, address):
+        pass
+
+    def close(self):
+        pass
+
+
+def connect_with(monkeypatch, socket, size):
+    comm = PLC()
+    comm.ConnectionSize = size
+    # _connect makes its own socket, hand it the scripted one instead
+    monkeypatch.setattr(eip.socket, 'socket', lambda: socket)
+    _connect(comm)
+    return comm
+
+
+def test_standard_forward_open_packet():
+    comm = PLC()
+    packet = _buildCIPForwardOpen(comm)
+    assert packet[0] == 0x54
+    assert unpack_from('<H', packet, 32)[0] == 0x43f4
+    assert unpack_from('<H', packet, 38)[0] == 0x43f4
+
+
+def test_large_forward_open_packet():
+    comm = PLC()
+    comm.ConnectionSize = 4000
+    packet = _buildCIPForwardOpen(comm)
+    assert packet[0] == 0x5B
+    assert unpack_from('<I', packet, 32)[0] == 0x42000000 | 4000
+    assert unpack_from('<I', packet, 40)[0] == 0x42000000 | 4000
+
+
+def test_large_connection_accepted(monkeypatch):
+    socket = ScriptedSocket(large_supported=True)
+    comm = connect_with(monkeypatch, socket, 4000)
+    assert comm.SocketConnected
+    assert socket.forward_opens == [0x5B]
+    assert comm.ConnectionSize == 4000
+
+
+def test_falls_back_to_standard_connection(monkeypatch):
+    socket = ScriptedSocket(large_supported=False)
+    comm = connect_with(monkeypatch, socket, 4000)
+    assert comm.SocketConnected
+    assert socket.forward_opens == [0x5B, 0x54]
+    assert comm.ConnectionSize == 500
+
+
+def test_frame_read_across_partial_receives():
+    comm = PLC()
+    comm.Socket = ScriptedSocket(large_supported=True, chunk=5)
+    frame = pack('<HHI', 0x70, 30, 1) + bytes(16) + bytes(range(30))
+    comm.Socket.pending = frame + frame
+    assert _recvFrame(comm) == frame
+    assert _recvFrame(comm) == frame
+    assert _recvFrame(comm) == b""
+
+
+def test_frame_bigger_than_buffer():
+    comm = PLC()
+    comm.Socket = ScriptedSocket(large_supported=True, chunk=1000)
+    frame = pack('<HHI', 0x70, 5000, 1) + bytes(16) + bytes(5000)
+    comm.Socket.pending = frame
+    assert _recvFrame(comm) == frame
+    assert len(comm.ReceiveBuffer) >= len(frame)
@@ -0,0 +1,108 @@
+"""
+Tests for addressing compiled tags by symbol instance ID in modules/eip.py, against testing/plc_simulator.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip import PLC, _buildTagIOI, _compileTag
+from modules.session import PLCSession
+from modules.tag_catalog import TagCatalog
+
+PROGRAM = 'Program:Wave_Control'
+PARAMS = ['Pos_1', 'Pos_2', 'Spd_1', 'Spd_2', 'Accel_1', 'Accel_2', 'Decel_1', 'Decel_2',
+          'Jerk_1', 'Jerk_2', 'Time1', 'Time2', 'Profile', 'MoveType']
+
+
+def connect(simulator, instanceAddressing):
+    comm = PLC()
+    comm.IPAddress = '127.0.0.1'
+    comm.Port = simulator.port
+    catalog = TagCatalog()
+    catalog.Attach(comm)
+    catalog.Refresh(comm)
+    comm.InstanceAddressing = instanceAddressing
+    return comm
+
+
+def test_instance_ioi(simulator):
+    comm = connect(simulator, True)
+    try:
+        tag = f'{PROGRAM}.Motor_12.Accel_1'
+        compiled = _compileTag(comm, tag, None)
+        instance = comm.Catalog.Tag(f'{PROGRAM}.Motor_12').InstanceID
+
+        assert compiled.IOI == (b'\x91\x14' + PROGRAM.encode() + bytes([0x20, 0x6B, 0x24, instance]) +
+                                b'\x91\x07Accel_1\x00')
+        assert len(compiled.IOI) < len(_buildTagIOI(comm, tag, isBoolArray=False))
+
+        comm.Write(tag, 1234)
+        assert comm.Read(tag) == 1234
+        assert simulator.plc.get('Motor_12', 'Accel_1') == 1234
+
+        # array elements keep their index after the instance
+        assert comm.Read(f'{PROGRAM}.Axis[5].ComDemandPosition') == 105 * 10000
+        assert _compileTag(comm, f'{PROGRAM}.Axis[5].ComDemandPosition', None).IOI[22:28] == \
+            bytes([0x20, 0x6B, 0x24, comm.Catalog.Tag(f'{PROGRAM}.Axis').InstanceID, 0x28, 5])
+    finally:
+        comm.Close()
+
+
+def test_more_writes_per_packet(simulator):
+    writes = [(f'{PROGRAM}.Motor_{n}.{param}', n) for n in range(1, 31) for param in PARAMS]
+    packets = {}
+    for instanceAddressing in (False, True):
+        comm = connect(simulator, instanceAddressing)
+        comm.ConnectionSize = 500
+        try:
+            comm.MultiWrite(*writes)
+            stats = comm.EnableStats()
+            assert comm.MultiWrite(*writes) == [0] * len(writes)
+            packets[instanceAddressing] = stats.Summary()['services']['Multiple Service Packet']['count']
+        finally:
+            comm.Close()
+
+    assert packets[True] < packets[False]
+    assert simulator.plc.get('Motor_30', 'MoveType') == 30
+
+
+def test_controller_without_instance_addressing(simulator):
+    simulator.plc.symbol_instances = False
+    comm = connect(simulator, True)
+    try:
+        assert comm.Read(f'{PROGRAM}.Motor_3.Pos_2') == 0
+        assert comm.InstanceAddressing is False
+        assert comm.CompiledTags[f'{PROGRAM}.Motor_3.Pos_2'].IOI == \
+            _buildTagIOI(comm, f'{PROGRAM}.Motor_3.Pos_2', isBoolArray=False)
+    finally:
+        comm.Close()
+
+
+def test_tag_not_in_catalog(simulator):
+    comm = connect(simulator, True)
+    try:
+        comm.Catalog.Tags.pop(f'{PROGRAM}.Live_Motors'.lower())
+        comm.Write(f'{PROGRAM}.Live_Motors', 5)
+        assert comm.CompiledTags[f'{PROGRAM}.Live_Motors'].IOI == \
+            _buildTagIOI(comm, f'{PROGRAM}.Live_Motors', isBoolArray=False)
+        assert simulator.plc.get('Live_Motors') == 5
+    finally:
+        comm.Close()
+
+
+def test_session_without_catalog(simulator, tmp_path, monkeypatch):
+    def refused(catalog, plc, force=False):
+        raise ValueError('Failed to list tags')
+    monkeypatch.setattr(TagCatalog, 'Refresh', refused)
+    monkeypatch.setattr(PLCSession, 'CACHE_DIR', str(tmp_path))
+    session = PLCSession('127.0.0.1', 0, simulator.port)
+    try:
+        # the connection still comes up, tags are addressed by name
+        assert session.Read(f'{PROGRAM}.Motor_3.Pos_2') == 0
+        assert session.comm.InstanceAddressing is False
+        # structures are still decoded, from the controller's tag list
+        assert session.ReadUDTArray(f'{PROGRAM}.Axis[0]', 2)[1]['ComDemandPosition'] == 101 * 10000
+        assert session.state == PLCSession.CONNECTED
+    finally:
+        session.close()
@@ -0,0 +1,67 @@
+"""
+Tests for the multi-service packet helpers in modules/eip.py
+These only build and parse packets so no PLC is needed
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from struct import pack, unpack_from
+from modules.eip import PLC, MultiParser, _buildWriteRequest, _buildMultiServiceRequest, _multiServiceChunks, _multiServiceStatus
+
+
+def motor_writes(count):
+    comm = PLC()
+    writes = []
+    for motor_ID in range(1, count + 1):
+        tag = f'Program:Wave_Control.Motor_{motor_ID}.Spd_1'
+        # DINT, so no type discovery round trip is needed
+        comm.KnownTags[tag] = (196, 0)
+        writes.append(_buildWriteRequest(comm, tag, 500, None))
+    return comm, writes
+
+
+def test_multi_service_offsets():
+    comm, writes = motor_writes(3)
+    request = _buildMultiServiceRequest(writes)
+    assert request[0] == 0x0A
+    assert unpack_from('<H', request, 6)[0] == 3
+    # each offset points at the service code of its write
+    for i in range(3):
+        offset = unpack_from('<H', request, 8 + i*2)[0]
+        assert request[6 + offset] == 0x4D
+
+
+def test_chunks_fit_connection_size():
+    comm, writes = motor_writes(30)
+    chunks = _multiServiceChunks(comm, writes, [4] * len(writes))
+    assert chunks[0][0] == 0 and chunks[-1][1] == 30
+    assert len(chunks) > 1
+    for start, end in chunks:
+        assert len(_buildMultiServiceRequest(writes[start:end])) <= comm.ConnectionSize - 2
+
+
+def test_chunks_single_packet_when_large_connection():
+    comm, writes = motor_writes(30)
+    comm.ConnectionSize = 4000
+    assert _multiServiceChunks(comm, writes, [4] * len(writes)) == [(0, 30)]
+
+
+def test_multi_service_status():
+    # 50 bytes of encapsulation and connected data before the CIP reply
+    replies = [pack('<BBBB', 0xCD, 0, 0, 0), pack('<BBBB', 0xCD, 0, 0x05, 0)]
+    body = pack('<HHH', 2, 6, 10) + b"".join(replies)
+    data = bytes(50) + body
+    assert _multiServiceStatus(data) == [0, 0x05]
+
+
+def test_multi_read_parsed_from_receive_buffer():
+    comm = PLC()
+    tags = ['Program:Wave_Control.Axis[0].ComActualPosition', 'Program:Wave_Control.Live_Motors.1']
+    replies = [pack('<BBBBHi', 0xCC, 0, 0, 0, 0xC4, -35000), pack('<BBBBHi', 0xCC, 0, 0, 0, 0xC4, 0b10)]
+    body = pack('<HHH', 2, 6, 16) + b"".join(replies)
+    # the reply sits at the start of a larger, reused buffer
+    buffer = memoryview(bytearray(4096))
+    buffer[:50 + len(body)] = bytes(50) + body
+    assert MultiParser(comm, tags, buffer[:50 + len(body)]) == [-35000, True]
@@ -0,0 +1,85 @@
+"""
+Tests for PLC.ReadArray in modules/eip.py, which decodes arrays with numpy
+"""
+
+import sys
+import os
+import pytest
+from struct import pack, unpack_from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip('numpy')
+
+from modules.eip import PLC
+
+
+class ArraySocket:
+    """Serves partial reads (0x52) of one array, at most `fragment` bytes per reply."""
+
+    def __init__(self, data, type_code, fragment):
+        self.data = data
+        self.type_code = type_code
+        self.fragment = fragment
+        self.requests = 0
+        self.pending = b""
+
+    def send(self, request):
+        self.requests += 1
+        offset = unpack_from('<I', request, len(request) - 4)[0]
+        piece = self.data[offset:offset + self.fragment]
+        status = 6 if offset + len(piece) < len(self.data) else 0
+        if self.type_code == 0xA0:
+            cip = pack('<BBBBHH', 0xD2, 0, status, 0, 0xA0, 0x1234) + piece
+        else:
+            cip = pack('<BBBBH', 0xD2, 0, status, 0, self.type_code) + piece
+        item = request[44:46] + cip
+        reply = bytearray(request[:44]) + item
+        reply[2:4] = pack('<H', len(reply) - 24)
+        self.pending += bytes(reply)
+        return len(request)
+
+    def recv_into(self, buffer, size=0):
+        data, self.pending = self.pending[:size], self.pending[size:]
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def array_plc(socket, base, type_code):
+    comm = PLC()
+    comm.Socket = socket
+    comm.SocketConnected = True
+    comm.OTNetworkConnectionID = 1
+    comm.KnownTags[base] = (type_code, 0)
+    return comm
+
+
+def test_dint_array_in_fragments():
+    values = np.arange(-500, 500, dtype='<i4')
+    socket = ArraySocket(values.tobytes(), 0xC4, fragment=480)
+    comm = array_plc(socket, 'Positions', 0xC4)
+    result = comm.ReadArray('Positions[0]', len(values))
+    assert result.dtype == np.dtype('<i4')
+    assert np.array_equal(result, values)
+    # 4000 bytes at 480 per reply
+    assert socket.requests == 9
+
+
+def test_struct_array_with_dtype():
+    axis = np.dtype([('StatusWord', '<u4'), ('ComActualPosition', '<i4'), ('Velocity', '<f4')])
+    values = np.zeros(30, dtype=axis)
+    values['StatusWord'] = 1 << 11
+    values['ComActualPosition'] = np.arange(30) * 1000
+    values['Velocity'] = 0.5
+    socket = ArraySocket(values.tobytes(), 0xA0, fragment=100)
+    comm = array_plc(socket, 'Program:Wave_Control.Axis', 0xA0)
+    result = comm.ReadArray('Program:Wave_Control.Axis[0]', 30, dtype=axis)
+    assert np.array_equal(result, values)
+
+
+def test_string_array_needs_dtype():
+    comm = array_plc(ArraySocket(b"", 0xDA, fragment=100), 'Names', 0xDA)
+    with pytest.raises(ValueError):
+        comm.ReadArray('Names[0]', 30)
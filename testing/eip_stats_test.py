@@ -0,0 +1,66 @@
+"""
+Tests for the opt-in request instrumentation in modules/eip_stats.py
+"""
+
+import sys
+import os
+import json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip import PLC
+from modules.eip_stats import LatencyHistogram
+from testing.plc_simulator import PLCSimulator
+
+PROGRAM = 'Program:Wave_Control'
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.Add(ms / 1000)
+
+    # bucket edges are a quarter octave apart, so within 19% above the true value
+    assert 0.050 <= histogram.Percentile(50) <= 0.050 * 1.19
+    assert 0.095 <= histogram.Percentile(95) <= 0.095 * 1.19
+    assert histogram.Percentile(99) <= histogram.Max == 0.100
+    assert LatencyHistogram().Percentile(50) == 0.0
+
+
+def test_disabled_by_default():
+    assert PLC().Stats is None
+
+
+def test_records_services_and_families(tmp_path):
+    with PLCSimulator() as simulator:
+        comm = PLC()
+        comm.IPAddress = '127.0.0.1'
+        comm.Port = simulator.port
+        stats = comm.EnableStats()
+        try:
+            for n in range(1, 4):
+                comm.Write(f'{PROGRAM}.Motor_{n}.Pos_1', n)
+                comm.Read(f'{PROGRAM}.Motor_{n}.Pos_1')
+            comm.MultiRead(*[f'{PROGRAM}.Axis[{n}].StatusWord' for n in range(30)])
+        finally:
+            comm.Close()
+
+    summary = stats.Summary()
+    services = summary['services']
+    assert services['Connect']['count'] == 1
+    assert services['Write Tag']['count'] == 3
+    assert services['Read Tag']['count'] == 3
+    assert services['Multiple Service Packet']['count'] >= 1
+    # every tag was discovered with a one element fragmented read
+    assert services['Read Tag Fragmented']['count'] == 3 + 30
+    assert services['Read Tag']['bytes_sent'] > 0 and services['Read Tag']['bytes_received'] > 0
+
+    # element indexes are not part of the family
+    assert summary['families'][f'{PROGRAM}.Axis.StatusWord']['count'] == 30
+    family = summary['families'][f'{PROGRAM}.Motor_#.Pos_#']
+    assert family['count'] == 9
+    assert family['p50_ms'] <= family['p99_ms'] <= family['max_ms'] * 1.19
+
+    path = tmp_path / 'stats.json'
+    stats.Dump(str(path))
+    assert json.loads(path.read_text()) == summary
+    assert any(line.startswith('Read Tag ') for line in stats.Report())
@@ -0,0 +1,63 @@
+"""
+Tests for the on-disk KnownTags cache in modules/eip.py
+"""
+
+import sys
+import os
+import json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip import PLC, TagCacheVersion, _loadTagCache, _saveTagCache
+
+
+def cached_plc(path):
+    comm = PLC()
+    comm.TagCacheFile = str(path)
+    return comm
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'cache' / 'tags.json'
+    comm = cached_plc(path)
+    assert not _loadTagCache(comm, 'abc')
+    comm.KnownTags['Program:Wave_Control.Motor_1.Spd_1'] = (196, 0)
+    comm.KnownTags['Program:Wave_Control.Name'] = (160, 88)
+    assert _saveTagCache(comm)
+
+    warm = cached_plc(path)
+    assert _loadTagCache(warm, 'abc')
+    assert warm.KnownTags == {'Program:Wave_Control.Motor_1.Spd_1': (196, 0),
+                              'Program:Wave_Control.Name': (160, 88)}
+    # nothing new was learned so there is nothing to write
+    assert not _saveTagCache(warm)
+
+
+def test_program_change_invalidates(tmp_path):
+    path = tmp_path / 'tags.json'
+    comm = cached_plc(path)
+    _loadTagCache(comm, 'before')
+    comm.KnownTags['Program:Wave_Control.Live_Motors'] = (196, 0)
+    _saveTagCache(comm)
+
+    changed = cached_plc(path)
+    assert not _loadTagCache(changed, 'after')
+    assert changed.KnownTags == {}
+
+
+def test_no_fingerprint_skips_cache(tmp_path):
+    path = tmp_path / 'tags.json'
+    comm = cached_plc(path)
+    _loadTagCache(comm, None)
+    comm.KnownTags['Program:Wave_Control.Live_Motors'] = (196, 0)
+    assert not _saveTagCache(comm)
+    assert not path.exists()
+
+
+def test_old_version_or_corrupt_file_ignored(tmp_path):
+    path = tmp_path / 'tags.json'
+    path.write_text(json.dumps({'version': TagCacheVersion - 1, 'fingerprint': 'abc',
+                                'tags': {'Program:Wave_Control.Live_Motors': [196, 0]}}))
+    assert not _loadTagCache(cached_plc(path), 'abc')
+
+    path.write_text('{"version": ')
+    assert not _loadTagCache(cached_plc(path), 'abc')
@@ -0,0 +1,128 @@
+"""
+Tests for reading arrays of structures decoded from their UDT template in modules/eip.py
+"""
+
+import sys
+import os
+from struct import pack, unpack_from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from modules.eip import PLC, LgxTag
+
+TEMPLATE_INSTANCE = 0x0123
+# name, type, offset, info (bit number or array size)
+AXIS_MEMBERS = [('ZZZZZZZZZZAxis0', 0xC2, 0, 0),
+                ('Enabled', 0xC1, 0, 0),
+                ('Fault', 0xC1, 0, 3),
+                ('StatusWord', 0xC4, 4, 0),
+                ('ControlWord', 0xC4, 8, 0),
+                ('WarnWord', 0xC4, 12, 0),
+                ('StateVar', 0xC4, 16, 0),
+                ('ComActualPosition', 0xC4, 20, 0),
+                ('ComDemandPosition', 0xC4, 24, 0),
+                ('Limits', 0x20C4, 28, 2),
+                ('Velocity', 0xCA, 36, 0)]
+AXIS_SIZE = 40
+
+
+def axis_bytes(n):
+    host = 0b1001 if n % 2 else 0
+    return pack('<B3xiiiiiiiif', host, 0x800 * (n % 2), 0x3F, n, 8, n * 1000, n * 1000 + 5, -200000, 3700000, n / 2)
+
+
+class AxisSocket:
+    """Serves the Axis template and a 30 element Axis[] array, `fragment` bytes per reply."""
+
+    def __init__(self, fragment):
+        self.fragment = fragment
+        self.requests = []
+        self.pending = b""
+        names = b'AXIS_LINMOT;n\x00' + b''.join(m[0].encode() + b'\x00' for m in AXIS_MEMBERS)
+        self.template = b''.join(pack('<HHI', info, kind, offset) for name, kind, offset, info in AXIS_MEMBERS) + names
+        self.array = b''.join(axis_bytes(n) for n in range(30))
+
+    def send(self, request):
+        cip = request[46:]
+        self.requests.append(cip[0])
+        if cip[0] == 0x03:
+            # handle, member count, definition size in words, structure size
+            body = pack('<HHHHHHHHHIHHI', 4, 1, 0, 0xBEEF, 2, 0, len(AXIS_MEMBERS),
+                        4, 0, (len(self.template) + 21) // 4 + 1, 5, 0, AXIS_SIZE)
+            reply = pack('<BBBB', 0x83, 0, 0, 0) + body
+        elif cip[0] == 0x4C:
+            offset = unpack_from('<I', cip, 8)[0]
+            piece = self.template[offset:offset + self.fragment]
+            status = 6 if offset + len(piece) < len(self.template) else 0
+            reply = pack('<BBBB', 0xCC, 0, status, 0) + piece
+        else:
+            offset = unpack_from('<I', cip, len(cip) - 4)[0]
+            piece = self.array[offset:offset + self.fragment]
+            status = 6 if offset + len(piece) < len(self.array) else 0
+            reply = pack('<BBBBHH', 0xD2, 0, status, 0, 0xA0, 0xBEEF) + piece
+        item = request[44:46] + reply
+        frame = bytearray(request[:44]) + item
+        frame[2:4] = pack('<H', len(frame) - 24)
+        self.pending += bytes(frame)
+        return len(request)
+
+    def recv_into(self, buffer, size=0):
+        data, self.pending = self.pending[:size], self.pending[size:]
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def axis_plc(socket):
+    comm = PLC()
+    comm.Socket = socket
+    comm.SocketConnected = True
+    comm.OTNetworkConnectionID = 1
+    axis = LgxTag()
+    axis.TagName = 'Program:Wave_Control.Axis'
+    axis.Struct = 1
+    axis.DataTypeValue = TEMPLATE_INSTANCE
+    comm.TagList.append(axis)
+    return comm
+
+
+def test_axis_array_decoded_from_template():
+    # small replies so the template and the array both come in pieces
+    socket = AxisSocket(fragment=100)
+    comm = axis_plc(socket)
+    axes = comm.ReadUDTArray('Program:Wave_Control.Axis[0]', 30)
+
+    assert len(axes) == 30
+    assert axes[7] == {'Enabled': True, 'Fault': True, 'StatusWord': 0x800, 'ControlWord': 0x3F,
+                       'WarnWord': 7, 'StateVar': 8, 'ComActualPosition': 7000, 'ComDemandPosition': 7005,
+                       'Limits': [-200000, 3700000], 'Velocity': 3.5}
+    assert axes[8]['Enabled'] is False and axes[8]['StatusWord'] == 0
+    template = comm.Templates[TEMPLATE_INSTANCE]
+    assert template.Name == 'AXIS_LINMOT' and template.Size == AXIS_SIZE
+
+
+def test_template_compiled_once():
+    socket = AxisSocket(fragment=450)
+    comm = axis_plc(socket)
+    comm.ReadUDTArray('Program:Wave_Control.Axis[0]', 30)
+    socket.requests = []
+    comm.ReadUDTArray('Program:Wave_Control.Axis[0]', 30)
+    # 1200 bytes of axes at 450 per reply, nothing else
+    assert socket.requests == [0x52, 0x52, 0x52]
+
+
+def test_axis_array_dtype_from_template():
+    np = pytest.importorskip('numpy')
+    comm = axis_plc(AxisSocket(fragment=100))
+    comm.KnownTags['Program:Wave_Control.Axis'] = (0xA0, 0)
+    axes = comm.ReadArray('Program:Wave_Control.Axis[0]', 30)
+
+    assert axes.dtype.itemsize == AXIS_SIZE
+    # BOOLs have no numpy type, their bits stay in the hidden member
+    assert 'Enabled' not in axes.dtype.names
+    assert axes['ZZZZZZZZZZAxis0'][7] == 0b1001
+    assert list(axes['ComActualPosition'][:3]) == [0, 1000, 2000]
+    assert list(axes['Limits'][7]) == [-200000, 3700000]
+    assert axes['Velocity'][7] == np.float32(3.5)
@@ -0,0 +1,60 @@
+"""
+Tests for setting and clearing several bits in one masked write, PLC.WriteBits in modules/eip.py,
+against testing/plc_simulator.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip import _wordTag
+from testing.plc_simulator import Tag, DINT
+
+PROGRAM = 'Program:Wave_Control'
+
+
+def test_one_word(simulator, comm):
+    simulator.plc.set('Live_Motors', 0b1100_0011 - (1 << 31))
+    comm.Read(f'{PROGRAM}.Live_Motors')
+    stats = comm.EnableStats()
+    comm.WriteBits(f'{PROGRAM}.Live_Motors', {0: 0, 1: 0, 2: 1, 29: 1, 6: 0})
+
+    assert simulator.plc.get('Live_Motors') & 0xFFFFFFFF == 0b1000_0100 | 1 << 29 | 1 << 31
+    assert stats.Summary()['services']['Read Modify Write Tag']['count'] == 1
+    assert len(stats.Summary()['services']) == 1
+
+    # nothing to change, nothing sent
+    comm.WriteBits(f'{PROGRAM}.Live_Motors', {})
+    assert stats.Summary()['services']['Read Modify Write Tag']['count'] == 1
+
+
+def test_several_words(simulator, comm):
+    simulator.plc.program_tags['flags'] = Tag('Flags', DINT, 4, instance=999)
+    simulator.plc.set('Flags', 0xFF, index=1)
+    comm.WriteBits(f'{PROGRAM}.Flags', {0: 1, 33: 1, 32: 0, 100: 1})
+
+    assert [simulator.plc.get('Flags', index=n) for n in range(4)] == [1, 0xFE, 0, 1 << 4]
+
+    comm.WriteBits(f'{PROGRAM}.Flags[1]', {0: 1, 32: 1})
+    assert simulator.plc.get('Flags', index=1) == 0xFF
+    assert simulator.plc.get('Flags', index=2) == 1
+
+
+def test_word_tag():
+    assert _wordTag('Flags', 0) == 'Flags'
+    assert _wordTag('Flags', 2) == 'Flags[2]'
+    assert _wordTag('Program:P.Flags[3]', 2) == 'Program:P.Flags[5]'
+
+
+def test_live_motor_reset(simulator, start_model):
+    simulator.plc.set('Live_Motors', -1)
+    model = start_model()
+    try:
+        assert model.CONNECTED
+        # the 30 axis bits cleared, the two spare ones left alone
+        assert simulator.plc.get('Live_Motors') & 0xFFFFFFFF == 0b11 << 30
+        stats = model.session.enable_stats()
+        model.live_motor_reset()
+        assert sum(group['count'] for group in stats.Summary()['services'].values()) == 1
+    finally:
+        model.shutdown()
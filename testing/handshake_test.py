@@ -0,0 +1,239 @@
+"""
+Tests for the control steps in modules/handshake.py and the Model steps built on them,
+against testing/plc_simulator.py
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from modules.handshake import HomingMonitor, MotionFinished, drives_enabled, drives_error_free
+from Motor import Motor
+from testing.plc_simulator import OPERATION_ENABLED
+from testing.simulated_model import SimulatedModel
+
+PROGRAM = 'Program:Wave_Control'
+
+
+class HandshakeModel(SimulatedModel):
+    """SimulatedModel that gives up on a control step sooner."""
+    HANDSHAKE_TIMEOUT = 2.0
+    HANDSHAKE_HOLD = 1.0
+
+
+@pytest.fixture
+def time_scale():
+    return 20
+
+
+@pytest.fixture
+def model_class():
+    return HandshakeModel
+
+
+def test_define_and_boot(simulator, model):
+    model.motdict = {0: 1, 2: 1}
+    start = time.monotonic()
+    model.motor_define()
+
+    # both steps confirmed in well under the 10s the fixed waits took
+    assert time.monotonic() - start < 2.0
+    assert simulator.plc.get('Live_Motors') == 0b101
+    assert all(simulator.plc.get('Axis', member='StatusWord', index=n) & OPERATION_ENABLED for n in (0, 2))
+    assert simulator.plc.get('Motor_Boot') == 0
+    assert simulator.plc.get('Clear_Motor_Error') == 0
+
+
+def test_error_cleared(simulator, model):
+    model.live_motors = {1: Motor(1, True, model.session)}
+    simulator.plc.set('Live_Motors', 0b10)
+    simulator.plc.axes[1].error = True
+
+    assert not drives_error_free(model.handshake.read_axes())
+    assert model.handshake.pulse(f'{PROGRAM}.Clear_Motor_Error', drives_error_free)
+    assert drives_error_free(model.handshake.read_axes())
+
+
+def test_not_confirmed(simulator, model):
+    # axis 5 isn't live, the PLC never enables it
+    model.live_motors = {5: Motor(5, True, model.session)}
+    model.handshake.timeout = 0.3
+    start = time.monotonic()
+
+    assert not model.handshake.pulse(f'{PROGRAM}.Motor_Boot', drives_enabled)
+    assert 0.3 <= time.monotonic() - start < 1.0
+    # the trigger is cleared either way
+    assert simulator.plc.get('Motor_Boot') == 0
+
+
+def test_already_confirmed_held(simulator, model, monkeypatch):
+    # no error latched, so nothing can show the PLC saw the trigger: it is held like the old fixed wait
+    writes = []
+    monkeypatch.setattr(model.session, 'Write', lambda tag, value, replay=True: writes.append(
+        (tag.split('.')[-1], value, time.monotonic())))
+    assert model.handshake.pulse(f'{PROGRAM}.Clear_Motor_Error', drives_error_free)
+    assert [(tag, value) for tag, value, _ in writes] == [('Clear_Motor_Error', 1), ('Clear_Motor_Error', 0)]
+    assert writes[1][2] - writes[0][2] >= model.handshake.hold
+
+
+def test_min_pulse(simulator, model):
+    # confirmed on the first poll after the trigger, still held long enough for a PLC scan to see it
+    model.live_motors = {1: Motor(1, True, model.session)}
+    simulator.plc.set('Live_Motors', 0b10)
+    simulator.plc.axes[1].error = True
+    start = time.monotonic()
+    assert model.handshake.pulse(f'{PROGRAM}.Clear_Motor_Error', drives_error_free)
+    assert model.handshake.min_pulse <= time.monotonic() - start < model.handshake.hold
+
+
+def test_single_stroke(simulator, model):
+    model.motdict = {0: 1}
+    model.motor_define()
+    simulator.plc.axes[0].homed = True
+    model.state = 1
+    model.session.Write(f'{PROGRAM}.Motor_1.Pos_1', 10)
+    model.session.Write(f'{PROGRAM}.Motor_1.Pos_2', 20)
+    model.session.Write(f'{PROGRAM}.Motor_1.Spd_1', 50)
+
+    start = time.monotonic()
+    model.motion(1, 0)
+
+    # held until the stroke was done, 170mm at 50mm/s sped up 20 times
+    assert 0.1 < time.monotonic() - start < 1.0
+
+    axis = model.handshake.read_axes()[0]
+    assert axis['ComDemandPosition'] == 20 * 10000
+    assert MotionFinished()({0: axis}) is False  # nothing moved since this one started watching
+    assert model.view.messages[-1] == 'Motor(s) Stopped'
+    assert simulator.plc.get('Run_1') == 0
+
+
+def test_single_stroke_gap_between_legs(simulator, model, monkeypatch):
+    # the drives rest in target at Pos_1 for several polls before the second leg
+    monkeypatch.setattr(simulator.plc, 'LEG_GAP', 4.0)
+    model.motdict = {0: 1}
+    model.motor_define()
+    simulator.plc.axes[0].homed = True
+    model.state = 1
+    model.session.Write(f'{PROGRAM}.Motor_1.Pos_1', 10)
+    model.session.Write(f'{PROGRAM}.Motor_1.Pos_2', 20)
+    model.session.Write(f'{PROGRAM}.Motor_1.Spd_1', 50)
+
+    model.motion(1, 0)
+
+    # only finished once the second leg was
+    assert model.handshake.read_axes()[0]['ComDemandPosition'] == 20 * 10000
+
+
+class ScriptedHandshake:
+    """Hands HomingMonitor one prepared set of status and control words per poll."""
+    poll_interval = 0
+
+    def __init__(self, *polls):
+        self.polls = list(polls)
+
+    def read_axes(self, only=None):
+        return {n: {'StatusWord': status, 'ControlWord': control}
+                for n, (status, control) in self.polls.pop(0).items()}
+
+
+def test_homed_bit_from_earlier_homing_ignored():
+    homed, command = 1 << 11, 1 << 11
+    monitor = HomingMonitor(ScriptedHandshake(
+        {0: (homed, 0), 1: (homed, 0)},
+        # axis 0 drops its homed bit, axis 1 only shows the command
+        {0: (0, command), 1: (homed, command)},
+        {0: (homed, command), 1: (homed, command)},
+        {0: (homed, 0), 1: (homed, 0)}))
+
+    assert not monitor.poll()
+    assert not monitor.poll()
+    # homed again, but not while the command is still set
+    assert not monitor.poll() and monitor.pending() == [0, 1]
+    assert monitor.poll()
+    assert sorted(monitor.homed_after) == [0, 1]
+
+
+def test_stale_homed_bit_with_command_held():
+    homed, command = 1 << 11, 1 << 11
+    monitor = HomingMonitor(ScriptedHandshake(
+        {0: (homed, command)}, {0: (homed, command)}, {0: (homed, 0)}), settle=0.05)
+    assert not monitor.poll()
+    time.sleep(0.05)
+    # past settle, but the drive is still homing
+    assert not monitor.poll()
+    assert monitor.poll()
+
+
+def test_already_home():
+    homed = 1 << 11
+    monitor = HomingMonitor(ScriptedHandshake({0: (homed, 0)}, {0: (homed, 0)}), settle=0.05)
+    assert not monitor.poll()
+    time.sleep(0.05)
+    assert monitor.poll()
+
+
+def test_homing(simulator, model):
+    model.motdict = {0: 1, 2: 1}
+    model.motor_define()
+    stats = model.session.enable_stats()
+    start = time.monotonic()
+    model.motor_home()
+
+    # done as soon as the axes are home, a second pass isn't needed
+    assert time.monotonic() - start < 1.0
+    assert model.state == 1
+    assert model.view.messages[-1] == 'Motor(s) Homed'
+    assert not any('pass 2' in message for message in model.view.messages)
+    assert sorted(model.homing_times) == [0, 2]
+    assert all(motor.home for motor in model.live_motors.values())
+    # every poll is one read of the Axis[] array, no per motor reads
+    services = stats.Summary()['services']
+    assert 'Read Tag' not in services
+    assert services['Read Tag Fragmented']['count'] < 20
+
+
+def test_misplaced_axis_homed_again(simulator, model):
+    model.motdict = {0: 1, 1: 1, 2: 1}
+    model.motor_define()
+    # axis 1 stops 50mm short on its first homing
+    simulator.plc.axes[1].home_error = 50 * 10000
+    model.motor_home()
+
+    assert model.state == 1
+    assert any(message.startswith('Homing Motor(s) pass 2 (') and '/1 homed' in message
+               for message in model.view.messages)
+    assert [simulator.plc.axes[n].position for n in range(3)] == [0, 0, 0]
+    # the other axes are live again
+    assert simulator.plc.get('Live_Motors') == 0b111
+
+
+def test_homing_timeout(simulator, model, monkeypatch):
+    monkeypatch.setattr(model, 'HOMING_TIMEOUTS', [0.3, 0.3])
+    model.motdict = {0: 1, 1: 1}
+    model.motor_define()
+    simulator.plc.axes[1].error = True
+    model.motor_home()
+
+    assert model.state != 1
+    assert list(model.homing_times) == [0]
+    assert model.view.messages[-1] == 'Unable to Home Motors: 1 motor(s) not home after two passes'
+    assert simulator.plc.get('Home_Button') == 0
+    assert simulator.plc.get('Live_Motors') == 0b11
+
+
+def test_homing_error_clears_flag(simulator, model, monkeypatch):
+    model.motdict = {0: 1}
+    model.motor_define()
+
+    def lost(*args):
+        raise ConnectionError('lost')
+    monkeypatch.setattr(model, 'home_pass', lost)
+    future = model.thread_motor_home()
+    assert model.is_homing
+
+    # the error reaches whoever queued it, and homing isn't left looking in progress
+    assert isinstance(future.exception(timeout=5), ConnectionError)
+    assert not model.is_homing
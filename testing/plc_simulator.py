@@ -0,0 +1,715 @@
+"""
+A stand-in for the wave tank's ControlLogix so the whole I/O stack can be run
+and timed without hardware. It speaks the part of EtherNet/IP and CIP that
+modules/eip.py uses: RegisterSession, (Large) Forward Open/Close, read 0x4C,
+write 0x4D, read-modify-write 0x4E, partial read 0x52, the 0x0A multi-service
+packet, tag listing 0x55, UDT templates, the controller change counters and the
+identity object's vendor id, and ListIdentity over UDP for discovery.
+
+It hosts the Program:Wave_Control tag tree (Motor_N, Curve_N, Axis[],
+Live_Motors and the Run_1/Run_2/Run_Curve/Home_Button/Motor_Boot/
+Clear_Motor_Error switches) and moves the live axes the way the PLC program
+does, so the real Model can be pointed at it:
+
+    with PLCSimulator() as plc:
+        Model.IP_ADDRESS, Model.PLC_PORT = '127.0.0.1', plc.port
+
+or run it on its own with `python -m testing.plc_simulator [port]`.
+"""
+
+import socket
+import socketserver
+import sys
+import time
+from struct import pack, unpack_from
+from threading import Event, Lock, Thread
+
+# CIP type code -> (size, struct format)
+ATOMIC_TYPES = {0xC1: (1, 'B'),
+                0xC2: (1, 'b'),
+                0xC3: (2, 'h'),
+                0xC4: (4, 'i'),
+                0xC8: (4, 'I'),
+                0xCA: (4, 'f'),
+                0xD3: (4, 'I')}
+DINT = 0xC4
+BOOL = 0xC1
+
+# general status codes
+SUCCESS = 0x00
+PATH_SEGMENT_ERROR = 0x04
+PATH_UNKNOWN = 0x05
+PARTIAL = 0x06
+SERVICE_NOT_SUPPORTED = 0x08
+NOT_ENOUGH_DATA = 0x13
+EMBEDDED_ERROR = 0x1E
+
+# LinMot status word bits
+OPERATION_ENABLED = 1 << 0
+ERROR = 1 << 3
+IN_TARGET = 1 << 10
+HOMED = 1 << 11
+MOTION_ACTIVE = 1 << 13
+
+# 0.1 um per mm, positions and speeds in the PLC are in these units
+COUNTS_PER_MM = 10000
+
+
+class UDT:
+    """A structure type, laid out the way its template describes it."""
+
+    def __init__(self, name, instance, members):
+        self.name = name
+        self.instance = instance
+        # (name, type code or UDT, offset, element count or bit number)
+        self.members = []
+        offset = 0
+        for member_name, member_type in members:
+            self.members.append((member_name, member_type, offset, 0))
+            offset += member_type.size if isinstance(member_type, UDT) else ATOMIC_TYPES[member_type][0]
+        self.size = offset
+        self.handle = (0x1000 + instance * 7) & 0xFFFF
+        self.template = self.build_template()
+        # the template read asks for definition size * 4 - 21 bytes
+        self.definition_size = (len(self.template) + 21 + 3) // 4
+
+    def build_template(self) -> bytes:
+        info = b''
+        names = self.name.encode() + b';n\x00'
+        for name, member_type, offset, count in self.members:
+            code = 0x8000 | member_type.instance if isinstance(member_type, UDT) else member_type
+            info += pack('<HHI', count, code, offset)
+            names += name.encode() + b'\x00'
+        return info + names
+
+    def member(self, name):
+        for member in self.members:
+            if member[0].lower() == name.lower():
+                return member
+        return None
+
+
+class Tag:
+    """A controller or program scope tag and the bytes that hold its value."""
+
+    def __init__(self, name, data_type, count=None, instance=0):
+        self.name = name
+        self.data_type = data_type
+        # None for a single value, the number of elements for an array
+        self.count = count
+        self.instance = instance
+        self.data = bytearray(element_size(data_type) * (count or 1))
+
+    @property
+    def symbol_type(self) -> int:
+        code = 0x8000 | self.data_type.instance if isinstance(self.data_type, UDT) else self.data_type
+        return code | 0x2000 if self.count else code
+
+
+def element_size(data_type) -> int:
+    if isinstance(data_type, UDT):
+        return data_type.size
+    # a program symbol holds no data of its own
+    return ATOMIC_TYPES[data_type][0] if data_type in ATOMIC_TYPES else 0
+
+
+def cip_reply(service, status=SUCCESS, data=b''):
+    return pack('<BBBB', service | 0x80, 0, status, 0) + data
+
+
+class SimulatedAxis:
+    """One LinMot drive, moved a constant speed towards each target in turn."""
+
+    def __init__(self, position):
+        self.position = float(position)
+        self.targets = []
+        self.speed = 0.0
+        self.velocity = 0.0
+        self.enabled = False
+        self.homed = False
+        self.homing = False
+        self.error = False
+        # counts off home the next homing stops at, like the pistons that sometimes home high
+        self.home_error = 0
+        # simulated seconds left resting in target before moving on to the next target
+        self.dwell = 0.0
+
+
+class SimulatedPLC:
+    """The tag memory of the Wave_Control program plus the motion it commands."""
+
+    PROGRAM = 'Program:Wave_Control'
+    AXIS_COUNT = 30
+    HOME_POSITION = 0
+    HOMING_SPEED = 100 * COUNTS_PER_MM
+    # how far the actual position trails the demand, in seconds of travel
+    FOLLOWING_LAG = 0.002
+    # simulated seconds a drive rests in target between the two legs of a Run_1 stroke
+    LEG_GAP = 0.0
+
+    def __init__(self, time_scale: float = 1.0):
+        # run the simulated motion this many times faster than the wall clock
+        self.time_scale = time_scale
+        # whether tags can be addressed by symbol instance id, older firmware only takes names
+        self.symbol_instances = True
+        # whether the controller has change counters (class 0xAC), older firmware doesn't
+        self.change_counters = True
+        self.lock = Lock()
+        self.change_counter = 1
+        self.last_time = time.monotonic()
+        self.inputs = {}
+
+        self.motor_udt = UDT('MOTOR_PARAMS', 0x101, [(name, DINT) for name in
+                             ('Pos_1', 'Pos_2', 'Spd_1', 'Spd_2', 'Accel_1', 'Accel_2', 'Decel_1', 'Decel_2',
+                              'Jerk_1', 'Jerk_2', 'Time1', 'Time2', 'Profile', 'MoveType')])
+        self.curve_udt = UDT('CURVE_PARAMS', 0x102, [(name, DINT) for name in
+                             ('Curve_ID', 'TimeScale', 'AmplitudeScale', 'CurveOffset')])
+        self.axis_udt = UDT('AXIS_LINMOT', 0x103, [(name, DINT) for name in
+                            ('StatusWord', 'ControlWord', 'WarnWord', 'StateVar',
+                             'ComDemandPosition', 'ComActualPosition')])
+        self.udts = {udt.instance: udt for udt in (self.motor_udt, self.curve_udt, self.axis_udt)}
+
+        program = [Tag('Live_Motors', DINT), Tag('Axis', self.axis_udt, self.AXIS_COUNT)]
+        program += [Tag(name, BOOL) for name in
+                    ('Run_1', 'Run_2', 'Run_Curve', 'Home_Button', 'Motor_Boot', 'Clear_Motor_Error')]
+        program += [Tag(f'Motor_{n}', self.motor_udt) for n in range(1, self.AXIS_COUNT + 1)]
+        program += [Tag(f'Curve_{n}', self.curve_udt) for n in range(1, self.AXIS_COUNT + 1)]
+        for instance, tag in enumerate(program, start=1):
+            tag.instance = instance
+        self.program_tags = {tag.name.lower(): tag for tag in program}
+        # the program itself is the only controller scope symbol
+        self.controller_tags = {self.PROGRAM.lower(): Tag(self.PROGRAM, 0x68, instance=1)}
+
+        # pistons start part way down the stroke, spread so every axis reads differently
+        self.axes = [SimulatedAxis((100 + n) * COUNTS_PER_MM) for n in range(self.AXIS_COUNT)]
+        self.update_axis_tags()
+
+    # --- tag memory ---
+
+    def tag(self, name) -> Tag:
+        return self.program_tags[name.lower()]
+
+    def get(self, name, member=None, index=0) -> int:
+        """Reads a DINT/BOOL tag or a member of a structure tag, for tests and the motion model."""
+        tag = self.tag(name)
+        offset = index * element_size(tag.data_type)
+        data_type = tag.data_type
+        if member:
+            member_name, data_type, member_offset, count = data_type.member(member)
+            offset += member_offset
+        return unpack_from('<' + ATOMIC_TYPES[data_type][1], tag.data, offset)[0]
+
+    def set(self, name, value, member=None, index=0):
+        tag = self.tag(name)
+        offset = index * element_size(tag.data_type)
+        data_type = tag.data_type
+        if member:
+            member_name, data_type, member_offset, count = data_type.member(member)
+            offset += member_offset
+        fmt = '<' + ATOMIC_TYPES[data_type][1]
+        tag.data[offset:offset + ATOMIC_TYPES[data_type][0]] = pack(fmt, value)
+
+    def program_changed(self):
+        """As if the program was edited online, the change counters move."""
+        self.change_counter += 1
+
+    def add_tag(self, name, data_type, count=None):
+        """Adds a program scope tag online, after the ones there are."""
+        tag = Tag(name, data_type, count, instance=max(t.instance for t in self.program_tags.values()) + 1)
+        self.program_tags[name.lower()] = tag
+        self.program_changed()
+
+    # --- motion ---
+
+    def advance(self):
+        """Moves the simulation forward to now and reacts to the switches the client flipped."""
+        now = time.monotonic()
+        dt = (now - self.last_time) * self.time_scale
+        self.last_time = now
+
+        inputs = {name: self.get(name) for name in
+                  ('Run_1', 'Run_2', 'Run_Curve', 'Home_Button', 'Motor_Boot', 'Clear_Motor_Error')}
+        rising = {name for name, value in inputs.items() if value and not self.inputs.get(name)}
+        falling = {name for name, value in inputs.items() if not value and self.inputs.get(name)}
+        self.inputs = inputs
+        live = self.get('Live_Motors')
+
+        for n, axis in enumerate(self.axes):
+            if not live >> n & 1:
+                continue
+            motor = f'Motor_{n + 1}'
+            if 'Motor_Boot' in rising:
+                axis.enabled = True
+            if 'Clear_Motor_Error' in rising:
+                axis.error = False
+            if not axis.enabled or axis.error:
+                continue
+
+            if 'Home_Button' in rising:
+                # the drive drops its homed bit when homing starts
+                axis.homed = False
+                axis.homing = True
+                axis.targets = [self.HOME_POSITION + axis.home_error]
+                axis.home_error = 0
+                axis.speed = self.HOMING_SPEED
+            elif 'Home_Button' in falling and axis.homing:
+                axis.homing = False
+                axis.targets = []
+                axis.dwell = 0.0
+
+            if axis.homed and 'Run_1' in rising:
+                axis.targets = [self.get(motor, 'Pos_1') * COUNTS_PER_MM, self.get(motor, 'Pos_2') * COUNTS_PER_MM]
+                axis.speed = max(self.get(motor, 'Spd_1'), 1) * COUNTS_PER_MM
+            if axis.homed and inputs['Run_2'] and not axis.targets:
+                # keep stroking between the two positions while Run_2 is on
+                low = self.get(motor, 'Pos_1') * COUNTS_PER_MM
+                high = self.get(motor, 'Pos_2') * COUNTS_PER_MM
+                axis.targets = [high if abs(axis.position - low) < abs(axis.position - high) else low]
+                axis.speed = max(self.get(motor, 'Spd_2'), 1) * COUNTS_PER_MM
+            if 'Run_2' in falling:
+                # stop where it is
+                axis.targets = []
+                axis.dwell = 0.0
+
+            self.move(axis, dt)
+
+        self.update_axis_tags()
+
+    def move(self, axis, dt):
+        axis.velocity = 0.0
+        remaining = dt
+        while axis.targets and remaining > 0:
+            if axis.dwell > 0:
+                rest = min(axis.dwell, remaining)
+                axis.dwell -= rest
+                remaining -= rest
+                continue
+            distance = axis.targets[0] - axis.position
+            step = axis.speed * remaining
+            if abs(distance) <= step:
+                axis.position = float(axis.targets.pop(0))
+                remaining -= abs(distance) / axis.speed if axis.speed else remaining
+                if axis.targets and not axis.homing:
+                    axis.dwell = self.LEG_GAP
+                if axis.homing and not axis.targets:
+                    axis.homing = False
+                    axis.homed = True
+            else:
+                axis.position += step if distance > 0 else -step
+                axis.velocity = axis.speed if distance > 0 else -axis.speed
+                remaining = 0
+
+    def update_axis_tags(self):
+        for n, axis in enumerate(self.axes):
+            status = 0
+            if axis.enabled:
+                status |= OPERATION_ENABLED
+            if axis.error:
+                status |= ERROR
+            moving = axis.targets and axis.dwell <= 0
+            if not moving:
+                status |= IN_TARGET
+            if axis.homed:
+                status |= HOMED
+            if moving:
+                status |= MOTION_ACTIVE
+            # bit 11 of the control word is the home command
+            control = (0x3F if axis.enabled else 0x3E) | (1 << 11 if axis.homing else 0)
+            self.set('Axis', status, 'StatusWord', n)
+            self.set('Axis', control, 'ControlWord', n)
+            self.set('Axis', 0, 'WarnWord', n)
+            self.set('Axis', 8 if axis.enabled else 2, 'StateVar', n)
+            self.set('Axis', int(axis.position), 'ComDemandPosition', n)
+            self.set('Axis', int(axis.position - axis.velocity * self.FOLLOWING_LAG), 'ComActualPosition', n)
+
+    # --- CIP ---
+
+    def handle(self, request: bytes, connection_size: int) -> bytes:
+        """Answers one CIP request, under the lock so several clients can share the PLC."""
+        with self.lock:
+            self.advance()
+            return self.service(request, connection_size)
+
+    def service(self, request, connection_size):
+        service = request[0]
+        path_words = request[1]
+        path = request[2:2 + path_words * 2]
+        data = request[2 + path_words * 2:]
+        # room for the reply behind the reply header and sequence count
+        room = connection_size - 2 - 4
+
+        if service == 0x0A:
+            return self.multi_service(data, connection_size)
+        try:
+            segments = parse_path(path)
+        except ValueError:
+            return cip_reply(service, PATH_SEGMENT_ERROR)
+
+        if service == 0x55:
+            return self.tag_list(segments, data, room)
+        if segments and segments[0][0] == 'class' and segments[0][1] != 0x6B:
+            return self.object_service(service, segments, data, room)
+
+        try:
+            tag, data_type, offset, available = self.resolve(segments)
+        except KeyError:
+            return cip_reply(service, PATH_UNKNOWN)
+
+        if service == 0x4C:
+            return self.read(service, tag, data_type, offset, available, unpack_from('<H', data, 0)[0], 0, room)
+        if service == 0x52:
+            elements = unpack_from('<H', data, 0)[0]
+            return self.read(service, tag, data_type, offset, available, elements, unpack_from('<I', data, 2)[0], room)
+        if service == 0x4D:
+            return self.write(service, tag, data_type, offset, available, data)
+        if service == 0x4E:
+            size = unpack_from('<H', data, 0)[0]
+            or_mask = int.from_bytes(data[2:2 + size], 'little')
+            and_mask = int.from_bytes(data[2 + size:2 + 2 * size], 'little')
+            value = int.from_bytes(tag.data[offset:offset + size], 'little')
+            tag.data[offset:offset + size] = ((value | or_mask) & and_mask).to_bytes(size, 'little')
+            return cip_reply(service)
+        return cip_reply(service, SERVICE_NOT_SUPPORTED)
+
+    def resolve(self, segments):
+        """Follows a symbolic path to the bytes it names: (tag, type, offset, elements left)."""
+        tags = self.controller_tags
+        tag = None
+        data_type = None
+        offset = 0
+        available = 1
+        symbol_class = False
+        for kind, value in segments:
+            if kind == 'class' and value == 0x6B and tag is None and self.symbol_instances:
+                # the symbol is addressed by instance id instead of by name
+                symbol_class = True
+            elif kind == 'instance' and symbol_class:
+                tag = next((t for t in tags.values() if t.instance == value), None)
+                if tag is None:
+                    raise KeyError(value)
+                data_type = tag.data_type
+                available = tag.count or 1
+                symbol_class = False
+            elif kind == 'symbol' and tag is None:
+                if value.lower() in tags and tags is self.controller_tags and value.lower().startswith('program:'):
+                    tags = self.program_tags
+                    continue
+                tag = tags[value.lower()]
+                data_type = tag.data_type
+                available = tag.count or 1
+            elif kind == 'symbol':
+                if not isinstance(data_type, UDT) or data_type.member(value) is None:
+                    raise KeyError(value)
+                member_name, data_type, member_offset, count = data_type.member(value)
+                offset += member_offset
+                available = 1
+            elif kind == 'element' and tag is not None:
+                index = value[0] if isinstance(value, list) else value
+                if index >= available:
+                    raise KeyError(index)
+                offset += index * element_size(data_type)
+                available -= index
+            else:
+                raise KeyError(kind)
+        if tag is None:
+            raise KeyError('no tag')
+        return tag, data_type, offset, available
+
+    def read(self, service, tag, data_type, offset, available, elements, start, room):
+        if elements > available:
+            return cip_reply(service, PATH_UNKNOWN)
+        if isinstance(data_type, UDT):
+            type_header = pack('<BBH', 0xA0, 0x02, data_type.handle)
+            align = 1
+        else:
+            type_header = pack('<BB', data_type, 0)
+            align = ATOMIC_TYPES[data_type][0]
+        total = element_size(data_type) * elements
+        fits = (room - len(type_header)) // align * align
+        piece = tag.data[offset + start:offset + min(total, start + fits)]
+        status = PARTIAL if start + len(piece) < total else SUCCESS
+        return cip_reply(service, status, type_header + bytes(piece))
+
+    def write(self, service, tag, data_type, offset, available, data):
+        written_type = data[0]
+        position = 2
+        if written_type == 0xA0:
+            position += 2
+        elements = unpack_from('<H', data, position)[0]
+        position += 2
+        size = element_size(data_type) * elements
+        if elements > available or len(data) - position < size:
+            return cip_reply(service, NOT_ENOUGH_DATA)
+        tag.data[offset:offset + size] = data[position:position + size]
+        return cip_reply(service)
+
+    def multi_service(self, data, connection_size):
+        count = unpack_from('<H', data, 0)[0]
+        offsets = [unpack_from('<H', data, 2 + i * 2)[0] for i in range(count)] + [len(data)]
+        replies = [self.service(data[offsets[i]:offsets[i + 1]], connection_size) for i in range(count)]
+
+        body = pack('<H', count)
+        position = 2 + 2 * count
+        for reply in replies:
+            body += pack('<H', position)
+            position += len(reply)
+        status = EMBEDDED_ERROR if any(reply[2] for reply in replies) else SUCCESS
+        return cip_reply(0x0A, status, body + b''.join(replies))
+
+    def tag_list(self, segments, data, room):
+        tags = self.controller_tags
+        start = 0
+        for kind, value in segments:
+            if kind == 'symbol' and value.lower() == self.PROGRAM.lower():
+                tags = self.program_tags
+            elif kind == 'instance':
+                start = value
+
+        body = b''
+        status = SUCCESS
+        for tag in sorted(tags.values(), key=lambda t: t.instance):
+            if tag.instance < start:
+                continue
+            name = tag.name.encode()
+            entry = pack('<IH', tag.instance, len(name)) + name + pack('<HIII', tag.symbol_type, tag.count or 0, 0, 0)
+            if len(body) + len(entry) > room:
+                status = PARTIAL
+                break
+            body += entry
+        return cip_reply(0x55, status, body)
+
+    def object_service(self, service, segments, data, room):
+        values = dict(segments)
+        cip_class = values.get('class')
+        instance = values.get('instance')
+
+        if cip_class == 0x6C and instance in self.udts:
+            udt = self.udts[instance]
+            if service == 0x03:
+                attributes = {1: pack('<H', udt.handle), 2: pack('<H', len(udt.members)), 3: pack('<H', 0),
+                              4: pack('<I', udt.definition_size), 5: pack('<I', udt.size)}
+                return cip_reply(service, SUCCESS, attribute_list(data, attributes))
+            if service == 0x4C:
+                start = unpack_from('<I', data, 0)[0]
+                piece = udt.template[start:start + room]
+                status = PARTIAL if start + len(piece) < len(udt.template) else SUCCESS
+                return cip_reply(service, status, piece)
+        if cip_class == 0x01 and instance == 1 and service == 0x0E:
+            # identity object, only the vendor id
+            return cip_reply(service, SUCCESS, pack('<H', 1))
+        if cip_class == 0xAC and instance == 1 and service == 0x03 and self.change_counters:
+            attributes = {attribute: pack('<I', self.change_counter) for attribute in (1, 2, 3, 4, 10)}
+            return cip_reply(service, SUCCESS, attribute_list(data, attributes))
+        return cip_reply(service, SERVICE_NOT_SUPPORTED)
+
+
+def list_identity_reply(request: bytes, port: int) -> bytes:
+    """ListIdentity reply for a 1756-L83E at 127.0.0.1, echoing the request's sender context."""
+    name = b'1756-L83E/B'
+    item = (pack('<H', 1) + pack('>HH4s8x', socket.AF_INET, port, socket.inet_aton('127.0.0.1')) +
+            pack('<HHHBBHIB', 1, 0x0E, 166, 32, 11, 0x3060, 0xC0FFEE, len(name)) + name + bytes([3]))
+    body = pack('<HHH', 1, 0x0C, len(item)) + item
+    return pack('<HHII', 0x63, len(body), 0, 0) + request[12:24] + body
+
+
+def attribute_list(data, attributes) -> bytes:
+    """Get Attribute List reply: each requested attribute's id, status and value."""
+    count = unpack_from('<H', data, 0)[0]
+    body = pack('<H', count)
+    for i in range(count):
+        attribute = unpack_from('<H', data, 2 + i * 2)[0]
+        if attribute in attributes:
+            body += pack('<HH', attribute, 0) + attributes[attribute]
+        else:
+            body += pack('<HH', attribute, 0x14)
+    return body
+
+
+def parse_path(path) -> list:
+    """Splits an IOI into ('symbol', name), ('element', index), ('class', id) and ('instance', id)."""
+    segments = []
+    i = 0
+    while i < len(path):
+        kind = path[i]
+        if kind == 0x91:
+            length = path[i + 1]
+            segments.append(('symbol', path[i + 2:i + 2 + length].decode()))
+            i += 2 + length + (length % 2)
+        elif kind == 0x28:
+            segments.append(('element', path[i + 1]))
+            i += 2
+        elif kind == 0x29:
+            segments.append(('element', unpack_from('<H', path, i + 2)[0]))
+            i += 4
+        elif kind == 0x2A:
+            segments.append(('element', unpack_from('<I', path, i + 2)[0]))
+            i += 6
+        elif kind == 0x20:
+            segments.append(('class', path[i + 1]))
+            i += 2
+        elif kind == 0x24:
+            segments.append(('instance', path[i + 1]))
+            i += 2
+        elif kind == 0x25:
+            segments.append(('instance', unpack_from('<H', path, i + 2)[0]))
+            i += 4
+        elif kind == 0x30:
+            segments.append(('attribute', path[i + 1]))
+            i += 2
+        else:
+            raise ValueError(kind)
+    return segments
+
+
+class EIPHandler(socketserver.BaseRequestHandler):
+    """One client connection: the encapsulation layer around SimulatedPLC.handle."""
+
+    def handle(self):
+        server = self.server
+        self.connection_size = 500
+        self.session = 0
+        server.clients.add(self.request)
+        try:
+            self.serve(server)
+        finally:
+            server.clients.discard(self.request)
+
+    def serve(self, server):
+        while True:
+            header = self.receive(24)
+            if header is None:
+                return
+            body = self.receive(unpack_from('<H', header, 2)[0])
+            if body is None:
+                return
+            command = unpack_from('<H', header, 0)[0]
+            server.requests += 1
+
+            if command == 0x65:
+                self.session = 0x1000 + server.requests
+                reply = pack('<HH', 1, 0)
+            elif command == 0x66:
+                return
+            elif command == 0x6F:
+                reply = self.unconnected(body[16:])
+            elif command == 0x70:
+                sequence = body[20:22]
+                cip = server.plc.handle(body[22:], self.connection_size)
+                reply = pack('<IHHHHIHH', 0, 0, 2, 0xA1, 4, 0x50000 + self.session, 0xB1, len(cip) + 2) + sequence + cip
+            else:
+                continue
+
+            header = bytearray(header)
+            header[2:4] = pack('<H', len(reply))
+            header[4:8] = pack('<I', self.session)
+            try:
+                self.request.sendall(bytes(header) + reply)
+            except OSError:
+                return
+
+    def unconnected(self, cip) -> bytes:
+        service = cip[0]
+        if service in (0x54, 0x5B):
+            large = service == 0x5B
+            if large and not self.server.large_forward_open:
+                reply = cip_reply(service, SERVICE_NOT_SUPPORTED)
+            else:
+                # connection parameters follow the RPI, 32 bit for a large forward open
+                parameters = unpack_from('<I' if large else '<H', cip, 32)[0]
+                self.connection_size = parameters & (0xFFFF if large else 0x1FF)
+                to_connection = unpack_from('<I', cip, 12)[0]
+                serial, vendor, originator = unpack_from('<HHI', cip, 16)
+                reply = cip_reply(service, SUCCESS, pack('<IIHHIIIBB', 0x50000 + self.session, to_connection,
+                                                         serial, vendor, originator, 0x201234, 0x204001, 0, 0))
+        elif service == 0x4E:
+            reply = cip_reply(service, SUCCESS, bytes(10))
+        else:
+            reply = cip_reply(service, SERVICE_NOT_SUPPORTED)
+        return pack('<IHHHHHH', 0, 0, 2, 0, 0, 0xB2, len(reply)) + reply
+
+    def receive(self, size):
+        data = b''
+        while len(data) < size:
+            try:
+                chunk = self.request.recv(size - len(data))
+            except OSError:
+                # dropped by drop_connections
+                return None
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+
+class PLCSimulator(socketserver.ThreadingTCPServer):
+    """Serves a SimulatedPLC on 127.0.0.1, on a free port unless one is given.
+    Use as a context manager, or call start() and stop()."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0, time_scale: float = 1.0, large_forward_open: bool = True):
+        super().__init__(('127.0.0.1', port), EIPHandler)
+        self.plc = SimulatedPLC(time_scale)
+        self.large_forward_open = large_forward_open
+        # encapsulation packets received, for counting round trips
+        self.requests = 0
+        self.thread = None
+        # sockets of the connected clients
+        self.clients = set()
+        # answers ListIdentity on the same port number over UDP, for Discover()
+        self.discovery = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.discovery.bind(('127.0.0.1', self.port))
+        self.discovery.settimeout(0.05)
+        self.discovery_thread = None
+        self.stopping = Event()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        self.discovery_thread = Thread(target=self.answer_discovery, daemon=True)
+        self.discovery_thread.start()
+        return self
+
+    def answer_discovery(self):
+        while not self.stopping.is_set():
+            try:
+                request, sender = self.discovery.recvfrom(1024)
+            except OSError:
+                continue
+            if len(request) >= 24 and unpack_from('<H', request, 0)[0] == 0x63:
+                self.discovery.sendto(list_identity_reply(request, self.port), sender)
+
+    def drop_connections(self):
+        """Cuts every client off, as a network glitch or a PLC restart would."""
+        for client in list(self.clients):
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self):
+        self.shutdown()
+        self.drop_connections()
+        self.server_close()
+        # a socket closed under a blocked recvfrom keeps its port, so let answer_discovery finish first
+        self.stopping.set()
+        if self.discovery_thread is not None:
+            self.discovery_thread.join()
+        self.discovery.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 44818
+    simulator = PLCSimulator(port)
+    print(f'Simulated Wave_Control PLC on 127.0.0.1:{simulator.port}')
+    simulator.serve_forever()
@@ -0,0 +1,142 @@
+"""
+End to end tests against testing/plc_simulator.py: the real PLC client, PLCSession and Model
+talking EtherNet/IP over a loopback socket instead of to the wave tank
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from modules.session import PLCSession
+from Motor import Motor
+from testing.plc_simulator import HOMED, OPERATION_ENABLED
+
+PROGRAM = 'Program:Wave_Control'
+
+
+@pytest.fixture
+def time_scale():
+    return 50
+
+
+@pytest.fixture
+def session(simulator, tmp_path, monkeypatch):
+    monkeypatch.setattr(PLCSession, 'CACHE_DIR', str(tmp_path))
+    session = PLCSession('127.0.0.1', 0, simulator.port)
+    yield session
+    session.close()
+
+
+def test_read_write(simulator, comm):
+    comm.Write(f'{PROGRAM}.Motor_3.Pos_2', 250)
+    comm.Write(f'{PROGRAM}.Live_Motors.4', 1)
+
+    assert comm.Read(f'{PROGRAM}.Motor_3.Pos_2') == 250
+    assert comm.Read(f'{PROGRAM}.Live_Motors') == 0b10000
+    assert simulator.plc.get('Motor_3', 'Pos_2') == 250
+    # tag names are not case sensitive
+    assert comm.Read('program:wave_control.motor_3.POS_2') == 250
+
+
+def test_multi_read_write(simulator, comm):
+    tags = [f'{PROGRAM}.Motor_{n}.Spd_1' for n in range(1, 31)]
+    statuses = comm.MultiWrite(*[(tag, n * 10) for n, tag in enumerate(tags)])
+
+    assert statuses == [0] * 30
+    assert comm.MultiRead(*tags) == [n * 10 for n in range(30)]
+
+
+def test_read_member_of_array_element(comm):
+    position = comm.Read(f'{PROGRAM}.Axis[0].ComDemandPosition')
+    assert position == 100 * 10000
+
+
+def test_read_udt_array(simulator, comm):
+    axes = comm.ReadUDTArray(f'{PROGRAM}.Axis[0]', 30)
+
+    assert len(axes) == 30
+    assert axes[7]['ComDemandPosition'] == 107 * 10000
+    assert axes[0]['StatusWord'] & HOMED == 0
+
+
+def test_tag_list(comm):
+    tags = comm.GetProgramTagList(PROGRAM)
+    names = {tag.TagName for tag in tags}
+
+    assert f'{PROGRAM}.Motor_30' in names
+    assert f'{PROGRAM}.Axis' in names
+    assert f'{PROGRAM}.Run_2' in names
+
+
+def test_standard_forward_open_fallback(simulator, comm):
+    simulator.large_forward_open = False
+    comm.ConnectionSize = 4000
+    assert comm.Read(f'{PROGRAM}.Motor_1.Pos_1') == 0
+    assert comm.ConnectionSize == 500
+    # a 30 axis structure read no longer fits in one reply
+    assert len(comm.ReadUDTArray(f'{PROGRAM}.Axis[0]', 30)) == 30
+
+
+def test_homing(simulator, session):
+    session.Write(f'{PROGRAM}.Live_Motors.0', 1)
+    session.Write(f'{PROGRAM}.Live_Motors.2', 1)
+    session.Write(f'{PROGRAM}.Motor_Boot', 1)
+    session.Write(f'{PROGRAM}.Home_Button', 1)
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        axes = session.ReadUDTArray(f'{PROGRAM}.Axis[0]', 3)
+        if all(axes[n]['StatusWord'] & HOMED for n in (0, 2)):
+            break
+        time.sleep(0.01)
+
+    assert axes[0]['StatusWord'] & (HOMED | OPERATION_ENABLED) == HOMED | OPERATION_ENABLED
+    assert axes[0]['ComDemandPosition'] == 0
+    # axis 1 isn't live, it never moves
+    assert axes[1]['StatusWord'] & HOMED == 0
+    assert axes[1]['ComDemandPosition'] == 101 * 10000
+
+
+def test_model(simulator, start_model):
+    simulator.plc.set('Live_Motors', 0x3FFFFFFF)
+    model = start_model()
+    try:
+        assert model.CONNECTED
+        # live_motor_reset cleared the bit of every axis
+        assert simulator.plc.get('Live_Motors') == 0
+
+        motor = Motor(4, True, model.session)
+        motor.write_params['Position 2'] = 300
+        model.live_motors = {4: motor}
+        model.live_motors_sets = [{4: motor}]
+        model.attr_write()
+
+        assert motor.write_success
+        assert simulator.plc.get('Motor_5', 'Pos_2') == 300
+        assert simulator.plc.get('Motor_5', 'Spd_1') == 500
+
+        snapshot = model.health_snapshot()
+        assert snapshot[4]['ComDemandPosition'] == 104 * 10000
+        assert motor.home is False
+    finally:
+        model.shutdown()
+
+
+def test_motor_without_session(simulator, tmp_path, monkeypatch):
+    monkeypatch.setattr(PLCSession, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr('Motor.PLCSession', lambda ip, slot: PLCSession(ip, slot, simulator.port))
+    simulator.plc.set('Motor_3', 250, 'Pos_2')
+    motor = Motor(2, True)
+    motor.read_position('127.0.0.1', 0)
+    motor.write_generic('127.0.0.1', 0, 'Speed 1')
+
+    assert motor.current_params['Position 2'] == 250
+    assert simulator.plc.get('Motor_3', 'Spd_1') == 500
+    # each request's session was closed after it
+    assert motor.session is None
+    deadline = time.monotonic() + 5
+    while simulator.clients and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not simulator.clients
@@ -0,0 +1,87 @@
+"""
+Tests for the analytics recording in modules/position_recorder.py, run on the Model's
+command actor against testing/plc_simulator.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from types import SimpleNamespace
+from Motor import Motor
+from testing.simulated_model import SimulatedModel
+
+
+class RecordingModel(SimulatedModel):
+    """SimulatedModel keeping recordings instead of saving them to the database."""
+    RECORD_ANALYTICS = True
+    ANALYTICS_INTERVAL = 0.05
+
+    def save_analytics(self, data):
+        self.saved = data
+
+
+@pytest.fixture
+def model_class(tmp_path, monkeypatch):
+    monkeypatch.setattr(RecordingModel, 'ANALYTICS_DIR', str(tmp_path))
+    return RecordingModel
+
+
+@pytest.fixture
+def model(start_model):
+    model = start_model()
+    model.live_motors = {n: Motor(n, True, model.session) for n in (0, 1)}
+    model.state = 1
+    yield model
+    model.shutdown()
+
+
+def test_runs_its_course(model, tmp_path):
+    model.ANALYTICS_DURATION = 0.2
+    model.thread_motion(2, 0).result(1.0)
+    # the start returns while the recording goes on in the background
+    assert model.recorder.done.result(2.0) == 4
+    assert model.view.progress == pytest.approx([0, 0.25, 0.5, 0.75])
+    assert not model.view.progress_bar
+    assert len(model.saved['Motor 0']) == 4
+    lines = open(next(tmp_path.glob('*.txt'))).read().splitlines()
+    assert len(lines) == 1 + 3 + 4
+
+
+def test_stop_ends_recording(model, simulator):
+    model.ANALYTICS_DURATION = 60
+    model.thread_motion(2, 0).result(1.0)
+    assert simulator.plc.get('Run_2') == 1
+
+    model.actor.schedule(0.2, lambda: None).result(1.0)
+    model.stop_motion(2).result(1.0)
+    # the stop didn't wait out the recording
+    runs = model.recorder.done.result(0)
+    assert 2 <= runs < 20
+    assert simulator.plc.get('Run_2') == 0
+    assert model.state == 1
+    assert not model.view.progress_bar
+    assert len(model.saved['Motor 1']) == runs
+
+
+def test_failed_read_ends_recording(model, monkeypatch):
+    def refused(*tags):
+        raise ValueError('Read failed')
+    monkeypatch.setattr(model.session, 'MultiRead', refused)
+    model.thread_motion(2, 0).result(1.0)
+    # the first sample fails and the recording ends with nothing
+    assert model.recorder.done.result(1.0) == 0
+    assert not model.view.progress_bar
+
+
+def test_progress_drawn_on_tk_thread(model):
+    # a Tk loop that only drains when told to
+    model.ui.attach(SimpleNamespace(after=lambda ms, fn: None))
+    model.ANALYTICS_DURATION = 0.1
+    model.thread_motion(2, 0).result(1.0)
+    assert model.recorder.done.result(2.0) == 2
+    assert model.view.progress == [] and model.view.progress_bar
+    model.ui.drain()
+    assert model.view.progress == pytest.approx([0, 0.5])
+    assert not model.view.progress_bar
@@ -0,0 +1,110 @@
+"""
+Tests for the keep alive thread in modules/session.py, against testing/plc_simulator.py
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from modules.session import PLCSession
+from testing.plc_simulator import PLCSimulator
+
+PROGRAM = 'Program:Wave_Control'
+
+
+# generous, the tests wait for what they expect rather than for a fixed time
+TIMEOUT = 5.0
+
+
+def wait_for(condition, timeout=TIMEOUT) -> bool:
+    """Polls condition until it holds or timeout runs out, returns whether it held."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(PLCSession, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(PLCSession, 'KEEPALIVE_INTERVAL', 0.1)
+    with PLCSimulator() as simulator:
+        session = PLCSession('127.0.0.1', 0, simulator.port)
+        session.simulator = simulator
+        yield session
+        session.close()
+
+
+def keep_alives(stats) -> dict:
+    return stats.Summary()['services'].get('Get Attribute Single', {'count': 0})
+
+
+def test_keep_alive_when_idle(session):
+    stats = session.enable_stats()
+    session.Read(f'{PROGRAM}.Live_Motors')
+    start = time.monotonic()
+    assert wait_for(lambda: keep_alives(stats)['count'] >= 3)
+
+    # one per idle interval, not sooner
+    assert time.monotonic() - start >= 3 * 0.1 * 0.9
+    # a few bytes each way, nothing like a tag list download
+    assert keep_alives(stats)['bytes_received'] / keep_alives(stats)['count'] < 60
+    assert session.Read(f'{PROGRAM}.Live_Motors') == 0
+
+
+def test_no_keep_alive_while_busy(session, monkeypatch):
+    # requests go out far more often than the connection could sit idle for
+    monkeypatch.setattr(PLCSession, 'KEEPALIVE_INTERVAL', 0.5)
+    stats = session.enable_stats()
+    deadline = time.monotonic() + 1.0
+    while time.monotonic() < deadline:
+        session.Read(f'{PROGRAM}.Live_Motors')
+        time.sleep(0.02)
+
+    assert keep_alives(stats)['count'] == 0
+
+
+def test_close_stops_keep_alive(session):
+    session.Read(f'{PROGRAM}.Live_Motors')
+    thread = session.keepalive
+    session.close()
+
+    assert not thread.is_alive()
+    # let the simulator take in the forward close and unregister first
+    assert wait_for(lambda: not session.simulator.clients)
+    requests = session.simulator.requests
+    # several keep alive intervals
+    time.sleep(0.3)
+    assert session.simulator.requests == requests
+
+
+def test_keep_alive_failure_drops_connection(session):
+    session.Read(f'{PROGRAM}.Live_Motors')
+    # the PLC goes away, the keep alive notices and the next request reconnects
+    session.comm.Socket.close()
+
+    assert wait_for(lambda: session.comm is None)
+    assert session.Read(f'{PROGRAM}.Live_Motors') == 0
+
+
+def test_keep_alive_error_reply_keeps_connection(session, monkeypatch):
+    session.Read(f'{PROGRAM}.Live_Motors')
+    comm = session.comm
+    states = []
+    session.add_listener(states.append)
+    refusals = []
+
+    def refused():
+        refusals.append(time.monotonic())
+        raise Exception('Keep alive failed, Service not supported')
+    monkeypatch.setattr(comm, 'KeepAlive', refused)
+    assert wait_for(lambda: len(refusals) >= 2)
+
+    # the PLC answered, so the connection stays up and nobody hears it was lost
+    assert session.comm is comm and comm.SocketConnected
+    assert PLCSession.LOST not in states
+    assert session.Read(f'{PROGRAM}.Live_Motors') == 0
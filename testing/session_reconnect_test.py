@@ -0,0 +1,101 @@
+"""
+Tests for reconnecting with backoff and replaying requests in modules/session.py, against testing/plc_simulator.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import modules.session
+from modules.session import PLCSession, RequestNotReplayed
+from testing.plc_simulator import PLCSimulator
+
+PROGRAM = 'Program:Wave_Control'
+
+
+@pytest.fixture
+def session(simulator, tmp_path, monkeypatch):
+    monkeypatch.setattr(PLCSession, 'CACHE_DIR', str(tmp_path))
+    session = PLCSession('127.0.0.1', 0, simulator.port)
+    session.states = []
+    session.add_listener(session.states.append)
+    yield session
+    session.close()
+
+
+def test_read_replayed_after_drop(simulator, session):
+    session.Write(f'{PROGRAM}.Motor_2.Pos_1', 7)
+    simulator.drop_connections()
+
+    assert session.Read(f'{PROGRAM}.Motor_2.Pos_1') == 7
+    assert session.states == ['connected', 'lost', 'reconnecting', 'connected']
+
+
+def test_absolute_write_replayed(simulator, session):
+    session.Read(f'{PROGRAM}.Live_Motors')
+    simulator.drop_connections()
+
+    session.Write(f'{PROGRAM}.Motor_2.Spd_1', 300)
+    assert simulator.plc.get('Motor_2', 'Spd_1') == 300
+
+
+def test_pulse_not_replayed(simulator, session):
+    session.Read(f'{PROGRAM}.Run_1')
+    simulator.drop_connections()
+
+    with pytest.raises(RequestNotReplayed):
+        session.Write(f'{PROGRAM}.Run_1', 1, replay=False)
+    assert simulator.plc.get('Run_1') == 0
+    # already reconnected for whatever the caller does next
+    assert session.states[-1] == 'connected'
+    assert session.Read(f'{PROGRAM}.Run_1') == 0
+
+
+def test_backoff_until_offline(simulator, session, monkeypatch):
+    delays = []
+    monkeypatch.setattr(modules.session.time, 'sleep', delays.append)
+    session.Read(f'{PROGRAM}.Live_Motors')
+    simulator.stop()
+
+    with pytest.raises(Exception):
+        session.Read(f'{PROGRAM}.Live_Motors')
+    assert delays == [0.25, 0.5, 1.0, 2.0, 4.0]
+    assert session.states[-2:] == ['reconnecting', 'offline']
+    assert session.states.count('reconnecting') == PLCSession.RECONNECT_ATTEMPTS
+
+
+def test_reconnects_when_plc_returns(simulator, session, monkeypatch):
+    session.Read(f'{PROGRAM}.Live_Motors')
+    port = simulator.port
+    simulator.stop()
+
+    restarted = []
+
+    def restart_plc(delay):
+        # the PLC comes back during the second wait
+        if len(restarted) == 0 and delay == 0.5:
+            restarted.append(PLCSimulator(port).start())
+    monkeypatch.setattr(modules.session.time, 'sleep', restart_plc)
+    try:
+        assert session.Read(f'{PROGRAM}.Live_Motors') == 0
+        assert session.states[-1] == 'connected'
+        assert session.states.count('reconnecting') == 3
+    finally:
+        session.close()
+        for plc in restarted:
+            plc.stop()
+
+
+def test_first_connect_not_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(PLCSession, 'CACHE_DIR', str(tmp_path))
+    delays = []
+    monkeypatch.setattr(modules.session.time, 'sleep', delays.append)
+    with PLCSimulator() as simulator:
+        port = simulator.port
+    session = PLCSession('127.0.0.1', 0, port)
+
+    # no PLC at all, the Model falls back to its mock mode straight away
+    with pytest.raises(Exception):
+        session.Read(f'{PROGRAM}.Live_Motors')
+    assert delays == []
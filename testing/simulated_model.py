@@ -0,0 +1,42 @@
+"""
+The Model and view the tests run against testing/plc_simulator.py, see the fixtures in testing/conftest.py
+"""
+
+from Model import Model
+
+
+class SimulatedModel(Model):
+    """Model pointed at the simulator, with no GUI behind it."""
+    IP_ADDRESS = '127.0.0.1'
+    PROCESSOR_SLOT = 0
+    DISCOVER_PLC = False
+    HANDSHAKE_HOLD = 0.2
+
+
+class WarmStartModel(SimulatedModel):
+    """SimulatedModel that takes over the live motors it finds on the PLC instead of resetting them."""
+    WARM_START = True
+
+
+class View:
+    """Stands in for ControlHome, keeps the messages and the progress."""
+
+    def __init__(self):
+        self.messages = []
+        self.progress = []
+        self.progress_bar = True
+
+    def update_msg(self, message):
+        self.messages.append(message)
+
+    def update_button_status(self):
+        pass
+
+    def enable_curve(self):
+        pass
+
+    def update_progress_bar(self, percent):
+        self.progress.append(percent)
+
+    def destory_progress_bar(self):
+        self.progress_bar = False
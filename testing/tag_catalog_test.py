@@ -0,0 +1,136 @@
+"""
+Tests for the cached tag list and template store in modules/tag_catalog.py, against testing/plc_simulator.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.eip import PLC
+from modules.tag_catalog import TagCatalog
+from testing.plc_simulator import DINT
+
+PROGRAM = 'Program:Wave_Control'
+
+
+def connect(simulator, catalog):
+    comm = PLC()
+    comm.IPAddress = '127.0.0.1'
+    comm.Port = simulator.port
+    catalog.Attach(comm)
+    return comm
+
+
+def test_lookups(simulator):
+    catalog = TagCatalog()
+    comm = connect(simulator, catalog)
+    try:
+        assert catalog.Refresh(comm)
+    finally:
+        comm.Close()
+
+    assert catalog.Programs == [PROGRAM]
+    axis = catalog.Tag('program:wave_control.AXIS')
+    assert axis.TagName == f'{PROGRAM}.Axis'
+    assert axis.Struct and axis.Array and axis.Size == 30
+    assert axis.DataType == 'AXIS_LINMOT'
+    assert catalog.Instance(axis.InstanceID, PROGRAM) is axis
+    assert catalog.Template(axis.DataTypeValue).Size == 24
+    assert catalog.Tag(f'{PROGRAM}.Live_Motors').DataType == 'DINT'
+    assert catalog.Tag(f'{PROGRAM}.Nope') is None
+    assert len(catalog.ProgramTags(PROGRAM)) == len(simulator.plc.program_tags)
+    assert catalog.ProgramTags('Program:Other') is None
+
+
+def test_refresh_only_when_changed(simulator):
+    catalog = TagCatalog()
+    comm = connect(simulator, catalog)
+    try:
+        catalog.Refresh(comm)
+        stats = comm.EnableStats()
+        assert not catalog.Refresh(comm)
+        # just the change counters
+        services = stats.Summary()['services']
+        assert list(services) == ['Get Attribute List'] and services['Get Attribute List']['count'] == 1
+
+        comm.Read(f'{PROGRAM}.Motor_1.Pos_1')
+        simulator.plc.program_changed()
+        stats.Reset()
+        assert catalog.Refresh(comm)
+        services = stats.Summary()['services']
+        # symbols listed again, the unchanged templates only had their handle checked
+        assert services['Get Instance Attribute List']['count'] >= 2
+        assert 'Read Tag' not in services
+        # what was learned about tags before the edit is forgotten
+        assert comm.KnownTags == {}
+    finally:
+        comm.Close()
+
+
+def test_refresh_without_change_counters(simulator, tmp_path):
+    simulator.plc.change_counters = False
+    cacheFile = str(tmp_path / 'catalog.json')
+    catalog = TagCatalog(cacheFile)
+    comm = connect(simulator, catalog)
+    try:
+        assert catalog.Refresh(comm)
+    finally:
+        comm.Close()
+
+    catalog = TagCatalog(cacheFile)
+    comm = connect(simulator, catalog)
+    try:
+        stats = comm.EnableStats()
+        # the symbols are listed and match the cache, no template is read
+        assert not catalog.Refresh(comm)
+        assert stats.Summary()['families'].get('class 0x6C') is None
+        assert catalog.Tag(f'{PROGRAM}.Axis').DataType == 'AXIS_LINMOT'
+
+        comm.Read(f'{PROGRAM}.Motor_1.Pos_1')
+        simulator.plc.add_tag('Wave_Height', DINT)
+        assert catalog.Refresh(comm)
+        assert catalog.Tag(f'{PROGRAM}.Wave_Height').DataType == 'DINT'
+        assert comm.KnownTags == {}
+    finally:
+        comm.Close()
+
+
+def test_cache_file(simulator, tmp_path):
+    cacheFile = str(tmp_path / 'catalog.json')
+    catalog = TagCatalog(cacheFile)
+    comm = connect(simulator, catalog)
+    try:
+        catalog.Refresh(comm)
+    finally:
+        comm.Close()
+
+    catalog = TagCatalog(cacheFile)
+    comm = connect(simulator, catalog)
+    stats = comm.EnableStats()
+    try:
+        assert not catalog.Refresh(comm)
+        axes = comm.ReadUDTArray(f'{PROGRAM}.Axis[0]', 30)
+    finally:
+        comm.Close()
+
+    assert axes[3]['ComDemandPosition'] == 103 * 10000
+    assert catalog.Tag(f'{PROGRAM}.Motor_7').DataType == 'MOTOR_PARAMS'
+    services = stats.Summary()['services']
+    # nothing listed, no template read
+    assert 'Get Instance Attribute List' not in services
+    assert stats.Summary()['families'].get('class 0x6C') is None
+
+
+def test_program_tag_list_from_catalog(simulator):
+    catalog = TagCatalog()
+    comm = connect(simulator, catalog)
+    try:
+        names = {tag.TagName for tag in comm.GetProgramTagList(PROGRAM)}
+        stats = comm.EnableStats()
+        comm.GetProgramTagList(PROGRAM)
+    finally:
+        comm.Close()
+
+    assert f'{PROGRAM}.Run_2' in names
+    assert stats.Summary()['services']['Get Attribute List']['count'] == 1
+    assert 'Get Instance Attribute List' not in stats.Summary()['services']
@@ -0,0 +1,62 @@
+"""
+Tests for modules/view_queue.py
+"""
+
+import sys
+import os
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.view_queue import ViewQueue
+
+
+class Widget:
+    """Stands in for a Tk widget, runs after() callbacks when told to."""
+
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, fn, *args):
+        self.pending.append((fn, args))
+
+    def run_pending(self):
+        pending, self.pending = self.pending, []
+        for fn, args in pending:
+            fn(*args)
+
+
+def from_thread(fn, *args):
+    thread = threading.Thread(target=fn, args=args)
+    thread.start()
+    thread.join(1.0)
+
+
+def test_runs_in_place_until_attached():
+    ran = []
+    ui = ViewQueue()
+    from_thread(ui.post, ran.append, threading.get_ident)
+    assert ran == [threading.get_ident]
+
+
+def test_other_threads_wait_for_the_drain():
+    ran = []
+    ui = ViewQueue()
+    widget = Widget()
+    ui.attach(widget)
+    from_thread(ui.post, ran.append, 'first')
+    from_thread(ui.post, ran.append, 'second')
+    assert ran == []
+
+    widget.run_pending()
+    assert ran == ['first', 'second']
+    # the drain keeps itself going
+    assert widget.pending
+
+
+def test_tk_thread_runs_after_what_was_queued():
+    ran = []
+    ui = ViewQueue()
+    ui.attach(Widget())
+    from_thread(ui.post, ran.append, 'queued')
+    ui.post(ran.append, 'now')
+    assert ran == ['queued', 'now']
@@ -0,0 +1,148 @@
+"""
+Tests for rebuilding the Model from the PLC on startup, Model.warm_start, against testing/plc_simulator.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from Model import Model
+from modules.session import PLCSession
+from testing.simulated_model import SimulatedModel, WarmStartModel
+
+PROGRAM = 'Program:Wave_Control'
+
+
+@pytest.fixture
+def time_scale():
+    return 20
+
+
+@pytest.fixture
+def model_class():
+    return WarmStartModel
+
+
+@pytest.fixture
+def prepared(simulator, start_model):
+    """Motors 0 and 1 in one set, 2 in another, written and homed, then the GUI closed."""
+    model = start_model()
+    try:
+        model.motdict = {0: 1, 1: 1, 2: 1}
+        model.motor_define()
+        model.live_motors_sets = [{n: model.live_motors[n] for n in (0, 1)}, {2: model.live_motors[2]}]
+        model.live_motors[2].write_params['Speed 1'] = 650
+        model.live_motors[2].write_params['Position 2'] = 200
+        model.attr_write()
+        model.motor_home()
+        assert model.state == 1
+    finally:
+        model.shutdown()
+    return simulator
+
+
+def test_cold_start(simulator, start_model):
+    simulator.plc.set('Live_Motors', -(1 << 31))
+    model = start_model()
+    try:
+        assert model.CONNECTED and not model.warm_started
+        assert model.live_motors == {}
+        assert simulator.plc.get('Live_Motors') & 0xFFFFFFFF == 1 << 31
+    finally:
+        model.shutdown()
+
+
+def test_warm_start(prepared, start_model, monkeypatch, tmp_path):
+    monkeypatch.setattr(SimulatedModel, 'RECORD_IO_STATS', True)
+    # the report written on shutdown goes to tmp_path, not the repo's logs directory
+    report = tmp_path / 'io_stats.json'
+    monkeypatch.setattr(SimulatedModel, 'report_io_stats',
+                        lambda self, path=None: Model.report_io_stats(self, str(report)))
+    model = start_model()
+    try:
+        assert model.CONNECTED and model.warm_started
+        # nothing was reset on the PLC
+        assert prepared.plc.get('Live_Motors') == 0b111
+        assert sorted(model.live_motors) == [0, 1, 2]
+        assert [sorted(motor_set) for motor_set in model.live_motors_sets] == [[0, 1], [2]]
+        assert model.live_motors[2].current_params['Speed 1'] == 650
+        assert model.live_motors[2].write_params['Position 2'] == 200
+        assert model.written_matches_current() and model.write_success()
+        assert model.motdict == {0: 2, 1: 2, 2: 2}
+        assert model.state == 1
+        assert all(motor.home for motor in model.live_motors.values())
+
+        # two multi-reads and the Axis[] array, not a request per tag
+        services = model.session.stats.Summary()['services']
+        assert services['Multiple Service Packet']['count'] == 2
+        assert 'Read Tag' not in services
+
+        # nothing changed, so nothing to write before running
+        requests = prepared.requests
+        model.attr_write()
+        assert prepared.requests == requests
+    finally:
+        model.shutdown()
+    assert report.exists()
+
+
+def test_warm_start_not_homed(prepared, start_model):
+    prepared.plc.axes[1].homed = False
+    prepared.plc.set('Run_2', 1)
+    model = start_model()
+    try:
+        assert model.warm_started
+        assert model.state == 0
+    finally:
+        model.shutdown()
+
+
+def test_warm_start_running(prepared, start_model):
+    prepared.plc.set('Run_2', 1)
+    model = start_model()
+    try:
+        assert model.state == 2
+    finally:
+        model.shutdown()
+
+
+def test_warm_start_off(prepared, start_model, monkeypatch):
+    monkeypatch.setattr(WarmStartModel, 'WARM_START', False)
+    model = start_model()
+    try:
+        assert not model.warm_started
+        assert model.live_motors == {}
+        assert prepared.plc.get('Live_Motors') == 0
+    finally:
+        model.shutdown()
+
+
+def test_warm_start_failed(prepared, start_model, monkeypatch):
+    def fail(self):
+        self.motdict[0] = 2
+        raise ValueError('unreadable')
+    monkeypatch.setattr(WarmStartModel, 'warm_start', fail)
+    model = start_model()
+    try:
+        # still connected, reset like a cold start
+        assert model.CONNECTED and not model.warm_started
+        assert model.motdict == {}
+        assert prepared.plc.get('Live_Motors') == 0
+    finally:
+        model.shutdown()
+
+
+def test_warm_start_unreadable(prepared, start_model, monkeypatch):
+    multi_read = PLCSession.MultiRead
+
+    def live_motors_error(self, *tags):
+        values = multi_read(self, *tags)
+        return ['Error' if tag.endswith('Live_Motors') else value for tag, value in zip(tags, values)]
+    monkeypatch.setattr(PLCSession, 'MultiRead', live_motors_error)
+    model = start_model()
+    try:
+        assert model.CONNECTED and not model.warm_started
+        assert model.live_motors == {}
+    finally:
+        model.shutdown()